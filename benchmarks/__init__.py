@@ -0,0 +1,8 @@
+"""
+benchmarks
+~~~~~~~~~~
+
+Benchmarks of `jobber.core.search` on synthetic corpora, see `python -m
+benchmarks --help`.
+
+"""
@@ -0,0 +1,74 @@
+"""
+Benchmarks `jobber.core.search` on synthetic corpora and writes the results
+as JSON, so that runs can be compared across commits. Run with `python -m
+benchmarks` from the root of the repository.
+
+Usage:
+    benchmarks [options] [--size=<size>...]
+
+Options:
+    --size=<size>    Corpus size, either a number or one of 1k, 10k and 100k.
+                     Can be given more than once [default: 1k].
+    --seed=<n>       Seed of the corpus generator [default: 0].
+    --procs=<n>      Indexing processes for the bulk load [default: 1].
+    --updates=<n>    Documents to update one by one [default: 100].
+    --repeat=<n>     Runs of every query in the mix [default: 20].
+    --output=<path>  Write the results to this file instead of stdout.
+
+"""
+import sys
+import json
+import platform
+import subprocess
+from collections import OrderedDict
+from datetime import datetime
+
+import whoosh
+from docopt import docopt
+
+from benchmarks.corpus import SIZES
+from benchmarks.search import SearchBenchmark
+
+
+def revision():
+    """Returns the git commit the benchmarks run on, if any."""
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip()
+
+
+def main(sizes, seed, procs, updates, repeat, output):
+    results = OrderedDict()
+    results['revision'] = revision()
+    results['created'] = datetime.utcnow().isoformat()
+    results['python'] = platform.python_version()
+    results['whoosh'] = whoosh.versionstring()
+    results['seed'] = seed
+    results['latency_unit'] = 'ms'
+    results['runs'] = OrderedDict()
+
+    for size in sizes:
+        count = int(SIZES.get(size, size))
+        sys.stderr.write('Benchmarking {} documents...\n'.format(count))
+        benchmark = SearchBenchmark(count, seed=seed, procs=procs)
+        results['runs'][size] = benchmark.run(updates=updates, repeat=repeat)
+
+    data = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print data
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    main(arguments['--size'],
+         int(arguments['--seed']),
+         int(arguments['--procs']),
+         int(arguments['--updates']),
+         int(arguments['--repeat']),
+         arguments['--output'])
@@ -0,0 +1,192 @@
+"""
+benchmarks.corpus
+~~~~~~~~~~~~~~~~~
+
+Generates synthetic job documents, shaped like `Job.to_document()`.
+
+Words are drawn with Zipf-like weights, so that a few skills and roles are
+very common and most are rare, like in the real listings. The same `seed`
+always generates the same corpus.
+
+"""
+import random
+from datetime import datetime, timedelta
+
+from jobber.core.models import Job, Location
+from jobber.core.search import fingerprint
+
+
+# Corpus sizes that can be given by name.
+SIZES = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000
+}
+
+
+SENIORITIES = [u'', u'Senior', u'Junior', u'Lead', u'Principal', u'Staff']
+
+
+ROLES = [u'Software Engineer', u'Developer', u'Web Developer',
+         u'Backend Engineer', u'Frontend Developer', u'Data Scientist',
+         u'DevOps Engineer', u'QA Engineer', u'Mobile Developer',
+         u'Systems Administrator', u'Product Manager', u'UX Designer',
+         u'Data Engineer', u'Security Engineer', u'Support Engineer',
+         u'Embedded Engineer', u'Site Reliability Engineer', u'Architect']
+
+
+SKILLS = [u'python', u'javascript', u'java', u'php', u'sql', u'linux',
+          u'react', u'django', u'aws', u'docker', u'c#', u'node', u'angular',
+          u'ruby', u'go', u'postgresql', u'mysql', u'kubernetes', u'scala',
+          u'c++', u'swift', u'kotlin', u'android', u'ios', u'flask', u'rails',
+          u'redis', u'elasticsearch', u'kafka', u'spark', u'hadoop',
+          u'terraform', u'ansible', u'jenkins', u'git', u'html', u'css',
+          u'typescript', u'vue', u'graphql', u'rust', u'haskell', u'erlang',
+          u'elixir', u'clojure', u'perl', u'matlab', u'tensorflow', u'pandas',
+          u'spring', u'dotnet', u'azure', u'gcp', u'mongodb', u'cassandra',
+          u'rabbitmq', u'nginx', u'selenium', u'figma', u'sketch']
+
+
+SYLLABLES = [u'ra', u'me', u'di', u'ca', u'so', u'ft', u'lo', u'gic', u'net',
+             u'tek', u'sys', u'data', u'cy', u'pro', u'on', u'ix', u'va',
+             u'bit', u'hub', u'lab']
+
+
+CITIES = [(u'Nicosia', u'CYP'), (u'Limassol', u'CYP'), (u'Larnaca', u'CYP'),
+          (u'Paphos', u'CYP'), (u'Athens', u'GRC'), (u'Thessaloniki', u'GRC'),
+          (u'London', u'GBR'), (u'Manchester', u'GBR'), (u'Edinburgh', u'GBR')]
+
+
+SENTENCES = [
+    u'We are looking for a {role} to join our growing {team} team.',
+    u'You will work with {skill} and {skill} on products used by thousands '
+    u'of customers.',
+    u'Experience with {skill} is required, knowledge of {skill} is a plus.',
+    u'The team ships often and values code review, testing and {skill}.',
+    u'You will help us scale our {skill} platform and mentor other '
+    u'engineers.',
+    u'We offer a competitive salary, flexible hours and a yearly training '
+    u'budget.',
+    u'Our stack is mostly {skill}, {skill} and {skill}, running on {skill}.',
+    u'You have {years} years of experience building {team} systems.',
+    u'Good communication skills in English are essential.',
+    u'Join a friendly office in the centre of {city}.'
+]
+
+
+TEAMS = [u'backend', u'frontend', u'platform', u'data', u'mobile',
+         u'infrastructure', u'payments', u'search', u'growth', u'security']
+
+
+def zipf_weights(count, exponent=1.0):
+    """Returns cumulative weights for `count` items, the item at rank `r`
+    being `1 / r ** exponent` as likely as the first.
+
+    """
+    weights = []
+    total = 0.0
+    for rank in xrange(1, count + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+class CorpusGenerator(object):
+    """Generates synthetic job documents.
+
+    :param seed: Seed of the random number generator.
+    :param companies: How many distinct companies to draw from.
+    :param start: The creation date of the oldest job.
+
+    """
+    def __init__(self, seed=0, companies=500, start=datetime(2015, 1, 1)):
+        self.random = random.Random(seed)
+        self.start = start
+        self.skill_weights = zipf_weights(len(SKILLS))
+        self.role_weights = zipf_weights(len(ROLES))
+        self.city_weights = zipf_weights(len(CITIES))
+        self.companies = [self.company_name() for _ in xrange(companies)]
+        self.company_weights = zipf_weights(companies, exponent=0.8)
+
+    def choice(self, items, weights):
+        """Returns one of `items`, drawn with cumulative `weights`."""
+        point = self.random.random() * weights[-1]
+        low, high = 0, len(weights) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if weights[middle] < point:
+                low = middle + 1
+            else:
+                high = middle
+        return items[low]
+
+    def skill(self):
+        return self.choice(SKILLS, self.skill_weights)
+
+    def company_name(self):
+        syllables = self.random.randint(2, 4)
+        name = u''.join(self.random.choice(SYLLABLES) for _ in xrange(syllables))
+        return name.capitalize()
+
+    def title(self):
+        parts = [self.random.choice(SENIORITIES),
+                 self.choice(ROLES, self.role_weights)]
+        if self.random.random() < 0.4:
+            parts.append(u'({})'.format(self.skill().capitalize()))
+        return u' '.join(part for part in parts if part)
+
+    def description(self, role, city):
+        sentences = []
+        for _ in xrange(self.random.randint(4, 12)):
+            template = self.random.choice(SENTENCES)
+            while u'{skill}' in template:
+                template = template.replace(u'{skill}', self.skill(), 1)
+            sentences.append(template.format(role=role,
+                                             team=self.random.choice(TEAMS),
+                                             years=self.random.randint(1, 10),
+                                             city=city))
+        return u' '.join(sentences)
+
+    def document(self, id):
+        """Returns the document of a job with `id`, like
+        `Job.to_document()`.
+
+        """
+        title = self.title()
+        city, country_code = self.choice(CITIES, self.city_weights)
+        job_type = Job.JOB_TYPES.map(self.random.choice([1, 1, 1, 2, 3, 4]))
+        tags = set(self.skill() for _ in xrange(self.random.randint(1, 6)))
+        created = self.start + timedelta(minutes=self.random.randint(0, 525600))
+
+        doc = {
+            'id': unicode(id),
+            'title': title,
+            'description': self.description(title.lower(), city),
+            'company': self.choice(self.companies, self.company_weights),
+            'location': u"{},{}".format(city, Location.COUNTRIES.map(country_code)),
+            'job_type': job_type,
+            'tags': u','.join(sorted(tags)),
+            'type': job_type,
+            'country': country_code,
+            'city': city.lower(),
+            'created': created,
+            'remote': self.random.choice([u'yes', u'no', u'no', u'negotiable'])
+        }
+        doc['fingerprint'] = fingerprint(doc)
+        return doc
+
+    def documents(self, count, start=1):
+        """Generates `count` documents with ascending ids from `start`."""
+        for id in xrange(start, start + count):
+            yield self.document(id)
+
+
+def generate(count, seed=0):
+    """Returns an iterator over `count` synthetic job documents.
+
+    :param count: The number of documents, or one of the `SIZES` names.
+    :param seed: Seed of the random number generator.
+
+    """
+    count = SIZES.get(count, count)
+    return CorpusGenerator(seed).documents(int(count))
@@ -0,0 +1,160 @@
+"""
+benchmarks.search
+~~~~~~~~~~~~~~~~~
+
+Measures bulk indexing throughput, single document update latency and query
+latencies of `jobber.core.search.Index` on a synthetic corpus.
+
+"""
+import time
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from jobber.core.metrics import percentile
+from jobber.core.search import Index, IndexManager, Schema
+
+from benchmarks.corpus import CorpusGenerator
+
+
+# The fixed mix of queries every run is measured with, as a mapping of names
+# to the keyword arguments of `Index.search_page()`.
+QUERY_MIX = OrderedDict([
+    ('term', dict(query=u'python')),
+    ('rare_term', dict(query=u'haskell')),
+    ('two_terms', dict(query=u'senior developer')),
+    ('phrase', dict(query=u'"software engineer"')),
+    ('or', dict(query=u'django OR rails')),
+    ('not', dict(query=u'engineer NOT java')),
+    ('filtered', dict(query=u'developer', filters={'country': 'CYP'})),
+    ('filters_only', dict(query=u'tag:python type:"Full Time"')),
+    ('sorted', dict(query=u'engineer', sort=('created', 'desc'))),
+    ('deep_page', dict(query=u'engineer', page=10)),
+    ('search_page', dict(query=u'python', sort=('created', 'desc'),
+                         facets=True, snippets=True)),
+])
+
+
+# Misspelt queries the speller is measured with, see `Index.correct()`.
+CORRECTIONS = [u'pyhton', u'devloper', u'enginer', u'javscript']
+
+
+def summarize(latencies):
+    """Returns a dict with the count, mean, max and percentiles of
+    `latencies`, in milliseconds.
+
+    :param latencies: A list of durations in seconds.
+
+    """
+    values = sorted(latency * 1000 for latency in latencies)
+    return OrderedDict([
+        ('count', len(values)),
+        ('mean', sum(values) / len(values) if values else None),
+        ('p50', percentile(values, 50)),
+        ('p90', percentile(values, 90)),
+        ('p99', percentile(values, 99)),
+        ('max', values[-1] if values else None)
+    ])
+
+
+class SearchBenchmark(object):
+    """Runs all benchmarks against a fresh index in a temporary directory.
+
+    :param size: The number of documents to index.
+    :param seed: Seed of the corpus generator.
+    :param procs: Number of indexing processes for the bulk load, see
+    `Index.bulk_writer()`.
+
+    """
+    def __init__(self, size, seed=0, procs=1):
+        self.size = size
+        self.seed = seed
+        self.procs = procs
+
+    def run(self, updates=100, repeat=20):
+        """Runs all benchmarks and returns their results as a dict.
+
+        :param updates: How many documents to update one by one.
+        :param repeat: How many times to run every query of the mix.
+
+        """
+        directory = tempfile.mkdtemp(prefix='jobber-benchmark-')
+        try:
+            IndexManager.create(Schema, 'benchmark', directory)
+            index = Index('benchmark', directory)
+            corpus = CorpusGenerator(self.seed)
+            results = OrderedDict()
+            results['documents'] = self.size
+            results['bulk'] = self.bulk(index, corpus)
+            results['updates'] = self.updates(index, corpus, updates)
+            results['queries'] = self.queries(index, repeat)
+            results['corrections'] = self.corrections(index, repeat)
+            results['index'] = index.segment_stats()
+            return results
+        finally:
+            shutil.rmtree(directory)
+
+    def bulk(self, index, corpus):
+        """Indexes the corpus with a bulk writer and returns the throughput."""
+        docs = list(corpus.documents(self.size))
+        started = time.time()
+        writer = index.bulk_writer(procs=self.procs)
+        index.add_document_bulk(docs, writer=writer)
+        elapsed = time.time() - started
+        return {
+            'seconds': elapsed,
+            'docs_per_second': len(docs) / elapsed if elapsed else None
+        }
+
+    def updates(self, index, corpus, count):
+        """Replaces `count` random documents through `Index.update_document()`,
+        committing each, and returns the latencies.
+
+        """
+        latencies = []
+        for _ in xrange(count):
+            doc = corpus.document(corpus.random.randint(1, self.size))
+            started = time.time()
+            index.update_document(doc)
+            latencies.append(time.time() - started)
+        return summarize(latencies)
+
+    def queries(self, index, repeat):
+        """Runs every query of `QUERY_MIX` `repeat` times and returns their
+        latencies, by name and overall.
+
+        Caches are cleared before every run, so that the searches themselves
+        are measured.
+
+        """
+        results = OrderedDict()
+        overall = []
+        for name, kwargs in QUERY_MIX.items():
+            latencies = []
+            for _ in xrange(repeat):
+                self.clear_caches(index)
+                started = time.time()
+                page = index.search_page(**kwargs)
+                latencies.append(time.time() - started)
+            results[name] = summarize(latencies)
+            results[name]['hits'] = page.total
+            overall.extend(latencies)
+        results['all'] = summarize(overall)
+        return results
+
+    def corrections(self, index, repeat):
+        """Corrects every query of `CORRECTIONS` `repeat` times and returns the
+        latencies. The first correction also builds the speller.
+
+        """
+        latencies = []
+        for _ in xrange(repeat):
+            for query in CORRECTIONS:
+                started = time.time()
+                index.correct(query)
+                latencies.append(time.time() - started)
+        return summarize(latencies)
+
+    def clear_caches(self, index):
+        index.query_cache().clear()
+        index.filter_cache().clear()
@@ -6,4 +6,9 @@ Exposes the `Flask` application.
 
 """
 from jobber import factory
-app = factory.create_app(__name__)
\ No newline at end of file
+
+app = factory.create_app(__name__)
+
+# Suggestions are served from memory, and so is the search index with the
+# `memory` backend, see `configure_search()`.
+factory.configure_search(app)
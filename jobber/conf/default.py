@@ -31,8 +31,53 @@ LOGGING_LEVEL = logging.DEBUG
 SQLALCHEMY_DATABASE_URI = '<uri>'
 SQLALCHEMY_ECHO = True
 
+SEARCH_BACKEND = 'whoosh'
 SEARCH_INDEX_DIRECTORY = '<dir>'
 SEARCH_INDEX_NAME = '<name>'
+SEARCH_INDEX_KEEP_VERSIONS = 1
+SEARCH_PAGE_LENGTH = 20
+SEARCH_MAX_PAGE_LENGTH = 100
+SEARCH_MAX_PAGE = 50
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 300
+SEARCH_FILTER_CACHE_SIZE = 128
+SEARCH_STORED_LISTINGS = False
+SEARCH_SNIPPET_LENGTH = 200
+SEARCH_SNIPPET_CHARLIMIT = 10000
+SEARCH_SNIPPET_TIME_LIMIT = 0.005
+SEARCH_TIME_LIMIT = 1.0
+SEARCH_SPELLING_MAX_HITS = 2
+SEARCH_SPELLING_MAXDIST = 2
+SEARCH_SPELLING_PREFIX = 1
+SEARCH_SLOW_QUERY_THRESHOLD = 0.5
+SEARCH_SLOW_QUERY_LOG = None
+SEARCH_DAEMON_SOCKET = None
+SEARCH_DAEMON_TIMEOUT = 5
+SEARCH_DAEMON_WORKERS = 2
+SEARCH_MEMORY_SYNC_INTERVAL = 5
+SEARCH_MEMORY_CHANGES_RETENTION = 86400
+SEARCH_SUGGEST_RELOAD_INTERVAL = 60
+
+METRICS_ENABLED = False
+METRICS_WINDOW = 1000
+
+SIMILAR_JOBS_COUNT = 5
+SIMILAR_JOBS_BATCH_SIZE = 500
+
+SUGGEST_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+
+INDEX_WORKER_BATCH_SIZE = 100
+INDEX_WORKER_POLL_INTERVAL = 2
+INDEX_REBUILD_RETRY_DELAY = 60
+INDEX_REBUILD_MAX_RETRY_DELAY = 3600
+INDEX_DRAINED_RETENTION = 86400
+INDEX_EXPORT_CHUNK_SIZE = 500
+INDEX_WRITER_TIMEOUT = 5
+INDEX_MERGE_POLICY = 'merge'
+INDEX_MERGE_MIN_SEGMENTS = 10
+INDEX_MAINTENANCE_INTERVAL = 3600
+INDEX_MAINTENANCE_WINDOW = (2, 5)
 
 MAIL_SERVER = 'localhost'
 MAIL_PORT = 25
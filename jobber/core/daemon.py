@@ -0,0 +1,327 @@
+"""
+jobber.core.daemon
+~~~~~~~~~~~~~~~~~~
+
+A search server owning one warm `Index`, shared by all web workers on a host
+through a Unix socket, see `SearchServer` and `RemoteIndex`.
+
+Requests and responses are single lines of JSON. A request names one of
+`SearchServer.METHODS` and its keyword arguments, i.e.
+
+    {"method": "search_page", "kwargs": {"query": "python", "page": 2}}
+
+and is answered with either `{"result": ...}` or `{"error": "..."}`. Any
+number of requests can be sent over the same connection.
+
+"""
+import json
+import os
+import socket
+import logging
+from Queue import Queue
+from datetime import datetime
+from threading import Lock, Thread, local
+from SocketServer import ThreadingUnixStreamServer, StreamRequestHandler
+
+from jobber.conf import settings
+from jobber.core.search import Index, SearchPage
+
+
+logger = logging.getLogger('jobber.search_daemon')
+
+
+class DaemonError(Exception):
+    """Raised by `RemoteIndex` when the search server is unreachable or
+    failed to answer a request.
+
+    """
+    pass
+
+
+class DaemonUnavailable(DaemonError):
+    """Raised by `RemoteIndex` when the search server can't be reached, as
+    opposed to failing a request.
+
+    """
+    pass
+
+
+def encode(message):
+    """Returns `message` as a line of JSON. Datetimes, i.e. in stored
+    listings, are sent as ISO 8601 strings.
+
+    :param message: A JSON-serializable dict.
+
+    """
+    def default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(u"{!r} is not JSON serializable.".format(value))
+    return json.dumps(message, default=default) + '\n'
+
+
+def page_to_dict(page):
+    return {
+        'items': page.items,
+        'page': page.page,
+        'per_page': page.per_page,
+        'total': page.total,
+        'facets': page.facets,
+        'snippets': page.snippets,
+        'correction': page.correction,
+        'truncated': page.truncated
+    }
+
+
+def page_from_dict(data):
+    facets = dict((name, [tuple(value) for value in values])
+                  for name, values in data['facets'].items())
+    return SearchPage(data['items'], data['page'], data['per_page'],
+                      data['total'], facets=facets, snippets=data['snippets'],
+                      correction=data['correction'],
+                      truncated=data['truncated'])
+
+
+class SearchRequestHandler(StreamRequestHandler):
+    """Answers the requests sent over a single connection, until the client
+    closes it.
+
+    """
+    def setup(self):
+        StreamRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.lock:
+            self.server.connections.discard(self.connection)
+        StreamRequestHandler.finish(self)
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            response = self.server.submit(line)
+            self.wfile.write(encode(response))
+            self.wfile.flush()
+
+
+class SearchServer(ThreadingUnixStreamServer):
+    """Serves searches on the Whoosh `index` over the Unix socket at `path`.
+
+    Every connection gets a thread reading its requests, but requests are
+    answered by a fixed pool of `workers` threads. Whoosh searchers can't be
+    shared between threads, so every thread searching keeps one of its own,
+    see `IndexRegistry.searcher()`, and the pool bounds them to `workers` for
+    the whole host however many web workers are connected. The index, its
+    caches and spellers are shared by all threads through the `IndexRegistry`
+    of this process, loaded once and refreshed in one place whenever the
+    index worker commits. Only reads are served, writes keep going through
+    the `index_updates` outbox.
+
+    :param path: The path of the Unix socket, replaced if it already exists.
+    :param index: The `Index` to search, defaults to the configured one.
+    :param workers: Number of threads answering requests, defaults to the
+    `SEARCH_DAEMON_WORKERS` setting.
+
+    """
+    daemon_threads = True
+
+    #: The methods of `Index` that clients may call.
+    METHODS = ('search', 'search_page', 'correct', 'ping')
+
+    def __init__(self, path, index=None, workers=None):
+        if workers is None:
+            workers = settings.SEARCH_DAEMON_WORKERS
+        if os.path.exists(path):
+            os.unlink(path)
+        self.path = path
+        self.index = index or Index()
+        self.lock = Lock()
+        self.connections = set()
+        self.requests = Queue()
+        self.workers = []
+        for i in range(workers):
+            worker = Thread(target=self.work, name='search-{}'.format(i))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        ThreadingUnixStreamServer.__init__(self, path, SearchRequestHandler)
+
+    def work(self):
+        """Answers queued requests until `None` is queued. Opens a searcher
+        and builds the speller first, so that the first request doesn't have
+        to.
+
+        """
+        try:
+            self.index.correct(u'')
+        except Exception:
+            logger.exception('Failed to warm up the index!')
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            line, reply = request
+            reply.put(self.dispatch(line))
+
+    def submit(self, line):
+        """Queues the request in `line` for the worker threads and returns
+        the response message once answered.
+
+        """
+        reply = Queue(maxsize=1)
+        self.requests.put((line, reply))
+        return reply.get()
+
+    def dispatch(self, line):
+        """Runs the request in `line` and returns the response message."""
+        try:
+            request = json.loads(line)
+            method = request['method']
+            kwargs = request.get('kwargs') or {}
+            if method not in self.METHODS:
+                return {'error': u"Unknown method {!r}.".format(method)}
+            if method == 'ping':
+                return {'result': True}
+            if kwargs.get('sort'):
+                # Sorts are used in cache keys and have to be hashable.
+                kwargs['sort'] = tuple(kwargs['sort'])
+            kwargs = dict((str(name), value) for name, value in kwargs.items())
+            result = getattr(self.index, method)(**kwargs)
+        except Exception as e:
+            logger.exception('Failed to answer search request!')
+            return {'error': u"{}: {}".format(type(e).__name__, e)}
+        if isinstance(result, SearchPage):
+            result = page_to_dict(result)
+        return {'result': result}
+
+    def server_close(self):
+        """Stops listening and closes all open connections."""
+        ThreadingUnixStreamServer.server_close(self)
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        # Requests queued so far are still answered first.
+        for worker in self.workers:
+            self.requests.put(None)
+
+
+class RemoteIndex(object):
+    """Client of a `SearchServer`, exposing the read methods of
+    `jobber.core.search.Index`.
+
+    Every thread keeps its own connection to the server open between
+    requests, and reconnects once if the server closed it in the meantime.
+    Datetimes in hits come back as ISO 8601 strings.
+
+    :param path: The path of the Unix socket, defaults to the
+    `SEARCH_DAEMON_SOCKET` setting.
+    :param timeout: Seconds to wait for the server, defaults to the
+    `SEARCH_DAEMON_TIMEOUT` setting.
+
+    """
+    # Connections shared by all clients in this process, by socket path.
+    local = local()
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or settings.SEARCH_DAEMON_SOCKET
+        if timeout is None:
+            timeout = settings.SEARCH_DAEMON_TIMEOUT
+        self.timeout = timeout
+
+    def search(self, query, limit=None, sort=None, filters=None):
+        """Searches the index, see `Index.search()`."""
+        return self.call('search', query=query, limit=limit, sort=sort,
+                         filters=filters)
+
+    def search_page(self, query, page=1, pagelen=None, sort=None,
+                    facets=False, filters=None, snippets=False):
+        """Searches the index and returns a `SearchPage` of hits, see
+        `Index.search_page()`.
+
+        """
+        result = self.call('search_page', query=query, page=page,
+                           pagelen=pagelen, sort=sort, facets=facets,
+                           filters=filters, snippets=snippets)
+        return page_from_dict(result)
+
+    def correct(self, query):
+        """Returns a corrected version of `query`, see `Index.correct()`."""
+        return self.call('correct', query=query)
+
+    def ping(self):
+        """Returns `True` if the server answers."""
+        return self.call('ping')
+
+    def call(self, method, **kwargs):
+        """Sends a request for `method` with `kwargs` to the server and returns
+        its result.
+
+        :param method: One of `SearchServer.METHODS`.
+
+        """
+        message = encode({'method': method, 'kwargs': kwargs})
+        try:
+            try:
+                line = self._send(message, reuse=True)
+            except socket.error:
+                # The server may have restarted since the last request.
+                line = self._send(message, reuse=False)
+        except socket.error as e:
+            self.close()
+            raise DaemonUnavailable(
+                u"Search daemon at {} is unreachable: {}".format(self.path, e)
+            )
+        if not line:
+            self.close()
+            raise DaemonUnavailable(
+                u"Search daemon at {} closed the connection.".format(self.path)
+            )
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response['result']
+
+    def close(self):
+        """Closes the connection of the calling thread, if any."""
+        connection = self._connections().pop(self.path, None)
+        if connection is not None:
+            connection[0].close()
+            connection[1].close()
+
+    def _send(self, message, reuse):
+        if not reuse:
+            self.close()
+        connections = self._connections()
+        connection = connections.get(self.path)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                sock.close()
+                raise
+            connection = connections[self.path] = (sock, sock.makefile('rb'))
+        sock, rfile = connection
+        sock.sendall(message)
+        line = rfile.readline()
+        if not line and reuse:
+            # A stale connection reads as closed, retry on a new one.
+            raise socket.error('Connection closed.')
+        return line
+
+    def _connections(self):
+        connections = getattr(self.local, 'connections', None)
+        if connections is None:
+            connections = self.local.connections = {}
+        return connections
@@ -0,0 +1,358 @@
+"""
+jobber.core.fts
+~~~~~~~~~~~~~~~
+
+Search backend on top of an SQLite FTS5 table, see `FTSIndex`.
+
+"""
+import re
+from collections import defaultdict
+
+from sqlalchemy import text
+from whoosh.compat import htmlescape
+
+from jobber.conf import settings
+from jobber.database import db
+from jobber.core.search import (FACET_FIELDS, FILTER_FIELDS, FILTER_NORMALIZERS,
+                                IndexBatch, SearchPage, SearchTimings,
+                                split_query)
+
+
+# Name of the FTS5 table, created by the migrations.
+FTS_TABLE = 'jobs_fts'
+
+
+# Columns of the FTS5 table that are matched against queries, in order.
+FTS_SEARCHABLE_COLUMNS = ('title', 'description', 'company', 'location',
+                          'job_type', 'tags')
+
+
+# Columns of the FTS5 table that are only used for filtering, faceting and
+# sorting, in order.
+FTS_UNINDEXED_COLUMNS = ('type', 'country', 'city', 'remote', 'created')
+
+
+FTS_COLUMNS = FTS_SEARCHABLE_COLUMNS + FTS_UNINDEXED_COLUMNS
+
+
+# Phrases and single tokens of a query string.
+TOKEN_REGEX = re.compile(r'"([^"]*)"|(\S+)', re.UNICODE)
+
+
+# Words within tokens, anything else is dropped from FTS5 queries.
+WORD_REGEX = re.compile(r'\w+', re.UNICODE)
+
+
+# Boolean operators understood by both the Whoosh parser and FTS5.
+OPERATORS = ('AND', 'OR', 'NOT')
+
+
+# Highlighted terms in snippets are delimited by these, so that the snippet
+# can be escaped before the markers are turned into tags.
+MATCH_START = u'\x02'
+MATCH_END = u'\x03'
+
+
+def match_expression(query):
+    """Turns the text part of a users query into an FTS5 `MATCH` expression,
+    or returns `None` if it contains no words.
+
+    Every word and phrase is quoted, so that characters special to FTS5 can't
+    break the query. `AND`, `OR` and `NOT` are kept as operators as long as
+    they sit between two terms, like the Whoosh query parser does.
+
+    :param query: A string containing the users query, without filters.
+
+    """
+    parts = []
+    for match in TOKEN_REGEX.finditer(query):
+        phrase, token = match.groups()
+        if token in OPERATORS:
+            # Operators must follow a term, the last one given wins.
+            if parts and parts[-1] in OPERATORS:
+                parts[-1] = token
+            elif parts:
+                parts.append(token)
+            continue
+        words = WORD_REGEX.findall(phrase if phrase is not None else token)
+        if phrase is not None:
+            words = [u' '.join(words)] if words else []
+        parts.extend(u'"{}"'.format(word) for word in words)
+
+    while parts and parts[-1] in OPERATORS:
+        parts.pop()
+    return u' '.join(parts) or None
+
+
+class FTSIndex(object):
+    """Search index kept in the `jobs_fts` SQLite FTS5 table, exposing the
+    same interface as `jobber.core.search.Index`.
+
+    Documents are written through a SQLAlchemy session, so they are committed
+    or rolled back along with the rest of the transaction and searches see
+    the uncommitted changes of their own session. There is no index directory
+    and no writer lock. For the same reason, results are never cached.
+
+    Rows of the table are keyed by the job id, which is used as the `rowid`.
+
+    :param session: The `Session` to read and write with, defaults to
+    `db.session`.
+
+    """
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    def search(self, query, limit=None, sort=None, filters=None):
+        """Searches the index, see `Index.search()`. Hits only contain the
+        document `id`.
+
+        """
+        timings = SearchTimings(query)
+        match, clauses, params = self._prepare(query, filters)
+        timings.parsed()
+        if not clauses:
+            timings.finish(0)
+            return []
+
+        rows = self._select(['rowid'], match, clauses, params, sort, limit)
+        hits = [{'id': unicode(row[0])} for row in rows]
+        timings.searched()
+        timings.finish(len(hits))
+        return hits
+
+    def search_page(self, query, page=1, pagelen=None, sort=None,
+                    facets=False, filters=None, snippets=False):
+        """Searches the index like `search()` and returns a `SearchPage` of
+        hits, see `Index.search_page()`.
+
+        Snippets are built by FTS5 from the matching description tokens, and
+        there are none for searches with filters only.
+
+        """
+        if pagelen is None:
+            pagelen = settings.SEARCH_PAGE_LENGTH
+        timings = SearchTimings(query)
+        match, clauses, params = self._prepare(query, filters)
+        timings.parsed()
+        if not clauses:
+            timings.finish(0)
+            return SearchPage([], page, pagelen, 0)
+
+        total = self._count(clauses, params)
+        columns = ['rowid']
+        select_params = params
+        snippets = snippets and match is not None
+        if snippets:
+            columns.append(self._snippet_column())
+            select_params = dict(params, start=MATCH_START, end=MATCH_END)
+        rows = self._select(columns, match, clauses, select_params, sort,
+                            pagelen, offset=(page - 1) * pagelen)
+
+        hits = [{'id': unicode(row[0])} for row in rows]
+        highlights = None
+        if snippets:
+            highlights = dict((unicode(row[0]), self._highlight(row[1]))
+                              for row in rows if row[1])
+        counts = self._facet_counts(clauses, params) if facets else None
+        timings.searched()
+        timings.finish(total)
+        return SearchPage(hits, page, pagelen, total, facets=counts,
+                          snippets=highlights)
+
+    def correct(self, query):
+        """Spelling corrections are not supported, always returns `None`."""
+        return None
+
+    def add_document(self, doc, commit=True, writer=None):
+        """Adds a single document to the index.
+
+        :param doc: The document to add.
+        :param commit: Commit the session after adding.
+        :param writer: A `Session` to write with instead.
+
+        """
+        session = writer or self.session
+        session.execute(self._insert_sql(), self._row(doc))
+        self._commit(session, commit)
+
+    def add_document_bulk(self, docs, commit=True, writer=None):
+        """Adds multiple documents to the index, `INDEX_EXPORT_CHUNK_SIZE` at
+        a time. Returns the number of documents added.
+
+        :param docs: An iterable of documents to add.
+        :param commit: Commit the session after adding.
+        :param writer: A `Session` to write with instead.
+
+        """
+        session = writer or self.session
+        insert = self._insert_sql()
+        count = 0
+        rows = []
+        for doc in docs:
+            rows.append(self._row(doc))
+            if len(rows) >= settings.INDEX_EXPORT_CHUNK_SIZE:
+                session.execute(insert, rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            session.execute(insert, rows)
+            count += len(rows)
+        self._commit(session, commit)
+        return count
+
+    def update_document(self, doc, commit=True, writer=None):
+        """Adds or replaces a document in the index.
+
+        :param doc: A document to update.
+        :param commit: Commit the session after updating.
+        :param writer: A `Session` to write with instead.
+
+        """
+        session = writer or self.session
+        self._delete(session, doc['id'])
+        session.execute(self._insert_sql(), self._row(doc))
+        self._commit(session, commit)
+
+    def delete_document(self, docid, commit=True, writer=None):
+        """Deletes the document with `docid` from the index.
+
+        :param docid: The id of the document to delete.
+        :param commit: Commit the session after deleting.
+        :param writer: A `Session` to write with instead.
+
+        """
+        session = writer or self.session
+        self._delete(session, docid)
+        self._commit(session, commit)
+
+    def apply_batch(self, batch, commit=True, writer=None):
+        """Applies all mutations collected in an `IndexBatch`.
+
+        :param batch: An `IndexBatch` instance.
+        :param commit: Commit the session after applying.
+        :param writer: A `Session` to write with instead.
+
+        """
+        session = writer or self.session
+        for action, value in batch:
+            if action == IndexBatch.DELETE:
+                self._delete(session, value)
+            else:
+                self.update_document(value, commit=False, writer=session)
+        self._commit(session, commit)
+
+    def clear(self, commit=True):
+        """Deletes all documents from the index."""
+        self.session.execute(text('DELETE FROM {}'.format(FTS_TABLE)))
+        self._commit(self.session, commit)
+
+    def _prepare(self, query, filters):
+        """Returns a tuple of the `MATCH` expression for `query`, or `None`,
+        and the `WHERE` clauses and parameters for it and all filters. There
+        are no clauses if there is nothing to search for.
+
+        """
+        query, filters = split_query(query, filters)
+        match = match_expression(query)
+        clauses = []
+        params = {}
+        if match is not None:
+            clauses.append('{} MATCH :match'.format(FTS_TABLE))
+            params['match'] = match
+        elif query or not filters:
+            # Nothing but punctuation, or no query at all.
+            return None, [], {}
+
+        for name, values in sorted(filters.items()):
+            field = FILTER_FIELDS[name]
+            normalize = FILTER_NORMALIZERS.get(name, lambda value: value)
+            for value in values:
+                param = 'filter{}'.format(len(params))
+                if field == 'tags':
+                    # Not `LIKE`, which would treat `%` and `_` in the tag as
+                    # wildcards.
+                    clauses.append("instr(',' || tags || ',', :{}) > 0"
+                                   .format(param))
+                    params[param] = u',{},'.format(normalize(value))
+                else:
+                    clauses.append('{} = :{}'.format(field, param))
+                    params[param] = normalize(value)
+        return match, clauses, params
+
+    def _select(self, columns, match, clauses, params, sort, limit, offset=0):
+        sql = 'SELECT {} FROM {} WHERE {}'.format(', '.join(columns),
+                                                  FTS_TABLE,
+                                                  ' AND '.join(clauses))
+        if sort:
+            field, direction = sort
+            if field not in FTS_COLUMNS:
+                raise ValueError(u"Can't sort on {!r}.".format(field))
+            sql += ' ORDER BY {} {}'.format(field,
+                                            'DESC' if direction == 'desc' else 'ASC')
+        elif match is not None:
+            sql += ' ORDER BY rank'
+        else:
+            sql += ' ORDER BY created DESC'
+        params = dict(params)
+        if limit is not None:
+            sql += ' LIMIT :limit OFFSET :offset'
+            params.update(limit=limit, offset=offset)
+        return self.session.execute(text(sql), params).fetchall()
+
+    def _count(self, clauses, params):
+        sql = 'SELECT count(*) FROM {} WHERE {}'.format(FTS_TABLE,
+                                                        ' AND '.join(clauses))
+        return self.session.execute(text(sql), params).scalar()
+
+    def _facet_counts(self, clauses, params):
+        fields = FACET_FIELDS.values()
+        sql = 'SELECT {} FROM {} WHERE {}'.format(', '.join(fields), FTS_TABLE,
+                                                  ' AND '.join(clauses))
+        counters = dict((field, defaultdict(int)) for field in fields)
+        for row in self.session.execute(text(sql), params):
+            for field, value in zip(fields, row):
+                values = value.split(u',') if field == 'tags' and value else [value]
+                for value in values:
+                    if value:
+                        counters[field][value] += 1
+
+        counts = {}
+        for name, field in FACET_FIELDS.items():
+            values = counters[field].items()
+            values.sort(key=lambda (value, count): (-count, value))
+            counts[name] = values
+        return counts
+
+    def _snippet_column(self):
+        column = FTS_COLUMNS.index('description')
+        # FTS5 counts snippet sizes in tokens, take a word per 7 characters.
+        tokens = max(1, min(64, settings.SEARCH_SNIPPET_LENGTH / 7))
+        return "snippet({}, {}, :start, :end, '...', {})".format(FTS_TABLE,
+                                                                 column,
+                                                                 tokens)
+
+    def _highlight(self, snippet):
+        snippet = htmlescape(snippet, quote=False)
+        return snippet.replace(MATCH_START, u'<strong class="match">')\
+                      .replace(MATCH_END, u'</strong>')
+
+    def _insert_sql(self):
+        columns = ', '.join(('rowid',) + FTS_COLUMNS)
+        values = ', '.join(':' + column for column in ('rowid',) + FTS_COLUMNS)
+        return text('INSERT INTO {} ({}) VALUES ({})'.format(FTS_TABLE, columns,
+                                                             values))
+
+    def _row(self, doc):
+        row = dict((column, doc.get(column)) for column in FTS_COLUMNS)
+        row['rowid'] = int(doc['id'])
+        if row['created'] is not None:
+            row['created'] = row['created'].isoformat()
+        return row
+
+    def _delete(self, session, docid):
+        sql = text('DELETE FROM {} WHERE rowid = :rowid'.format(FTS_TABLE))
+        session.execute(sql, {'rowid': int(docid)})
+
+    def _commit(self, session, commit):
+        if commit:
+            session.commit()
@@ -0,0 +1,440 @@
+"""
+jobber.core.memory
+~~~~~~~~~~~~~~~~~~
+
+In-process BM25 search over the published jobs, see `MemoryIndex`.
+
+"""
+import math
+from array import array
+from collections import defaultdict, namedtuple
+from threading import RLock
+
+from whoosh.compat import htmlescape
+
+from jobber.conf import settings
+from jobber.core.search import (SEARCHABLE_FIELDS, FACET_FIELDS, FILTER_FIELDS,
+                                FILTER_NORMALIZERS, IndexBatch, SearchPage,
+                                SearchTimings, analyze, split_query,
+                                stemming_analyzer)
+
+
+# Fields kept for every document to filter, facet and sort on.
+VALUE_FIELDS = ('type', 'country', 'city', 'remote', 'created')
+
+
+#: A matching document, see `InvertedIndex.match()`.
+Match = namedtuple('Match', 'docnum score docid values')
+
+
+class Postings(object):
+    """The documents a term occurs in, as parallel arrays of ascending
+    document numbers and term frequencies.
+
+    """
+    __slots__ = ('docnums', 'freqs')
+
+    def __init__(self):
+        self.docnums = array('i')
+        self.freqs = array('i')
+
+    def __len__(self):
+        return len(self.docnums)
+
+    def append(self, docnum, freq):
+        self.docnums.append(docnum)
+        self.freqs.append(freq)
+
+
+class InvertedIndex(object):
+    """An inverted index of job documents, kept entirely in memory and ranked
+    with BM25.
+
+    Every document gets a new, ascending document number when it is added, so
+    postings only ever grow at the end. Deleted documents are marked as dead
+    and skipped, until more than half of the document numbers are dead and the
+    postings are compacted.
+
+    :param k1: BM25 term frequency saturation.
+    :param b: BM25 document length normalization.
+
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = RLock()
+        self.loaded = False
+        # The last `JobChange` applied and when the index was last brought up
+        # to date with them, see `sync_memory_index()`.
+        self.change_id = 0
+        self.synced = None
+        self.clear()
+
+    def __len__(self):
+        return len(self.docnums)
+
+    def clear(self):
+        with self.lock:
+            self.postings = {}
+            # Number of live documents every term occurs in, along with the
+            # terms of every document to keep it up to date on removal.
+            self.frequencies = {}
+            self.terms = []
+            self.lengths = array('i')
+            self.live = array('b')
+            self.ids = []
+            self.values = []
+            self.docnums = {}
+            self.total_length = 0
+
+    def load(self, docs):
+        """(Re)builds the index from `docs`.
+
+        :param docs: An iterable of documents, see `Job.to_document()`.
+
+        """
+        with self.lock:
+            self.clear()
+            for doc in docs:
+                self._add(doc)
+            self.loaded = True
+
+    def update(self, doc):
+        """Adds or replaces `doc`.
+
+        :param doc: A document, see `Job.to_document()`.
+
+        """
+        with self.lock:
+            self._remove(doc['id'])
+            self._add(doc)
+
+    def remove(self, docid):
+        """Removes the document with `docid`, if any.
+
+        :param docid: The id of the document.
+
+        """
+        with self.lock:
+            self._remove(docid)
+
+    def match(self, terms, filters=None):
+        """Returns a list of `Match` tuples for all documents that contain
+        every one of `terms` and match all `filters`, in no particular order.
+        Without terms, every document matching the filters is returned with a
+        score of 0.
+
+        Matches carry the id and values of their document, since document
+        numbers may be reused by other threads as soon as the lock is released.
+
+        :param terms: A list of analyzed query terms.
+        :param filters: A dict mapping `FILTER_FIELDS` names to lists of
+        values.
+
+        """
+        with self.lock:
+            if terms:
+                scores = self._score(terms)
+            else:
+                scores = dict((docnum, 0.0) for docnum in self.docnums.values())
+            ids, values = self.ids, self.values
+            checks = self._filter_checks(filters) if filters else []
+            return [Match(docnum, score, ids[docnum], values[docnum])
+                    for docnum, score in scores.iteritems()
+                    if all(check(values[docnum]) for check in checks)]
+
+    def _score(self, terms):
+        postings = []
+        for term in set(terms):
+            frequency = self.frequencies.get(term)
+            if not frequency:
+                return {}
+            postings.append((frequency, self.postings[term]))
+        # Start with the rarest term, which has the fewest candidates.
+        postings.sort(key=lambda (frequency, posting): frequency)
+
+        count = len(self.docnums)
+        average = float(self.total_length) / count if count else 0.0
+        k1, b = self.k1, self.b
+        lengths, live = self.lengths, self.live
+
+        scores = None
+        for frequency, posting in postings:
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            matched = {}
+            for docnum, freq in zip(posting.docnums, posting.freqs):
+                if not live[docnum]:
+                    continue
+                if scores is not None and docnum not in scores:
+                    continue
+                norm = k1 * (1 - b + b * lengths[docnum] / average)
+                score = idf * freq * (k1 + 1) / (freq + norm)
+                matched[docnum] = score + (scores[docnum] if scores else 0.0)
+            scores = matched
+            if not scores:
+                break
+        return scores or {}
+
+    def _filter_checks(self, filters):
+        checks = []
+        for name, values in filters.items():
+            field = FILTER_FIELDS[name]
+            normalize = FILTER_NORMALIZERS.get(name, lambda value: value)
+            for value in values:
+                value = normalize(value)
+                if field == 'tags':
+                    checks.append(lambda doc, value=value: value in doc['tags'])
+                else:
+                    checks.append(lambda doc, field=field, value=value:
+                                  doc.get(field) == value)
+        return checks
+
+    def _add(self, doc):
+        docnum = len(self.ids)
+        frequencies = defaultdict(int)
+        length = 0
+        for field in SEARCHABLE_FIELDS:
+            for term in analyze(doc.get(field)):
+                frequencies[term] += 1
+                length += 1
+        for term, freq in frequencies.iteritems():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = Postings()
+            posting.append(docnum, freq)
+            self.frequencies[term] = self.frequencies.get(term, 0) + 1
+
+        values = dict((field, doc.get(field)) for field in VALUE_FIELDS)
+        values['tags'] = set(tag for tag in (doc.get('tags') or u'').split(u',')
+                             if tag)
+        values['description'] = doc.get('description')
+
+        self.ids.append(doc['id'])
+        self.terms.append(tuple(frequencies))
+        self.values.append(values)
+        self.lengths.append(length)
+        self.live.append(1)
+        self.docnums[doc['id']] = docnum
+        self.total_length += length
+
+    def _remove(self, docid):
+        docnum = self.docnums.pop(docid, None)
+        if docnum is None:
+            return
+        self.live[docnum] = 0
+        self.values[docnum] = None
+        for term in self.terms[docnum]:
+            self.frequencies[term] -= 1
+            if not self.frequencies[term]:
+                del self.frequencies[term]
+        self.terms[docnum] = None
+        self.total_length -= self.lengths[docnum]
+        if len(self.ids) > 2 * len(self.docnums):
+            self._compact()
+
+    def _compact(self):
+        """Drops dead documents and renumbers the rest."""
+        renumbered = {}
+        for docnum in xrange(len(self.ids)):
+            if self.live[docnum]:
+                renumbered[docnum] = len(renumbered)
+
+        postings = {}
+        for term, posting in self.postings.iteritems():
+            compacted = Postings()
+            for docnum, freq in zip(posting.docnums, posting.freqs):
+                if docnum in renumbered:
+                    compacted.append(renumbered[docnum], freq)
+            if compacted:
+                postings[term] = compacted
+
+        order = sorted(renumbered, key=renumbered.get)
+        self.postings = postings
+        self.lengths = array('i', (self.lengths[docnum] for docnum in order))
+        self.live = array('b', [1] * len(order))
+        self.ids = [self.ids[docnum] for docnum in order]
+        self.terms = [self.terms[docnum] for docnum in order]
+        self.values = [self.values[docnum] for docnum in order]
+        self.docnums = dict((docid, docnum)
+                            for docnum, docid in enumerate(self.ids))
+
+
+# Global inverted index shared by all requests in this process.
+inverted_index = InvertedIndex()
+
+
+class MemoryIndex(object):
+    """Search index over the in-memory `InvertedIndex`, exposing the same
+    interface as `jobber.core.search.Index`.
+
+    Queries are analyzed like the `Schema` fields and match the documents
+    containing all of their words. Boolean operators and phrases are not
+    supported. Documents are changed in memory right away, so `commit` and
+    `writer` are only accepted for compatibility.
+
+    Matches are snapshotted while the engine is locked, so they can be sorted,
+    counted and highlighted while other threads change the index.
+
+    Every process keeps an index of its own. Jobs changed by a process are
+    updated in its index on commit, while the other processes only pick them
+    up from the `job_changes` log, within `SEARCH_MEMORY_SYNC_INTERVAL`
+    seconds, see `sync_memory_index()`. Until then they may still match
+    unpublished jobs and miss new ones.
+
+    :param engine: The `InvertedIndex` to use, defaults to the global one.
+
+    """
+    def __init__(self, engine=None):
+        self.engine = engine or inverted_index
+
+    def search(self, query, limit=None, sort=None, filters=None):
+        """Searches the index, see `Index.search()`. Hits only contain the
+        document `id`.
+
+        """
+        timings = SearchTimings(query)
+        terms, filters = self._prepare(query, filters)
+        timings.parsed()
+        if terms is None:
+            timings.finish(0)
+            return []
+
+        matches = self._sorted(self.engine.match(terms, filters), sort)
+        timings.searched()
+        timings.finish(len(matches))
+        if limit is not None:
+            matches = matches[:limit]
+        return [{'id': match.docid} for match in matches]
+
+    def search_page(self, query, page=1, pagelen=None, sort=None,
+                    facets=False, filters=None, snippets=False):
+        """Searches the index like `search()` and returns a `SearchPage` of
+        hits, see `Index.search_page()`.
+
+        """
+        if pagelen is None:
+            pagelen = settings.SEARCH_PAGE_LENGTH
+        timings = SearchTimings(query)
+        terms, filters = self._prepare(query, filters)
+        timings.parsed()
+        if terms is None:
+            timings.finish(0)
+            return SearchPage([], page, pagelen, 0)
+
+        matches = self.engine.match(terms, filters)
+        counts = self._facet_counts(matches) if facets else None
+        matches = self._sorted(matches, sort)
+        start = (page - 1) * pagelen
+        selected = matches[start:start + pagelen]
+
+        hits = [{'id': match.docid} for match in selected]
+        highlights = None
+        if snippets and terms:
+            highlights = self._snippets(selected, set(terms))
+        timings.searched()
+        timings.finish(len(matches))
+        return SearchPage(hits, page, pagelen, len(matches), facets=counts,
+                          snippets=highlights)
+
+    def correct(self, query):
+        """Spelling corrections are not supported, always returns `None`."""
+        return None
+
+    def add_document(self, doc, commit=True, writer=None):
+        """Adds a single document to the index."""
+        self.engine.update(doc)
+
+    def add_document_bulk(self, docs, commit=True, writer=None):
+        """Adds multiple documents to the index. Returns the number of
+        documents added.
+
+        """
+        count = 0
+        for doc in docs:
+            self.engine.update(doc)
+            count += 1
+        return count
+
+    def update_document(self, doc, commit=True, writer=None):
+        """Adds or replaces a document in the index."""
+        self.engine.update(doc)
+
+    def delete_document(self, docid, commit=True, writer=None):
+        """Deletes the document with `docid` from the index."""
+        self.engine.remove(docid)
+
+    def apply_batch(self, batch, commit=True, writer=None):
+        """Applies all mutations collected in an `IndexBatch`."""
+        for action, value in batch:
+            if action == IndexBatch.DELETE:
+                self.engine.remove(value)
+            else:
+                self.engine.update(value)
+
+    def _prepare(self, query, filters):
+        """Returns a tuple of the analyzed query terms and the filters, with
+        `None` for terms if there is nothing to search for.
+
+        """
+        text, filters = split_query(query, filters)
+        terms = analyze(text)
+        if not terms and (text or not filters):
+            # Nothing but stop words or punctuation, or no query at all.
+            return None, filters
+        return terms, filters
+
+    def _sorted(self, matches, sort):
+        if not sort:
+            return sorted(matches, key=lambda match: (-match.score, match.docnum))
+        field, direction = sort
+        return sorted(matches, key=lambda match: match.values.get(field),
+                      reverse=direction == 'desc')
+
+    def _facet_counts(self, matches):
+        counters = dict((field, defaultdict(int))
+                        for field in FACET_FIELDS.values())
+        for match in matches:
+            for field, counter in counters.items():
+                value = match.values.get(field)
+                for value in (value if field == 'tags' else [value]):
+                    if value:
+                        counter[value] += 1
+
+        counts = {}
+        for name, field in FACET_FIELDS.items():
+            values = counters[field].items()
+            values.sort(key=lambda (value, count): (-count, value))
+            counts[name] = values
+        return counts
+
+    def _snippets(self, matches, terms):
+        """Returns a dict mapping document ids to HTML snippets of their
+        descriptions, starting a little before the first matched term.
+
+        """
+        length = settings.SEARCH_SNIPPET_LENGTH
+        snippets = {}
+        for match in matches:
+            text = match.values.get('description')
+            if not text:
+                continue
+            text = text[:settings.SEARCH_SNIPPET_CHARLIMIT]
+            spans = [(token.startchar, token.endchar) for token
+                     in stemming_analyzer(text, chars=True)
+                     if token.text in terms]
+            start = max(0, spans[0][0] - length / 4) if spans else 0
+            end = start + length
+
+            parts = []
+            last = start
+            for first, stop in spans:
+                if first < last or stop > end:
+                    continue
+                parts.append(htmlescape(text[last:first], quote=False))
+                parts.append(u'<strong class="match">{}</strong>'.format(
+                    htmlescape(text[first:stop], quote=False)
+                ))
+                last = stop
+            parts.append(htmlescape(text[last:end], quote=False))
+            snippets[match.docid] = u''.join(parts)
+        return snippets
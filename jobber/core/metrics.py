@@ -0,0 +1,156 @@
+"""
+jobber.core.metrics
+~~~~~~~~~~~~~~~~~~~
+
+In-process histograms of search and indexing latencies.
+
+"""
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+from jobber.conf import settings
+
+
+# Upper bounds, in seconds, of the buckets latencies are counted in.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0)
+
+
+# Upper bounds of the buckets hit counts are counted in.
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class Histogram(object):
+    """A rolling histogram over the last `size` observed values.
+
+    Besides the recent values, a lifetime `count` and `sum` are kept so that
+    scrapers can compute rates between scrapes.
+
+    :param buckets: Sorted upper bounds of the buckets.
+    :param size: How many recent values to keep.
+
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS, size=1000):
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        self.values = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    def observe(self, value):
+        """Records `value`.
+
+        :param value: A number, i.e. a duration in seconds.
+
+        """
+        with self.lock:
+            self.values.append(value)
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """Returns a dict with the lifetime `count` and `sum`, along with the
+        `buckets`, `mean`, `max` and percentiles of the recent values. Buckets
+        are a list of `(bound, count)` tuples, counting the values up to and
+        including every bound, with a last bound of `None` counting all.
+
+        """
+        with self.lock:
+            values = sorted(self.values)
+            count, total = self.count, self.sum
+
+        counts = [0] * (len(self.buckets) + 1)
+        for value in values:
+            counts[bisect_left(self.buckets, value)] += 1
+        buckets = []
+        seen = 0
+        for bound, bucket in zip(self.buckets + (None,), counts):
+            seen += bucket
+            buckets.append((bound, seen))
+
+        return {
+            'count': count,
+            'sum': total,
+            'window': len(values),
+            'mean': sum(values) / len(values) if values else None,
+            'max': values[-1] if values else None,
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'buckets': buckets
+        }
+
+
+def percentile(values, percent):
+    """Returns the `percent` percentile of the sorted `values` using the
+    nearest-rank method, or `None` if there are no values.
+
+    :param values: A sorted list of numbers.
+    :param percent: A number between 0 and 100.
+
+    """
+    if not values:
+        return None
+    rank = int(round(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Metrics(object):
+    """A named collection of `Histogram` objects, created on first use.
+
+    :param size: How many recent values every histogram keeps.
+
+    """
+    def __init__(self, size=1000):
+        self.size = size
+        self.lock = Lock()
+        self.histograms = {}
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS):
+        """Returns the histogram `name`, creating it with `buckets` if needed.
+
+        :param name: The name of the histogram, i.e. `search.total`.
+        :param buckets: Sorted upper bounds of the buckets.
+
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram(buckets, self.size)
+                self.histograms[name] = histogram
+            return histogram
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """Records `value` in the histogram `name`."""
+        self.histogram(name, buckets).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """Records how long the wrapped block took in the histogram `name`,
+        unless it raised.
+
+        """
+        started = time.time()
+        yield
+        self.observe(name, time.time() - started)
+
+    def snapshot(self):
+        """Returns a dict mapping histogram names to their snapshots."""
+        with self.lock:
+            histograms = self.histograms.items()
+        return dict((name, histogram.snapshot())
+                    for name, histogram in histograms)
+
+    def clear(self):
+        with self.lock:
+            self.histograms = {}
+
+
+# Global metrics shared by all requests in this process.
+metrics = Metrics(settings.METRICS_WINDOW)
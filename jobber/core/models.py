@@ -14,10 +14,11 @@ from sqlalchemy.orm import relationship, validates
 from sqlalchemy.ext.declarative import declarative_base
 from flask import url_for
 
-from jobber.core.search import SearchableMixin
+from jobber.core.search import SearchableMixin, fingerprint
 from jobber.core.utils import Mapping, slugify, now
 from jobber.core.utils import ensure_protocol, ArrowDateTime, strip_html
 from jobber.database import db
+from jobber.conf import settings
 
 
 Base = declarative_base()
@@ -144,6 +145,9 @@ class Job(BaseModel, SlugModelMixin, SearchableMixin):
     #: Job description.
     description = sa.Column(sa.UnicodeText, nullable=False)
 
+    #: Job description without HTML, kept in sync with `description`.
+    description_text = sa.Column(sa.UnicodeText, nullable=True)
+
     #: Is this job published on the site?
     published = sa.Column(sa.Boolean, nullable=False, default=False)
 
@@ -193,11 +197,6 @@ class Job(BaseModel, SlugModelMixin, SearchableMixin):
         if not self.admin_token:
             self.admin_token = self.make_admin_token()
 
-    @property
-    def description_text(self):
-        """Returns the description without HTML entities."""
-        return strip_html(self.description)
-
     @property
     def human_job_type(self):
         return self.JOB_TYPES.map(self.job_type)
@@ -248,6 +247,13 @@ class Job(BaseModel, SlugModelMixin, SearchableMixin):
         }
         return url_for('views.edit', **kwargs)
 
+    @validates('description')
+    def validate_description(self, key, description):
+        # Strip HTML once here, rather than on every access.
+        if description is not None:
+            self.description_text = strip_html(description)
+        return description
+
     @validates('job_type')
     def validate_job_type(self, key, job_type):
         if job_type not in self.JOB_TYPES:
@@ -301,13 +307,42 @@ class Job(BaseModel, SlugModelMixin, SearchableMixin):
         self.add_tags(tags)
 
     def to_document(self):
-        return {
+        doc = {
             'id': unicode(self.id),
             'title': self.title,
+            'description': self.description_text,
             'company': self.company.name,
             'location': u"{},{}".format(self.location.city, self.location.country_name),
             'job_type': self.human_job_type,
             'tags': u','.join(self.tag_slugs),
+            'type': self.human_job_type,
+            'country': unicode(self.location.country_code),
+            'city': self.location.city.lower(),
+            'created': self.created.datetime
+        }
+        if self.remote_work in self.REMOTE_WORK_OPTIONS:
+            doc['remote'] = self.human_remote_work.lower()
+        if settings.SEARCH_STORED_LISTINGS:
+            doc['listing'] = self.to_listing()
+        doc['fingerprint'] = fingerprint(doc)
+        return doc
+
+    def to_listing(self):
+        """Returns the data needed to render this job in search results and
+        feeds, see `jobber.services.Listing`.
+
+        """
+        return {
+            'title': self.title,
+            'slug': self.slug,
+            'published': self.published,
+            'description': self.description,
+            'job_type': self.job_type,
+            'company_name': self.company.name,
+            'company_slug': self.company.slug,
+            'city': self.location.city,
+            'country_code': self.location.country_code,
+            'tags': [(tag.slug, tag.tag) for tag in self.tags],
             'created': self.created.datetime
         }
 
@@ -430,3 +465,60 @@ class SocialBroadcast(BaseModel):
 
     #: Job id as a foreign key relationship.
     job_id = sa.Column(sa.Integer, sa.ForeignKey('jobs.id'), index=True)
+
+
+class IndexUpdate(BaseModel):
+    __tablename__ = 'index_updates'
+
+    #: Update id.
+    id = sa.Column(sa.Integer, primary_key=True)
+
+    #: Id of the job that needs to be re-indexed. This is deliberately not a
+    #: foreign key, since deleted jobs need to be removed from the index too.
+    job_id = sa.Column(sa.Integer, nullable=False, index=True)
+
+    #: When the update was applied to the index, or `None` while pending.
+    #: Drained updates are kept for `INDEX_DRAINED_RETENTION` seconds, so that
+    #: rebuilds can catch up on them, see `rebuild_index()`.
+    drained = sa.Column(ArrowDateTime(timezone=True), nullable=True)
+
+
+class JobChange(BaseModel):
+    __tablename__ = 'job_changes'
+
+    #: Change id, ascending in the order changes were committed.
+    id = sa.Column(sa.Integer, primary_key=True)
+
+    #: Id of the job that changed. Not a foreign key, like `IndexUpdate.job_id`.
+    job_id = sa.Column(sa.Integer, nullable=False)
+
+
+class SimilarUpdate(BaseModel):
+    __tablename__ = 'similar_updates'
+
+    #: Update id.
+    id = sa.Column(sa.Integer, primary_key=True)
+
+    #: Id of the job whose similar jobs need to be refreshed. Not a foreign
+    #: key, like `IndexUpdate.job_id`.
+    job_id = sa.Column(sa.Integer, nullable=False, index=True)
+
+
+class SimilarJob(BaseModel):
+    __tablename__ = 'similar_jobs'
+
+    #: Row id.
+    id = sa.Column(sa.Integer, primary_key=True)
+
+    #: Id of the job the similar job is listed for. Not a foreign key, like
+    #: `IndexUpdate.job_id`, since rows are cleaned up after jobs are deleted.
+    job_id = sa.Column(sa.Integer, nullable=False, index=True)
+
+    #: Id of the similar job.
+    similar_job_id = sa.Column(sa.Integer, nullable=False, index=True)
+
+    #: Cosine similarity of the two jobs.
+    score = sa.Column(sa.Float, nullable=False)
+
+    #: Position of the similar job in the list, starting at 0.
+    rank = sa.Column(sa.Integer, nullable=False)
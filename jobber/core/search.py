@@ -5,15 +5,36 @@ jobber.core.search
 Handles all things search.
 
 """
+import os
+import re
+import time
+import types
+import json
+import hashlib
+import logging
+from collections import OrderedDict
 from contextlib import contextmanager
+from threading import Lock, local
 
 from whoosh import index
-from whoosh.fields import SchemaClass, TEXT, ID, KEYWORD, DATETIME
-from whoosh.writing import IndexingError
+from whoosh.fields import SchemaClass, TEXT, ID, KEYWORD, DATETIME, STORED
+from whoosh.index import LockError
 from whoosh.qparser import MultifieldParser
 from whoosh.analysis import StemmingAnalyzer
+from whoosh.query import And, Term, Every
+from whoosh.idsets import BitSet
+from whoosh.sorting import Facets, FacetType, Categorizer, Count
+from whoosh.collectors import WrappingCollector
+from whoosh.searching import ResultsPage, TimeLimit
+from whoosh.highlight import Highlighter, PinpointFragmenter, HtmlFormatter
+from whoosh.compat import htmlescape
+from whoosh.spelling import GraphCorrector, wordlist_to_graph_file
+from whoosh.automata.fst import GraphReader
+from whoosh.filedb.filestore import RamStorage, FileStorage
 
 from jobber.conf import settings
+from jobber.core.metrics import metrics, COUNT_BUCKETS
+from jobber.core.utils import Page
 
 
 # Since we're using a `Multifield` query parser, we need to define which fields
@@ -22,6 +43,51 @@ from jobber.conf import settings
 SEARCHABLE_FIELDS = ('title', 'description', 'company', 'location', 'job_type', 'tags')
 
 
+# Facets that can be counted alongside search results and used to drill down
+# into them, as a mapping of facet names to the schema fields they count.
+FACET_FIELDS = OrderedDict([
+    ('type', 'type'),
+    ('country', 'country'),
+    ('city', 'city'),
+    ('tag', 'tags')
+])
+
+
+# Filters that can be applied to searches, either as keyword arguments or as
+# `name:value` terms in the query string, as a mapping of filter names to the
+# schema fields they match.
+FILTER_FIELDS = OrderedDict(FACET_FIELDS.items() + [('remote', 'remote')])
+
+
+# Filter values are matched exactly, so normalize them to how they are indexed.
+FILTER_NORMALIZERS = {
+    'country': lambda value: value.upper(),
+    'city': lambda value: value.lower(),
+    'tag': lambda value: value.lower(),
+    'remote': lambda value: value.lower()
+}
+
+
+# Matches `name:value` and `name:"some value"` terms in query strings.
+FILTER_REGEX = re.compile(r'(?<!\S)(\w+):(?:"([^"]*)"|(\S+))', re.UNICODE)
+
+
+# Fields whose vocabularies are used to correct misspelt queries.
+SPELLING_FIELDS = ('title', 'tags', 'company')
+
+
+# Words of a query string that are spell checked, ignoring numbers.
+WORD_REGEX = re.compile(r'[^\W\d_]+', re.UNICODE)
+
+
+# Query parser operators, which are never spell checked.
+OPERATORS = frozenset(['AND', 'OR', 'NOT', 'ANDNOT', 'ANDMAYBE'])
+
+
+# Queries slower than `SEARCH_SLOW_QUERY_THRESHOLD` are logged here.
+slow_query_logger = logging.getLogger('jobber.slow_queries')
+
+
 # Global reference to the stemming analyizer we'll use in the schema.
 stemming_analyzer = StemmingAnalyzer()
 
@@ -32,23 +98,95 @@ class CustomError(Exception):
     pass
 
 
+def parse_filters(query):
+    """Splits the `FILTER_FIELDS` filters out of the `query` string. Returns a
+    tuple of the remaining query string and a dict mapping filter names to
+    lists of values.
+
+    :param query: A string containing the users query.
+
+    """
+    filters = {}
+
+    def extract(match):
+        name = match.group(1).lower()
+        if name not in FILTER_FIELDS:
+            return match.group(0)
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        filters.setdefault(name, []).append(value)
+        return u''
+
+    text = FILTER_REGEX.sub(extract, query)
+    return u' '.join(text.split()), filters
+
+
+def split_query(query, filters=None):
+    """Like `parse_filters()`, but also merges in the `filters` passed along
+    with the `query` string. Raises `ValueError` for filters not in
+    `FILTER_FIELDS`.
+
+    :param query: A string containing the users query.
+    :param filters: A dict mapping `FILTER_FIELDS` names to a value or a list
+    of values.
+
+    """
+    text, parsed = parse_filters(query)
+    for name, values in (filters or {}).items():
+        if name not in FILTER_FIELDS:
+            raise ValueError(u"Can't filter on {!r}.".format(name))
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        parsed.setdefault(name, []).extend(values)
+    return text, parsed
+
+
+def analyze(text):
+    """Returns the terms of `text`, analyzed like the `Schema` text fields.
+    Commas separate words too, as in the `location` and `tags` fields.
+
+    :param text: A string.
+
+    """
+    if not text:
+        return []
+    return [token.text for token in stemming_analyzer(text.replace(u',', u' '))]
+
+
+def fingerprint(doc):
+    """Returns the fingerprint of `doc`, which changes whenever the contents of
+    the document change.
+
+    :param doc: A document, as returned by `Job.to_document()`.
+
+    """
+    fields = dict((k, v) for k, v in doc.items() if k != 'fingerprint')
+    content = json.dumps(fields, sort_keys=True, default=unicode)
+    return u'{}:{}'.format(doc['id'], hashlib.sha1(content).hexdigest())
+
+
 @contextmanager
-def safe_write(writer, commit=True):
+def safe_write(writer, commit=True, metric=None):
     """Makes sure that the `writer` is properly dealed with if an exception
-    is raised inside the context.
+    is raised inside the context, by cancelling it and so releasing the index
+    lock, whatever the exception.
 
     :param: An `IndexWriter` instance.
     :param: Auto-commit flag.
+    :param metric: Name of the histogram to record the commit time in.
 
     """
     try:
         yield
-    except IndexingError:
+    except:
         writer.cancel()
-        # TODO: raise `CustomError` here.
         raise
-    else:
+    if not commit:
+        return
+    if metric is None:
         writer.commit()
+    else:
+        with metrics.timer(metric):
+            writer.commit()
 
 
 class Schema(SchemaClass):
@@ -56,11 +194,17 @@ class Schema(SchemaClass):
     #: The id of the job.
     id = ID(stored=True, unique=True)
 
-    #: The title of the job.
-    title = TEXT(analyzer=stemming_analyzer)
+    #: The title of the job. Spelled, so that the unstemmed words are kept in
+    #: a word graph for correcting queries.
+    title = TEXT(analyzer=stemming_analyzer, spelling=True)
 
-    #: The name of the company.
-    company = TEXT(analyzer=stemming_analyzer)
+    #: The description of the job as plain text. Stored along with the
+    #: character offsets of every term, so that snippets can be highlighted
+    #: without re-analyzing the text.
+    description = TEXT(analyzer=stemming_analyzer, stored=True, chars=True)
+
+    #: The name of the company, spelled like `title`.
+    company = TEXT(analyzer=stemming_analyzer, spelling=True)
 
     #: Location as a comma-separated string of city and country.
     location = KEYWORD(lowercase=True, scorable=True, commas=True)
@@ -68,12 +212,310 @@ class Schema(SchemaClass):
     #: The type of job.
     job_type = TEXT(analyzer=stemming_analyzer)
 
-    #: The job tags as a comma-separated string of tag slugs.
-    tags = KEYWORD(lowercase=True, scorable=True, commas=True)
+    #: The job tags as a comma-separated string of tag slugs. Sortable, so
+    #: that tags can be counted as a facet.
+    tags = KEYWORD(lowercase=True, scorable=True, commas=True, sortable=True)
+
+    #: The exact type of job, for faceting.
+    type = ID(sortable=True)
+
+    #: The ISO alpha-3 country code of the location, for faceting.
+    country = ID(sortable=True)
+
+    #: The city of the location, for faceting.
+    city = ID(sortable=True)
+
+    #: Whether remote work is considered, as lowercase 'yes', 'no' or
+    #: 'negotiable', for filtering.
+    remote = ID()
 
     #: When was this job created?
     created = DATETIME(sortable=True)
 
+    #: The id of the job and a hash of the rest of the document, as
+    #: `<id>:<hash>`, see `fingerprint()`. Kept in a column so that the
+    #: fingerprints of all documents can be read without loading them.
+    fingerprint = ID(sortable=True)
+
+    #: Everything needed to render the job in a listing, only present when the
+    #: `SEARCH_STORED_LISTINGS` setting is on.
+    listing = STORED()
+
+
+def schema_fingerprint(schema=Schema):
+    """Returns a hash of the names, types and settings of all fields of
+    `schema`, analyzers included, which changes whenever an index created with
+    an older version of the schema has to be rebuilt.
+
+    :param schema: A `SchemaClass` subclass or a `whoosh.fields.Schema`.
+
+    """
+    def describe(value):
+        if value is None or isinstance(value, (basestring, bool, int, long, float)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [describe(item) for item in value]
+        if isinstance(value, (set, frozenset)):
+            return sorted(describe(item) for item in value)
+        if isinstance(value, dict):
+            # Private attributes hold caches and compiled helpers.
+            return sorted((key, describe(item)) for key, item in value.items()
+                          if not key.startswith('_'))
+        if isinstance(value, (type, types.FunctionType, types.BuiltinFunctionType)):
+            return u'{}.{}'.format(value.__module__, value.__name__)
+        if hasattr(value, 'pattern') and hasattr(value, 'flags'):
+            return [value.pattern, value.flags]
+        if hasattr(value, '__dict__'):
+            return [describe(type(value)), describe(vars(value))]
+        return describe(type(value))
+
+    if isinstance(schema, type):
+        schema = schema()
+    fields = [(name, describe(field)) for name, field in sorted(schema.items())]
+    return hashlib.sha1(json.dumps(fields, sort_keys=True)).hexdigest()
+
+
+class SearchPage(Page):
+    """A `Page` of search hits, along with the facet counts of all hits that
+    matched the query.
+
+    :param facets: A dict mapping facet names to lists of `(value, count)`
+    tuples, ordered by descending count.
+    :param snippets: A dict mapping document ids to highlighted HTML snippets
+    of their descriptions.
+    :param correction: A corrected query string to suggest instead, if any.
+    :param truncated: Whether the search ran out of time, in which case the
+    hits, total and facets only cover the documents matched until then.
+
+    """
+    def __init__(self, items, page, per_page, total, facets=None,
+                 snippets=None, correction=None, truncated=False):
+        super(SearchPage, self).__init__(items, page, per_page, total)
+        self.facets = facets or {}
+        self.snippets = snippets or {}
+        self.correction = correction
+        self.truncated = truncated
+
+    def copy(self):
+        """Returns a copy of this page whose hits, facets and snippets can be
+        changed without affecting it.
+
+        """
+        facets = dict((name, list(values)) for name, values in self.facets.items())
+        return SearchPage([dict(hit) for hit in self.items], self.page,
+                          self.per_page, self.total, facets=facets,
+                          snippets=dict(self.snippets),
+                          correction=self.correction, truncated=self.truncated)
+
+
+class SearchTimings(object):
+    """Times the stages of a single search and records them in the `search.*`
+    histograms of `metrics` once it is finished:
+
+    * `search.parse`: Parsing the query string, filters included.
+    * `search.search`: Running the query, if it wasn't cached.
+    * `search.total`: The whole search, cached or not.
+    * `search.hits`: The number of matching documents.
+
+    Searches slower than `SEARCH_SLOW_QUERY_THRESHOLD` seconds are logged to
+    the `jobber.slow_queries` logger.
+
+    :param query: The query string being searched.
+
+    """
+    def __init__(self, query):
+        self.query = query
+        self.started = self.last = time.time()
+        self.parse = None
+        self.search = None
+
+    def parsed(self):
+        self.parse = self._lap()
+
+    def searched(self):
+        self.search = self._lap()
+
+    def finish(self, hits, cached=False, truncated=False):
+        """Records the timings of the search.
+
+        :param hits: The number of matching documents.
+        :param cached: Whether the results came from the `QueryCache`.
+        :param truncated: Whether the search ran out of time.
+
+        """
+        total = time.time() - self.started
+        metrics.observe('search.total', total)
+        metrics.observe('search.hits', hits, buckets=COUNT_BUCKETS)
+        if self.parse is not None:
+            metrics.observe('search.parse', self.parse)
+        if self.search is not None:
+            metrics.observe('search.search', self.search)
+
+        threshold = settings.SEARCH_SLOW_QUERY_THRESHOLD
+        if threshold is not None and total >= threshold:
+            slow_query_logger.warning(
+                u"Slow query {!r}: {:.3f}s total, {} parsing, {} searching, "
+                u"{} hits{}{}.".format(self.query, total,
+                                       self._format(self.parse),
+                                       self._format(self.search),
+                                       hits, u' (cached)' if cached else u'',
+                                       u' (truncated)' if truncated else u'')
+            )
+
+    def _lap(self):
+        now = time.time()
+        elapsed, self.last = now - self.last, now
+        return elapsed
+
+    def _format(self, seconds):
+        return u'-' if seconds is None else u'{:.3f}s'.format(seconds)
+
+
+class IndexBatch(object):
+    """Collects index mutations so that they can be applied later on with a
+    single writer and a single commit.
+
+    Mutations are keyed by document id, so only the last mutation for every
+    document is kept.
+
+    """
+    UPDATE = 'update'
+    DELETE = 'delete'
+
+    def __init__(self):
+        self.operations = OrderedDict()
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __iter__(self):
+        return iter(self.operations.values())
+
+    def update(self, doc):
+        """Adds or replaces `doc` in the index.
+
+        :param doc: The document to update.
+
+        """
+        self.operations[doc['id']] = (self.UPDATE, doc)
+
+    def delete(self, docid):
+        """Deletes the document with `docid` from the index.
+
+        :param docid: The id of the document to delete.
+
+        """
+        self.operations[docid] = (self.DELETE, docid)
+
+    def extend(self, batch):
+        """Adds all mutations of `batch`, replacing the ones collected so far
+        for the same documents.
+
+        :param batch: An `IndexBatch` instance.
+
+        """
+        self.operations.update(batch.operations)
+
+
+class KeywordsFacet(FacetType):
+    """Groups documents by every keyword of a sortable, comma-separated
+    `KEYWORD` field, so a document can appear in more than one group.
+
+    Whoosh's own `FieldFacet(allow_overlap=True)` either needs term vectors,
+    which can't be written for empty fields, or re-reads all postings of the
+    field on every search.
+
+    """
+    def __init__(self, fieldname, maptype=None):
+        self.fieldname = fieldname
+        self.maptype = maptype
+
+    def default_name(self):
+        return self.fieldname
+
+    def categorizer(self, global_searcher):
+        return KeywordsCategorizer(self.fieldname)
+
+
+class KeywordsCategorizer(Categorizer):
+
+    allow_overlap = True
+
+    def __init__(self, fieldname):
+        self.fieldname = fieldname
+        self.column = None
+
+    def set_searcher(self, segment_searcher, docoffset):
+        reader = segment_searcher.reader()
+        # Empty indexes have no columns at all.
+        self.column = None
+        if reader.has_column(self.fieldname):
+            self.column = reader.column_reader(self.fieldname)
+
+    def keys_for(self, matcher, docid):
+        if self.column is None:
+            return []
+        value = self.column[docid] or u''
+        return [key for key in value.split(u',') if key]
+
+
+class DeadlineCollector(WrappingCollector):
+    """Wraps a collector and stops the search once `timelimit` seconds have
+    passed since it started, raising `TimeLimit`. The partial results can
+    still be had from `results()`.
+
+    Whoosh's own `TimeLimitCollector` interrupts searches with `SIGALRM`,
+    which can only be handled in the main thread and hits whatever the
+    process is doing at the time. Here the clock is checked between matches
+    instead, so a single slow matcher step can still run over.
+
+    Collectors filtering matches, like `FilterCollector`, pull them straight
+    from their child, so this has to wrap the innermost collector, see
+    `wrap()`.
+
+    :param child: The collector to wrap.
+    :param timelimit: The time budget in seconds.
+
+    """
+    def __init__(self, child, timelimit):
+        self.child = child
+        self.timelimit = timelimit
+        self.deadline = None
+        self.truncated = False
+
+    @classmethod
+    def wrap(cls, collector, timelimit):
+        """Inserts a `DeadlineCollector` below all collectors wrapping the
+        innermost one of `collector` and returns the outermost collector.
+
+        """
+        parent = None
+        innermost = collector
+        while isinstance(innermost, WrappingCollector):
+            parent, innermost = innermost, innermost.child
+        deadline = cls(innermost, timelimit)
+        if parent is None:
+            return deadline
+        parent.child = deadline
+        return collector
+
+    def prepare(self, top_searcher, q, context):
+        self.deadline = time.time() + self.timelimit
+        self.truncated = False
+        self.child.prepare(top_searcher, q, context)
+
+    def matches(self):
+        deadline = self.deadline
+        self._check(deadline)
+        for sub_docnum in self.child.matches():
+            yield sub_docnum
+            self._check(deadline)
+
+    def _check(self, deadline):
+        if time.time() >= deadline:
+            self.truncated = True
+            raise TimeLimit
+
 
 class SearchableMixin(object):
     """Gives a `to_document()` method to the object, which should return a
@@ -92,11 +534,25 @@ class IndexManager(object):
     """Wrapper responsible for creating, deleting and opening `Whoosh` indexes
     on the filesystem.
 
+    An index can also be rebuilt next to the one in use, as a new version
+    named `<name>-<number>`. Once it's complete, the pointer file
+    `<name>.current` in the same directory is atomically replaced to name the
+    new version, which every `Index` opened by `name` resolves from then on.
+
     """
     @classmethod
     def create(cls, schema, name, directory):
-        """Creates the index, wiping any existing index."""
+        """Creates the index in place, wiping any existing index and dropping
+        the pointer to its rebuilt versions.
+
+        """
         index.create_in(directory, schema, indexname=name)
+        pointer = cls.pointer_path(name, directory)
+        if os.path.exists(pointer):
+            os.unlink(pointer)
+        # A re-created index restarts its generation count, so any searchers
+        # opened on the old one can no longer be trusted.
+        registry.invalidate(name, directory)
 
     @classmethod
     def open(cls, name, directory):
@@ -105,14 +561,522 @@ class IndexManager(object):
 
     @classmethod
     def exists(cls, name, directory):
-        """Checks if this index exists."""
-        return index.exists_in(directory, indexname=name)
+        """Checks if this index, or the version it points to, exists."""
+        return index.exists_in(directory, indexname=cls.resolve(name, directory))
+
+    @classmethod
+    def pointer_path(cls, name, directory):
+        return os.path.join(directory, '{}.current'.format(name))
+
+    @classmethod
+    def pointer(cls, name, directory):
+        """Returns the contents of the pointer file of `name` as a dict with
+        the `index` version in use and the `schema` fingerprint it was built
+        with, or `None` if the index was never rebuilt.
+
+        """
+        try:
+            with open(cls.pointer_path(name, directory)) as f:
+                return json.load(f)
+        except IOError:
+            return None
+
+    @classmethod
+    def resolve(cls, name, directory):
+        """Returns the name of the index version in use for `name`, which is
+        `name` itself until the index is rebuilt.
+
+        """
+        pointer = cls.pointer(name, directory)
+        return pointer['index'] if pointer else name
+
+    @classmethod
+    def versions(cls, name, directory):
+        """Returns a sorted list of `(number, indexname)` tuples of all
+        versions of `name` in `directory`, with the index created in place, if
+        any, as number 0.
+
+        """
+        pattern = re.compile(r'^_{}(?:-(\d+))?_\d+\.toc$'.format(re.escape(name)))
+        versions = set()
+        for filename in os.listdir(directory):
+            match = pattern.match(filename)
+            if match:
+                number = int(match.group(1) or 0)
+                versions.add((number, cls.version_name(name, number)))
+        return sorted(versions)
+
+    @classmethod
+    def version_name(cls, name, number):
+        return '{}-{}'.format(name, number) if number else name
+
+    @classmethod
+    def create_version(cls, schema, name, directory):
+        """Creates an empty new version of the index, without using it yet, and
+        returns its name. See `switch()`.
+
+        """
+        numbers = [number for number, _ in cls.versions(name, directory)]
+        version = cls.version_name(name, max(numbers + [0]) + 1)
+        index.create_in(directory, schema, indexname=version)
+        return version
+
+    @classmethod
+    def switch(cls, name, directory, version, schema=Schema):
+        """Atomically points `name` to the index `version`.
+
+        :param name: The index name.
+        :param directory: The index directory.
+        :param version: The name of the version to use.
+        :param schema: The schema `version` was created with, which is
+        fingerprinted to tell when it goes out of date, see `outdated()`.
+
+        """
+        path = cls.pointer_path(name, directory)
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'w') as f:
+            json.dump({'index': version, 'schema': schema_fingerprint(schema)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Renames replace the target atomically on POSIX, so readers either
+        # see the old pointer or the new one.
+        os.rename(temporary, path)
+        registry.resolve(name, directory)
+
+    @classmethod
+    def outdated(cls, name, directory, schema=Schema):
+        """Checks whether the index in use for `name` was built with a schema
+        other than `schema` and has to be rebuilt.
+
+        """
+        pointer = cls.pointer(name, directory)
+        if pointer is not None:
+            return pointer.get('schema') != schema_fingerprint(schema)
+        if not index.exists_in(directory, indexname=name):
+            return False
+        # Indexes created in place predate the pointer, so check the schema
+        # they were stored with instead.
+        stored = cls.open(name, directory).schema
+        return schema_fingerprint(stored) != schema_fingerprint(schema)
+
+    @classmethod
+    def collect_garbage(cls, name, directory, keep=None):
+        """Deletes the versions of `name` older than the one in use, except
+        for the newest `keep` of them. Versions newer than the one in use are
+        left alone, since they may still be being built. Returns the names of
+        the deleted versions.
+
+        :param keep: How many older versions to keep around, defaults to the
+        `SEARCH_INDEX_KEEP_VERSIONS` setting. Searchers that resolved the
+        pointer just before a switch may still open the previous version.
+
+        """
+        if keep is None:
+            keep = settings.SEARCH_INDEX_KEEP_VERSIONS
+        current = cls.resolve(name, directory)
+        versions = cls.versions(name, directory)
+        numbers = [number for number, version in versions if version == current]
+        if not numbers:
+            return []
+        older = [version for number, version in versions if number < numbers[0]]
+        deleted = older[:max(len(older) - keep, 0)]
+        for version in deleted:
+            cls.delete(version, directory)
+        return deleted
+
+    @classmethod
+    def delete(cls, name, directory):
+        """Deletes all files of the index `name`, which must not be in use."""
+        pattern = re.compile(r'^(?:_{0}_\d+\.toc|{0}_[0-9a-z]+\..+|{0}_WRITELOCK)$'
+                             .format(re.escape(name)))
+        storage = FileStorage(directory)
+        for filename in storage.list():
+            if pattern.match(filename):
+                storage.delete_file(filename)
+        registry.invalidate(name, directory)
+
+    @classmethod
+    def rebuild_lock(cls, name, directory):
+        """Returns a lock held while rebuilding `name`, so that only one
+        process rebuilds it at a time.
+
+        """
+        return FileStorage(directory).lock('{}_REBUILD'.format(name))
+
+
+class QueryCache(object):
+    """LRU cache of search results with a time-to-live.
+
+    Every entry is tied to the `version` of the index it was computed against.
+    As soon as a lookup or store happens with a different version, i.e. the
+    index generation advanced, the whole cache is dropped.
+
+    :param maxsize: Maximum number of entries, 0 disables caching.
+    :param ttl: Seconds an entry stays valid.
+
+    """
+    #: Returned by `get()` when there is no valid entry for a key.
+    MISSING = object()
+
+    def __init__(self, maxsize, ttl, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, version, key):
+        """Returns the cached value for `key`, or `MISSING`.
+
+        :param version: The current version of the index.
+        :param key: A hashable cache key.
+
+        """
+        with self.lock:
+            self._ensure_version(version)
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry[1] < self.clock():
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return self.MISSING
+            # Re-insert the entry to mark it as the most recently used.
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, version, key, value):
+        """Caches `value` for `key`.
+
+        :param version: The version of the index `value` was computed from.
+        :param key: A hashable cache key.
+        :param value: The value to cache.
+
+        """
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self._ensure_version(version)
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = (value, self.clock() + self.ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+
+    def stats(self):
+        """Returns the cache counters as a `dict`."""
+        return dict(size=len(self.entries),
+                    maxsize=self.maxsize,
+                    hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions)
+
+    def _ensure_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+
+class Speller(object):
+    """Corrects misspelt words in query strings, using the vocabulary of the
+    `SPELLING_FIELDS` of an index reader.
+
+    The words of all segments are compiled into a single in-memory word graph,
+    which is expensive to build, so a `Speller` is meant to be kept for as
+    long as the index generation it was built from, see
+    `IndexRegistry.speller()`.
+
+    :param reader: An `IndexReader` instance.
+
+    """
+    def __init__(self, reader):
+        words = set()
+        stems = set()
+        for segment, _ in reader.leaf_readers():
+            for field in SPELLING_FIELDS:
+                if field not in segment.schema:
+                    continue
+                terms = set(segment.field_terms(field))
+                stems.update(terms)
+                # Spelled fields keep their unstemmed words in a word graph,
+                # segments written before they were spelled only have stems.
+                if segment.has_word_graph(field):
+                    words.update(segment.word_graph(field).flatten_strings())
+                else:
+                    words.update(terms)
+
+        self.words = frozenset(words)
+        self.stems = frozenset(stems)
+        self.corrector = None
+        if words:
+            storage = RamStorage()
+            wordlist_to_graph_file(sorted(words), storage.create_file('words'))
+            graph = GraphReader(storage.open_file('words'))
+            self.corrector = GraphCorrector(graph)
+
+    def known(self, word):
+        """Checks if `word`, or its stem, is in the vocabulary. Stop words
+        are always known.
+
+        :param word: A lowercase word.
+
+        """
+        if word in self.words:
+            return True
+        return all(token.text in self.stems
+                   for token in stemming_analyzer(word))
+
+    def correct(self, query, maxdist=2, prefix=1):
+        """Returns `query` with every unknown word replaced by the closest
+        known word, or `None` if there was nothing to correct. Filters and
+        other `name:value` terms are left as they are.
+
+        :param query: A string containing the users query.
+        :param maxdist: The maximum edit distance of a correction.
+        :param prefix: How many leading characters a correction must share
+        with the misspelt word.
+
+        """
+        if self.corrector is None:
+            return None
+        skipped = [match.span() for match in FILTER_REGEX.finditer(query)]
+        corrected = []
+
+        def replace(match):
+            word = match.group(0)
+            if word in OPERATORS:
+                return word
+            if any(start <= match.start() < end for start, end in skipped):
+                return word
+            if self.known(word.lower()):
+                return word
+            suggestions = self.corrector.suggest(word.lower(), limit=1,
+                                                 maxdist=maxdist, prefix=prefix)
+            if not suggestions:
+                return word
+            corrected.append(word)
+            return suggestions[0]
+
+        text = WORD_REGEX.sub(replace, query)
+        return text if corrected else None
+
+
+class IndexRegistry(object):
+    """Process-wide registry of opened `Whoosh` indexes and their searchers.
+
+    Opening an index reads its TOC from disk and opening a searcher loads all
+    segment readers, so both are kept for the lifetime of the process. Readers
+    rely on file cursor positions and cannot be shared between threads, hence
+    every thread gets its own searcher which is only refreshed when the index
+    generation changes.
+
+    Pointers to rebuilt index versions are re-read whenever the pointer file
+    is replaced, at which point everything held for the previous version is
+    dropped.
+
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.pointers = {}
+        self.indexes = {}
+        self.epochs = {}
+        self.caches = {}
+        self.spellers = {}
+        self.local = local()
+
+    def resolve(self, name, directory):
+        """Returns the name of the index version in use for `name`, see
+        `IndexManager.resolve()`. Only costs a `stat()` of the pointer file
+        unless it was replaced.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        key = (directory, name)
+        try:
+            stat = os.stat(IndexManager.pointer_path(name, directory))
+            # Pointers are replaced by renaming, which changes the inode.
+            signature = (stat.st_ino, stat.st_mtime)
+        except OSError:
+            signature = None
+
+        with self.lock:
+            cached = self.pointers.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        resolved = IndexManager.resolve(name, directory) if signature else name
+        with self.lock:
+            self.pointers[key] = (signature, resolved)
+        if cached is not None and cached[1] != resolved:
+            self.invalidate(cached[1], directory)
+        return resolved
+
+    def open(self, name, directory):
+        """Returns the opened index for `name` in `directory`, opening it on
+        first use.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        key = (directory, name)
+        with self.lock:
+            ix = self.indexes.get(key)
+            if ix is None:
+                ix = IndexManager.open(name, directory)
+                self.indexes[key] = ix
+            return ix
+
+    def searcher(self, name, directory):
+        """Returns a warm searcher for the calling thread, refreshing it if the
+        index has moved on to a newer generation.
+
+        The searcher is owned by the registry and must not be closed by the
+        caller.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        key = (directory, name)
+        ix = self.open(name, directory)
+        epoch = self.epochs.get(key, 0)
+
+        searchers = self._thread_searchers()
+        cached = searchers.get(key)
+
+        if cached is None or cached[0] != epoch:
+            if cached is not None:
+                cached[1].close()
+            searcher = ix.searcher()
+        else:
+            # `refresh()` returns the same searcher if the generation has not
+            # changed and re-uses unchanged segment readers otherwise.
+            searcher = cached[1].refresh()
+
+        searchers[key] = (epoch, searcher)
+
+        # Close the searchers of indexes that were dropped since, i.e. older
+        # versions of a rebuilt index.
+        for other in [other for other in searchers if other not in self.indexes]:
+            searchers.pop(other)[1].close()
+        return searcher
+
+    def version(self, name, directory, searcher):
+        """Returns a value identifying the version of the index `searcher`
+        reads, which changes whenever the index is written to or re-created.
+
+        :param name: The index name.
+        :param directory: The index directory.
+        :param searcher: A searcher returned by `searcher()`.
+
+        """
+        epoch = self.epochs.get((directory, name), 0)
+        return (epoch, searcher.reader().generation())
+
+    def query_cache(self, name, directory):
+        """Returns the `QueryCache` of search results for `name` in
+        `directory`.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        return self._cache('query', name, directory, settings.SEARCH_CACHE_SIZE)
+
+    def filter_cache(self, name, directory):
+        """Returns the `QueryCache` of filter doc-sets for `name` in
+        `directory`.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        return self._cache('filter', name, directory,
+                           settings.SEARCH_FILTER_CACHE_SIZE)
+
+    def speller(self, name, directory, searcher):
+        """Returns the `Speller` for the version of the index `searcher`
+        reads, building it on first use.
+
+        :param name: The index name.
+        :param directory: The index directory.
+        :param searcher: A searcher returned by `searcher()`.
+
+        """
+        key = (directory, name)
+        version = self.version(name, directory, searcher)
+        with self.lock:
+            cached = self.spellers.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Built outside the lock, at worst a few threads build the same one.
+        speller = Speller(searcher.reader())
+        with self.lock:
+            self.spellers[key] = (version, speller)
+        return speller
+
+    def invalidate(self, name, directory):
+        """Drops the opened index and marks all thread searchers for `name` in
+        `directory` as stale.
+
+        :param name: The index name.
+        :param directory: The index directory.
+
+        """
+        key = (directory, name)
+        with self.lock:
+            self.indexes.pop(key, None)
+            self.epochs[key] = self.epochs.get(key, 0) + 1
+            self.spellers.pop(key, None)
+            caches = [cache for (kind, cache_key), cache in self.caches.items()
+                      if cache_key == key]
+        for cache in caches:
+            cache.clear()
+
+    def _cache(self, kind, name, directory, maxsize):
+        key = (kind, (directory, name))
+        with self.lock:
+            cache = self.caches.get(key)
+            if cache is None:
+                cache = QueryCache(maxsize, settings.SEARCH_CACHE_TTL)
+                self.caches[key] = cache
+            return cache
+
+    def _thread_searchers(self):
+        searchers = getattr(self.local, 'searchers', None)
+        if searchers is None:
+            searchers = self.local.searchers = {}
+        return searchers
+
+
+# Global registry shared by all `Index` instances in this process.
+registry = IndexRegistry()
 
 
 class Index(object):
     """Wrapper on top of a `Whoosh` index, provides addition, deletion and
     search capabilities.
 
+    If the index `name` was rebuilt, the version in use is opened instead,
+    see `IndexManager`. It's resolved again on every use, so that long-lived
+    instances move on to new versions too.
+
     """
     def __init__(self, name=None, directory=None, schema=None):
         if not name:
@@ -123,32 +1087,402 @@ class Index(object):
             schema = Schema
 
         self.directory = directory
-        self.name = name
+        self.alias = name
         self.schema = Schema
 
         # The constructor assumes the index already exists.
-        self.index = IndexManager.open(self.name, self.directory)
+        registry.open(self.name, self.directory)
+
+    @property
+    def name(self):
+        """The name of the index version in use."""
+        return registry.resolve(self.alias, self.directory)
 
-    def search(self, query, limit=None, sort=None):
+    @property
+    def index(self):
+        return registry.open(self.name, self.directory)
+
+    def searcher(self):
+        """Returns the warm searcher for this index from the registry."""
+        return registry.searcher(self.name, self.directory)
+
+    def search(self, query, limit=None, sort=None, filters=None):
         """Searches the index by parsing `query` and creating a `Query` object.
 
-        :param query: A string containing the users query.
+        Results are cached per index generation, see `QueryCache`. Searches
+        taking longer than `SEARCH_TIME_LIMIT` seconds stop early and return
+        the best hits found until then, which are not cached.
+
+        :param query: A string containing the users query, which may contain
+        filters such as `tag:python` or `type:"Full Time"`, see
+        `parse_filters()`.
         :param limit: How many results to return, defaults to `None` which will
         return all results.
         :param sort: The field to sort the results on, given as a tuple of
         (field, direction) i.e ('created', 'asc').
+        :param filters: A dict mapping `FILTER_FIELDS` names to a value or a
+        list of values, restricting the results to documents with all of them.
+
+        """
+        timings = SearchTimings(query)
+        searcher = self.searcher()
+        parsed, filter_query = self._prepare(query, filters, searcher)
+        timings.parsed()
+
+        cache = self.query_cache()
+        version = registry.version(self.name, self.directory, searcher)
+        key = ('search', repr(parsed), repr(filter_query), sort, limit)
+        cached = cache.get(version, key)
+        if cached is not QueryCache.MISSING:
+            hits, total = cached
+            timings.finish(total, cached=True)
+            # Cached hits are shared, callers get their own copies.
+            return [dict(hit) for hit in hits]
+
+        kwargs = self._sort_kwargs(sort)
+        if filter_query is not None:
+            kwargs['filter'] = self._filter_docs(filter_query, searcher, version)
+        truncated = False
+        if kwargs.get('filter', True):
+            results, truncated = self._collect(searcher, parsed, limit, **kwargs)
+            timings.searched()
+            hits = [hit.fields() for hit in results]
+            total = len(results)
+        else:
+            # Whoosh ignores empty filters instead of matching nothing.
+            hits = []
+            total = 0
+        if not truncated:
+            cache.set(version, key, (hits, total))
+        timings.finish(total, truncated=truncated)
+        return [dict(hit) for hit in hits]
+
+    def search_page(self, query, page=1, pagelen=None, sort=None,
+                    facets=False, filters=None, snippets=False):
+        """Searches the index like `search()`, but only collects the top hits
+        needed for `page` and returns a `SearchPage` of hits.
+
+        :param query: A string containing the users query, see `search()`.
+        :param page: The page number, starting at 1.
+        :param pagelen: How many results per page, defaults to the
+        `SEARCH_PAGE_LENGTH` setting.
+        :param sort: The field to sort the results on, given as a tuple of
+        (field, direction) i.e ('created', 'asc').
+        :param facets: Whether to count the `FACET_FIELDS` of all matching
+        documents, in the same pass as the search.
+        :param filters: Filters restricting the results, see `search()`.
+        :param snippets: Whether to highlight the matching parts of the
+        description of every hit, see `_snippets()`.
+
+        Like `search()`, searches running out of time return the best hits
+        found so far, in a `SearchPage` flagged as `truncated`.
+
+        """
+        if pagelen is None:
+            pagelen = settings.SEARCH_PAGE_LENGTH
+        timings = SearchTimings(query)
+        searcher = self.searcher()
+        parsed, filter_query = self._prepare(query, filters, searcher)
+        timings.parsed()
+
+        cache = self.query_cache()
+        version = registry.version(self.name, self.directory, searcher)
+        key = ('page', repr(parsed), repr(filter_query), sort, page, pagelen,
+               facets, snippets)
+        result = cache.get(version, key)
+        if result is not QueryCache.MISSING:
+            timings.finish(result.total, cached=True)
+            return result.copy()
+
+        kwargs = self._sort_kwargs(sort)
+        if facets:
+            kwargs['groupedby'] = self._facets()
+        if filter_query is not None:
+            kwargs['filter'] = self._filter_docs(filter_query, searcher, version)
+        if snippets:
+            # Record the matched terms, required for highlighting from the
+            # stored character offsets.
+            kwargs['terms'] = True
+        if kwargs.get('filter', True):
+            results, truncated = self._collect(searcher, parsed,
+                                               page * pagelen, **kwargs)
+            hits = ResultsPage(results, page, pagelen)
+            timings.searched()
+            counts = self._facet_counts(hits.results) if facets else None
+            if hits.pagenum != page:
+                # Whoosh clamps pages past the last one to the last page,
+                # while listings return no items for them.
+                result = SearchPage([], page, pagelen, hits.total,
+                                    facets=counts, truncated=truncated)
+            else:
+                highlights = self._snippets(hits) if snippets else None
+                result = SearchPage([hit.fields() for hit in hits], page,
+                                    pagelen, hits.total, facets=counts,
+                                    snippets=highlights, truncated=truncated)
+        else:
+            # Whoosh ignores empty filters instead of matching nothing.
+            result = SearchPage([], page, pagelen, 0)
+        if not result.truncated:
+            cache.set(version, key, result)
+        timings.finish(result.total, truncated=result.truncated)
+        return result.copy()
+
+    def query_cache(self):
+        """Returns the `QueryCache` for this index from the registry."""
+        return registry.query_cache(self.name, self.directory)
+
+    def filter_cache(self):
+        """Returns the filter `QueryCache` for this index from the registry."""
+        return registry.filter_cache(self.name, self.directory)
+
+    def correct(self, query):
+        """Returns a corrected version of the `query` string, or `None` if
+        all of its words are known, see `Speller`.
+
+        :param query: A string containing the users query.
 
         """
-        parser = MultifieldParser(SEARCHABLE_FIELDS, schema=self.index.schema)
-        query = parser.parse(query)
-        with self.index.searcher() as searcher:
-            kwargs = dict(limit=limit)
-            if sort:
-                field, direction = sort
-                kwargs['sortedby'] = field
-                kwargs['reverse'] = direction == 'desc'
-            hits = searcher.search(query, **kwargs)
-            return [hit.fields() for hit in hits]
+        searcher = self.searcher()
+        speller = registry.speller(self.name, self.directory, searcher)
+        return speller.correct(query,
+                               maxdist=settings.SEARCH_SPELLING_MAXDIST,
+                               prefix=settings.SEARCH_SPELLING_PREFIX)
+
+    def parse(self, query, searcher):
+        """Parses the `query` string into a normalized `Query` object. Since
+        terms are analyzed, queries differing only in case or whitespace parse
+        to equal objects and share cache entries.
+
+        :param query: A string containing the users query.
+        :param searcher: The `Searcher` the query will be run against.
+
+        """
+        # Use the searcher's schema, `self.index.schema` reads the TOC from
+        # disk on every access.
+        parser = MultifieldParser(SEARCHABLE_FIELDS, schema=searcher.schema)
+        return parser.parse(query)
+
+    def _collect(self, searcher, parsed, limit, **kwargs):
+        """Runs `parsed` on `searcher` within the `SEARCH_TIME_LIMIT` and
+        returns a tuple of the `Results` and whether they were truncated.
+        Takes the same keyword arguments as `Searcher.search()`.
+
+        """
+        collector = searcher.collector(limit=limit, **kwargs)
+        timelimit = settings.SEARCH_TIME_LIMIT
+        if timelimit:
+            collector = DeadlineCollector.wrap(collector, timelimit)
+        try:
+            searcher.search_with_collector(parsed, collector)
+        except TimeLimit:
+            return collector.results(), True
+        return collector.results(), False
+
+    def _facets(self):
+        facets = Facets()
+        for name, field in FACET_FIELDS.items():
+            if field == 'tags':
+                facets.add_facet(field, KeywordsFacet(field, maptype=Count))
+            else:
+                facets.add_field(field, maptype=Count)
+        return facets
+
+    def _facet_counts(self, results):
+        counts = {}
+        for name, field in FACET_FIELDS.items():
+            groups = results.groups(field)
+            values = [(value, count) for value, count in groups.items() if value]
+            values.sort(key=lambda (value, count): (-count, value))
+            counts[name] = values
+        return counts
+
+    def _prepare(self, query, filters, searcher):
+        """Splits filters out of the `query` string and returns a tuple of the
+        parsed text query and a query matching all filters, or `None` if there
+        are no filters.
+
+        """
+        text, parsed = split_query(query, filters)
+        filter_query = self._filter_query(parsed) if parsed else None
+        if not text and filter_query is not None:
+            # Only filters were given, so match everything they allow.
+            return Every(), filter_query
+        return self.parse(text, searcher), filter_query
+
+    def _filter_query(self, filters):
+        terms = set()
+        for name, values in filters.items():
+            field = FILTER_FIELDS[name]
+            normalize = FILTER_NORMALIZERS.get(name, lambda value: value)
+            for value in values:
+                terms.add(Term(field, normalize(value)))
+        return And(sorted(terms))
+
+    def _filter_docs(self, filter_query, searcher, version):
+        """Returns the set of documents matching `filter_query`, cached per
+        index version so that repeated filters don't have to be matched again.
+
+        """
+        cache = self.filter_cache()
+        key = repr(filter_query)
+        docs = cache.get(version, key)
+        if docs is QueryCache.MISSING:
+            docs = BitSet(searcher.docs_for_query(filter_query),
+                          size=searcher.doc_count_all())
+            cache.set(version, key, docs)
+        return docs
+
+    def _snippets(self, hits):
+        """Returns a dict mapping the document ids of `hits` to HTML snippets
+        of their descriptions, with the matched terms highlighted.
+
+        Fragments are built from the stored character offsets of the matched
+        terms and only the first `SEARCH_SNIPPET_CHARLIMIT` characters of each
+        description are considered, which bounds the work done per hit. Hits
+        past the overall budget of `SEARCH_SNIPPET_TIME_LIMIT` seconds per hit
+        fall back to the start of their description.
+
+        :param hits: A `ResultsPage`, searched with `terms=True`.
+
+        """
+        length = settings.SEARCH_SNIPPET_LENGTH
+        hits.results.highlighter = Highlighter(
+            fragmenter=PinpointFragmenter(maxchars=length,
+                                          surround=length / 4,
+                                          autotrim=True,
+                                          charlimit=settings.SEARCH_SNIPPET_CHARLIMIT),
+            formatter=HtmlFormatter(tagname='strong')
+        )
+
+        deadline = time.time() + settings.SEARCH_SNIPPET_TIME_LIMIT * len(hits)
+        snippets = {}
+        for hit in hits:
+            text = hit.get('description')
+            if not text:
+                continue
+            snippet = None
+            if time.time() < deadline:
+                snippet = hit.highlights('description', top=1)
+            if not snippet:
+                snippet = htmlescape(text[:length], quote=False)
+            snippets[hit['id']] = snippet
+        return snippets
+
+    def _sort_kwargs(self, sort):
+        if not sort:
+            return {}
+        field, direction = sort
+        return dict(sortedby=field, reverse=direction == 'desc')
+
+    def bulk_writer(self, procs=1, batchsize=100):
+        """Returns a writer suited to adding many documents at once, to be
+        passed to `add_document_bulk()`.
+
+        With more than one process, documents are handed over in batches to
+        sub-writers running in separate processes, each of which commits its
+        own segment. Use `optimize()` afterwards to merge them into one.
+
+        :param procs: Number of indexing processes.
+        :param batchsize: Documents handed to a sub-writer at a time. Only used
+        with `procs` > 1.
+
+        """
+        if procs > 1:
+            # Merging the sub-writer results on commit breaks in Whoosh 2.5
+            # whenever a sub-writer ends up without any documents, so keep
+            # their segments as they are.
+            return self.index.writer(procs=procs,
+                                     multisegment=True,
+                                     batchsize=batchsize)
+        return self.writer()
+
+    def writer(self, timeout=None):
+        """Returns a writer for the index, retrying to acquire the index lock
+        for up to `timeout` seconds. Raises `LockError` if it's still held.
+
+        :param timeout: Defaults to the `INDEX_WRITER_TIMEOUT` setting.
+
+        """
+        if timeout is None:
+            timeout = settings.INDEX_WRITER_TIMEOUT
+        return self.index.writer(timeout=timeout)
+
+    def fingerprints(self, since=None):
+        """Returns a dict mapping the ids of all documents in the index to
+        their fingerprints, see `fingerprint()`. Documents indexed without a
+        fingerprint map to `None`.
+
+        :param since: Only include documents created at or after this
+        `datetime`.
+
+        """
+        reader = self.searcher().reader()
+        if 'fingerprint' not in reader.schema or not reader.has_column('fingerprint'):
+            return dict((fields['id'], None)
+                        for fields in reader.all_stored_fields())
+
+        fingerprints = reader.column_reader('fingerprint')
+        created = reader.column_reader('created') if since else None
+
+        result = {}
+        for docnum in reader.all_doc_ids():
+            if since and created[docnum] < since:
+                continue
+            value = fingerprints[docnum]
+            if value:
+                docid = value.split(u':', 1)[0]
+            else:
+                docid, value = reader.stored_fields(docnum)['id'], None
+            result[docid] = value
+        return result
+
+    def optimize(self):
+        """Merges all segments of the index into one."""
+        self.index.optimize()
+
+    def segment_stats(self):
+        """Returns a dict with the number of `segments` in the index, the
+        number of `docs` and `deleted` documents they hold and their `size` on
+        disk in bytes.
+
+        """
+        storage = self.index.storage
+        with self.index.reader() as reader:
+            # Empty indexes have a single reader without a segment.
+            segments = [leaf.segment() for leaf, _ in reader.leaf_readers()]
+        segments = [segment for segment in segments if segment is not None]
+        size = 0
+        for segment in segments:
+            for filename in segment.list_files(storage):
+                size += storage.file_length(filename)
+        return {
+            'segments': len(segments),
+            'docs': sum(segment.doc_count_all() for segment in segments),
+            'deleted': sum(segment.deleted_count() for segment in segments),
+            'size': size
+        }
+
+    def merge(self, optimize=False, timeout=0.0):
+        """Merges small segments of the index, or all of them with `optimize`,
+        dropping deleted documents from the merged segments. Returns `False`
+        without merging if another writer holds the index lock.
+
+        Whoosh merges while committing, so the index lock is held for the
+        whole merge and writers started in the meantime wait for it, see
+        `writer()`. Merges should only run when there are few writes, see
+        `INDEX_MAINTENANCE_WINDOW`.
+
+        :param optimize: Merge all segments into one.
+        :param timeout: Seconds to wait for the index lock.
+
+        """
+        try:
+            writer = self.index.writer(timeout=timeout)
+        except LockError:
+            return False
+        with safe_write(writer, commit=False):
+            writer.commit(merge=True, optimize=optimize)
+        return True
 
     def add_document(self, doc, commit=True, writer=None):
         """Adds a single document to the index.
@@ -163,8 +1497,8 @@ class Index(object):
 
         """
         if writer is None:
-            writer = self.index.writer()
-        with safe_write(writer, commit):
+            writer = self.writer()
+        with safe_write(writer, commit, metric='index.add'):
             writer.add_document(**doc)
 
     def add_document_bulk(self, docs, commit=True, writer=None):
@@ -175,18 +1509,21 @@ class Index(object):
 
         This operation is regarded to be atomic. If any write fails the whole
         operation will be cancelled. If all writes succeed then a commit will
-        take place.
+        take place. Returns the number of documents added.
 
-        :param docs: A list of documents to add.
+        :param docs: An iterable of documents to add.
         :param commit: Auto-commit after adding.
         :param writer: An `IndexWriter` instance.
 
         """
         if writer is None:
-            writer = self.index.writer()
-        with safe_write(writer, commit):
+            writer = self.writer()
+        count = 0
+        with safe_write(writer, commit, metric='index.bulk'):
             for doc in docs:
                 writer.add_document(**doc)
+                count += 1
+        return count
 
     def update_document(self, doc, commit=True, writer=None):
         """Updates a document in the index. The document needs to contain a
@@ -198,8 +1535,8 @@ class Index(object):
 
         """
         if writer is None:
-            writer = self.index.writer()
-        with safe_write(writer, commit):
+            writer = self.writer()
+        with safe_write(writer, commit, metric='index.update'):
             writer.update_document(**doc)
 
     def delete_document(self, docid, commit=True, writer=None):
@@ -211,6 +1548,26 @@ class Index(object):
 
         """
         if writer is None:
-            writer = self.index.writer()
-        with safe_write(writer, commit):
+            writer = self.writer()
+        with safe_write(writer, commit, metric='index.delete'):
             writer.delete_by_term('id', docid)
+
+    def apply_batch(self, batch, commit=True, writer=None):
+        """Applies all mutations collected in an `IndexBatch`.
+
+        The same measures for `commit` should be taken for `apply_batch()` as
+        for `add_document()`. The whole batch is applied atomically.
+
+        :param batch: An `IndexBatch` instance.
+        :param commit: Auto-commit after applying.
+        :param writer: An `IndexWriter` instance.
+
+        """
+        if writer is None:
+            writer = self.writer()
+        with safe_write(writer, commit, metric='index.batch'):
+            for action, value in batch:
+                if action == IndexBatch.DELETE:
+                    writer.delete_by_term('id', value)
+                else:
+                    writer.update_document(**value)
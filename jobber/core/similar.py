@@ -0,0 +1,217 @@
+"""
+jobber.core.similar
+~~~~~~~~~~~~~~~~~~~
+
+Precomputed lists of similar jobs, stored in the `similar_jobs` table.
+
+"""
+import math
+from heapq import nlargest
+from collections import defaultdict
+
+from sqlalchemy import select, func
+
+from jobber.conf import settings
+from jobber.core.models import (Job, SimilarJob, SimilarUpdate,
+                                job_tags_association)
+from jobber.core.search import analyze
+from jobber.core.utils import now
+
+
+def job_texts(session):
+    """Returns a dict mapping the ids of all published jobs to the text their
+    similarity is computed from, i.e. their title, tags and description.
+
+    :param session: A `Session` instance.
+
+    """
+    parts = {}
+    query = session.query(Job.id, Job.title, Job.description_text)\
+                   .filter(Job.published == True)
+    for id, title, description in query:
+        parts[id] = [title, description or u'']
+
+    tags = job_tags_association
+    for job_id, slug in session.execute(select([tags.c.job_id, tags.c.tag_slug])):
+        if job_id in parts:
+            parts[job_id].append(slug)
+
+    return dict((id, u' '.join(texts)) for id, texts in parts.items())
+
+
+class SimilarityModel(object):
+    """TF-IDF vectors of a set of texts, normalized to unit length so that
+    their dot product is their cosine similarity.
+
+    Vectors are kept sparse, as dicts mapping terms to weights, along with
+    postings mapping every term to the `(id, weight)` pairs of the vectors
+    containing it. Similarities are only ever computed between texts that
+    share a term.
+
+    :param texts: A dict mapping ids to texts.
+
+    """
+    def __init__(self, texts):
+        frequencies = dict((id, defaultdict(int)) for id in texts)
+        document_frequencies = defaultdict(int)
+        for id, text in texts.items():
+            for term in analyze(text):
+                frequencies[id][term] += 1
+            for term in frequencies[id]:
+                document_frequencies[term] += 1
+
+        count = len(texts)
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        for id, terms in frequencies.items():
+            vector = {}
+            for term, frequency in terms.items():
+                # Sub-linear term frequency and smoothed inverse document
+                # frequency, so that terms found in every text still count.
+                idf = math.log((1.0 + count) / (1 + document_frequencies[term])) + 1
+                vector[term] = (1 + math.log(frequency)) * idf
+            norm = math.sqrt(sum(weight ** 2 for weight in vector.values())) or 1
+            for term in vector:
+                vector[term] /= norm
+                self.postings[term].append((id, vector[term]))
+            self.vectors[id] = vector
+
+    def neighbours(self, id, k):
+        """Returns up to `k` `(id, score)` tuples of the texts most similar to
+        the text with `id`, most similar first.
+
+        :param id: The id of a text.
+        :param k: How many neighbours to return.
+
+        """
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(id, {}).items():
+            for other, other_weight in self.postings[term]:
+                if other != id:
+                    scores[other] += weight * other_weight
+        return nlargest(k, scores.items(),
+                        key=lambda (other, score): (score, -other))
+
+
+def compute_similar_jobs(session, k=None):
+    """Replaces the similar jobs of all published jobs. Returns the number of
+    jobs that have similar jobs.
+
+    :param session: A `Session` instance.
+    :param k: How many similar jobs to keep per job, defaults to the
+    `SIMILAR_JOBS_COUNT` setting.
+
+    """
+    if k is None:
+        k = settings.SIMILAR_JOBS_COUNT
+    model = SimilarityModel(job_texts(session))
+    neighbours = dict((id, model.neighbours(id, k)) for id in model.vectors)
+
+    session.execute(SimilarJob.__table__.delete())
+    _insert(session, neighbours)
+    return sum(1 for similar in neighbours.values() if similar)
+
+
+def refresh_similar_jobs(session, job_ids, k=None, model=None):
+    """Recomputes the similar jobs of the jobs with `job_ids`, along with the
+    jobs that list them or share a term with them. Returns the ids of all
+    jobs whose similar jobs were recomputed.
+
+    Lists aren't symmetric, a job can make it into the similar jobs of
+    another without that one making it into its own, so every job that
+    could now list a changed job has to be recomputed.
+
+    Unpublished or deleted jobs end up without similar jobs and are dropped
+    from the lists of other jobs.
+
+    :param session: A `Session` instance.
+    :param job_ids: The ids of jobs that were published, edited, unpublished
+    or deleted.
+    :param k: How many similar jobs to keep per job, defaults to the
+    `SIMILAR_JOBS_COUNT` setting.
+    :param model: The `SimilarityModel` of all published jobs, built if not
+    given.
+
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return set()
+    if k is None:
+        k = settings.SIMILAR_JOBS_COUNT
+    if model is None:
+        model = SimilarityModel(job_texts(session))
+    table = SimilarJob.__table__
+
+    affected = set(job_ids)
+    listing = select([table.c.job_id]).where(table.c.similar_job_id.in_(job_ids))
+    affected.update(row[0] for row in session.execute(listing))
+    for id in job_ids:
+        for term in model.vectors.get(id, {}):
+            affected.update(other for other, _ in model.postings[term])
+
+    neighbours = dict((id, model.neighbours(id, k)) for id in affected)
+    session.execute(table.delete().where(table.c.job_id.in_(affected)))
+    _insert(session, neighbours)
+    return affected
+
+
+def drain_similar_updates(session, limit=None, k=None):
+    """Refreshes the similar jobs around the jobs queued in the
+    `similar_updates` outbox, committing every `limit` rows. Returns the
+    number of outbox rows that were processed.
+
+    Building the `SimilarityModel` takes a pass over all published jobs, so
+    it is only built if there are any queued rows, and only once for all of
+    them. Rows queued meanwhile are left for the next run, as the model
+    doesn't include their changes.
+
+    Outbox rows are only deleted along with the refreshed lists, so a failed
+    run will simply be retried.
+
+    :param session: A `Session` instance.
+    :param limit: Maximum number of outbox rows to process per commit,
+    defaults to the `SIMILAR_JOBS_BATCH_SIZE` setting.
+    :param k: How many similar jobs to keep per job, defaults to the
+    `SIMILAR_JOBS_COUNT` setting.
+
+    """
+    if limit is None:
+        limit = settings.SIMILAR_JOBS_BATCH_SIZE
+
+    # Rows are queued in the same transaction as the changes they stand for,
+    # so the model built next includes the changes of every row up to `last`.
+    last = session.query(func.max(SimilarUpdate.id)).scalar()
+    if last is None:
+        return 0
+    model = SimilarityModel(job_texts(session))
+
+    processed = 0
+    while True:
+        updates = session.query(SimilarUpdate.id, SimilarUpdate.job_id)\
+                  .filter(SimilarUpdate.id <= last)\
+                  .order_by(SimilarUpdate.id)\
+                  .limit(limit).all()
+        if not updates:
+            break
+
+        refresh_similar_jobs(session, set(job_id for _, job_id in updates),
+                             k=k, model=model)
+
+        update_ids = [id for id, _ in updates]
+        session.query(SimilarUpdate)\
+               .filter(SimilarUpdate.id.in_(update_ids))\
+               .delete(synchronize_session=False)
+        session.commit()
+        processed += len(updates)
+    return processed
+
+
+def _insert(session, neighbours):
+    created = now()
+    rows = []
+    for id, similar in neighbours.items():
+        for rank, (other, score) in enumerate(similar):
+            rows.append(dict(job_id=id, similar_job_id=other, score=score,
+                             rank=rank, created=created))
+    if rows:
+        session.execute(SimilarJob.__table__.insert(), rows)
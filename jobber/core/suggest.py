@@ -0,0 +1,225 @@
+"""
+jobber.core.suggest
+~~~~~~~~~~~~~~~~~~~
+
+In-memory prefix completions for the search box.
+
+"""
+import time
+import logging
+from bisect import bisect_left, insort
+from threading import Lock, Thread
+
+from jobber.conf import settings
+from jobber.core.models import Job, Tag, Company, Location
+
+
+logger = logging.getLogger(__name__)
+
+# Kinds of suggestions, in the order they are ranked when equally good.
+KINDS = ('tag', 'title', 'company', 'city')
+
+
+def normalize(text):
+    """Lowercases `text` and collapses whitespace, so that prefixes can be
+    compared case-insensitively.
+
+    """
+    return u' '.join(text.lower().split())
+
+
+class PrefixIndex(object):
+    """A sorted list of keys supporting prefix lookups with binary search.
+
+    Every suggestion is keyed by its whole text and by every word it contains
+    onwards, so that e.g. 'dev' completes to 'Python Developer'. Suggestions
+    are reference counted, as the same text can be added for several owners,
+    i.e. two jobs with the same title.
+
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.keys = []
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, kind, text):
+        """Adds a suggestion for `text`.
+
+        :param kind: One of `KINDS`.
+        :param text: The text to suggest.
+
+        """
+        text = u' '.join(text.split())
+        if not text:
+            return
+        entry = (kind, text)
+        with self.lock:
+            count = self.counts.get(entry, 0)
+            self.counts[entry] = count + 1
+            if count:
+                return
+            for key in self._keys(entry):
+                insort(self.keys, key)
+
+    def discard(self, kind, text):
+        """Removes a suggestion for `text`, once it has been discarded as many
+        times as it was added.
+
+        :param kind: One of `KINDS`.
+        :param text: The suggested text.
+
+        """
+        text = u' '.join(text.split())
+        entry = (kind, text)
+        with self.lock:
+            count = self.counts.get(entry, 0)
+            if count > 1:
+                self.counts[entry] = count - 1
+                return
+            if not count:
+                return
+            del self.counts[entry]
+            for key in self._keys(entry):
+                i = bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+
+    def clear(self):
+        with self.lock:
+            self.keys = []
+            self.counts = {}
+
+    def lookup(self, prefix, limit=10):
+        """Returns up to `limit` suggestions starting with `prefix`, as a list
+        of `(kind, text)` tuples. Suggestions whose text starts with `prefix`
+        rank before suggestions where a later word does.
+
+        :param prefix: The text typed so far.
+        :param limit: Maximum number of suggestions.
+
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        matches = {}
+        with self.lock:
+            keys = self.keys
+            i = bisect_left(keys, (prefix,))
+            # Collect a few more matches than needed, so they can be ranked.
+            while i < len(keys) and len(matches) < limit * 4:
+                key, start, kind, text = keys[i]
+                if not key.startswith(prefix):
+                    break
+                rank = matches.get((kind, text), 1)
+                matches[(kind, text)] = min(rank, start)
+                i += 1
+
+        ranked = sorted(matches, key=lambda (kind, text): (
+            matches[(kind, text)], KINDS.index(kind), normalize(text)
+        ))
+        return ranked[:limit]
+
+    def _keys(self, entry):
+        kind, text = entry
+        words = normalize(text).split(u' ')
+        keys = set()
+        for i in range(len(words)):
+            # Whether the key starts at the first word, used for ranking.
+            start = 0 if i == 0 else 1
+            keys.add((u' '.join(words[i:]), start, kind, text))
+        return keys
+
+
+class Suggester(object):
+    """Keeps a `PrefixIndex` of tags, company names, cities and the titles of
+    published jobs, which is loaded once with `load()` and kept up to date
+    from the model signals.
+
+    Signals only fire for the changes made by this process, so the
+    suggestions are also reloaded every `SEARCH_SUGGEST_RELOAD_INTERVAL`
+    seconds in the background to pick up the changes of other processes, see
+    `watch()`.
+
+    """
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.titles = {}
+        self.loaded = False
+
+    def load(self, session):
+        """(Re)builds the suggestions from the database. The previous ones
+        keep being served until the new ones are complete.
+
+        :param session: A `Session` instance.
+
+        """
+        index = PrefixIndex()
+        titles = {}
+        for tag, in session.query(Tag.tag):
+            index.add('tag', tag)
+        for name, in session.query(Company.name):
+            index.add('company', name)
+        for city, in session.query(Location.city):
+            index.add('city', city)
+        for job_id, title in session.query(Job.id, Job.title)\
+                                    .filter(Job.published == True):
+            titles[job_id] = title
+            index.add('title', title)
+        self.index, self.titles = index, titles
+        self.loaded = True
+
+    def watch(self, session, interval=None):
+        """Starts a daemon thread reloading the suggestions every `interval`
+        seconds, away from the requests which keep serving the current ones.
+        Returns the thread.
+
+        :param session: A `scoped_session`, removed after every reload so
+        that the thread doesn't hold on to a connection in between.
+        :param interval: Defaults to the `SEARCH_SUGGEST_RELOAD_INTERVAL`
+        setting.
+
+        """
+        if interval is None:
+            interval = settings.SEARCH_SUGGEST_RELOAD_INTERVAL
+        thread = Thread(target=self._reload, args=(session, interval),
+                        name='suggestions')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _reload(self, session, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.load(session)
+            except Exception:
+                logger.exception('Failed to reload suggestions!')
+            finally:
+                session.remove()
+
+    def suggest(self, prefix, limit=10):
+        """Returns up to `limit` completions for `prefix`, see
+        `PrefixIndex.lookup()`.
+
+        """
+        return self.index.lookup(prefix, limit)
+
+    def index_title(self, job_id, title):
+        """Makes `title` the suggested title of job `job_id`, or stops
+        suggesting its title if `title` is `None`.
+
+        """
+        previous = self.titles.pop(job_id, None)
+        if previous is not None:
+            self.index.discard('title', previous)
+        if title is not None:
+            self.titles[job_id] = title
+            self.index.add('title', title)
+
+
+# Global suggester shared by all requests in this process.
+suggester = Suggester()
@@ -7,8 +7,10 @@ Utility methods.
 """
 import re
 import uuid
+from math import ceil
 from functools import reduce
 from unicodedata import normalize
+from HTMLParser import HTMLParser
 
 import sqlalchemy.types as types
 import arrow
@@ -103,12 +105,13 @@ def clean_html(html):
 
 
 def strip_html(html):
-    """Completely removes HTML entitiesfrom `html`.
+    """Completely removes HTML entitiesfrom `html`, returning plain text with
+    any character references unescaped.
 
     :param html: An HTML string
 
     """
-    return bleach.clean(html, tags=[], strip=True)
+    return HTMLParser().unescape(bleach.clean(html, tags=[], strip=True))
 
 
 def ensure_protocol(url, fallback='http://'):
@@ -161,6 +164,48 @@ class Mapping(object):
         return self.mapping.items()
 
 
+class Page(object):
+    """A single page of an ordered collection of `total` items.
+
+    :param items: The items on this page.
+    :param page: The page number, starting at 1.
+    :param per_page: The maximum number of items on a page.
+    :param total: The number of items in the whole collection.
+
+    """
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def pages(self):
+        return int(ceil(self.total / float(self.per_page)))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1
+
+    @property
+    def next_num(self):
+        return self.page + 1
+
+
 class ArrowDateTime(types.TypeDecorator):
     """Enhances the `DateTime` type to return an `Arrow` object instead of
     `datetime`.
@@ -7,14 +7,16 @@ Factory module for creating `Flask` applications.
 """
 from __future__ import absolute_import
 
-from logging import StreamHandler, Formatter
+from logging import StreamHandler, FileHandler, Formatter, getLogger
 from logging.handlers import SysLogHandler
 
 from flask import Flask
 
 from jobber.conf import settings
 from jobber.core.email import mail
+from jobber.core.suggest import suggester
 from jobber.database import db
+from jobber.functions import load_memory_index, sync_memory_index
 from jobber.views import blueprint
 from jobber.signals import register_signals
 
@@ -104,6 +106,15 @@ def configure_logging(app):
     app.logger.addHandler(handler)
     app.logger.setLevel(level)
 
+    # Slow queries can additionally be written to a log file of their own.
+    slow_query_logger = getLogger('jobber.slow_queries')
+    del slow_query_logger.handlers[:]
+    slow_query_log = app.config.get('SEARCH_SLOW_QUERY_LOG')
+    if slow_query_log:
+        slow_query_handler = FileHandler(slow_query_log)
+        slow_query_handler.setFormatter(Formatter('%(asctime)s >> %(message)s'))
+        slow_query_logger.addHandler(slow_query_handler)
+
     return app
 
 
@@ -114,3 +125,26 @@ def configure_extensions(app):
 
     """
     mail.init_app(app)
+
+
+def configure_search(app):
+    """Loads the in-memory suggestions, and the in-memory index with the
+    `memory` backend, on the first request, so that importing the app doesn't
+    touch the database and every forked worker loads its own. Suggestions are
+    then reloaded in the background, see `Suggester.watch()`.
+
+    :param app: A `Flask` application.
+
+    """
+    @app.before_first_request
+    def load_search():
+        suggester.load(db.session)
+        suggester.watch(db.session)
+        if settings.SEARCH_BACKEND == 'memory':
+            load_memory_index(db.session)
+
+    if settings.SEARCH_BACKEND == 'memory':
+        @app.before_request
+        def sync_memory():
+            # Picks up the jobs changed by the other processes serving the app.
+            sync_memory_index(db.session)
@@ -6,16 +6,22 @@ Shared functions.
 
 """
 import os
+import time
 import logging
 import json
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import requests
+from sqlalchemy import func
 
 from jobber.conf import settings
 from jobber.core.email import send_email_template
 from jobber.core.utils import now
-from jobber.core.models import SocialBroadcast
+from jobber.core.models import SocialBroadcast, IndexUpdate, JobChange, Job
+from jobber.core.memory import inverted_index
+from jobber.core.search import (Index, IndexBatch, IndexManager, LockError,
+                                Schema)
+from jobber.services import eager_listing
 from jobber.vendor.html2text import html2text
 
 
@@ -118,6 +124,421 @@ def social_broadcast(job, service):
     )
 
 
+def index_batch(session, job_ids, **filters):
+    """Returns an `IndexBatch` bringing the documents of `job_ids` in line with
+    the current state of the jobs, i.e. updating the ones matching `filters`
+    and deleting the rest.
+
+    :param session: A `Session` instance.
+    :param job_ids: An iterable of job ids.
+    :param filters: Keyword arguments for `Query.filter_by()`, deciding which
+    jobs belong in the index.
+
+    """
+    job_ids = set(job_ids)
+    batch = IndexBatch()
+    if not job_ids:
+        return batch
+
+    query = session.query(Job).filter_by(**filters).filter(Job.id.in_(job_ids))
+    jobs = dict((job.id, job) for job in eager_listing(query))
+    for job_id in sorted(job_ids):
+        job = jobs.get(job_id)
+        if job:
+            batch.update(job.to_document())
+        else:
+            batch.delete(unicode(job_id))
+    return batch
+
+
+def drain_index_updates(session, limit=None):
+    """Applies up to `limit` pending updates from the `index_updates` outbox to
+    the search index, with a single index commit. Returns the number of outbox
+    rows that were processed.
+
+    Outbox rows are only marked as drained after the index commit succeeded,
+    so a failed or interrupted run will simply be retried. Drained rows are
+    deleted once they are older than `INDEX_DRAINED_RETENTION` seconds.
+
+    :param session: A `Session` instance.
+    :param limit: Maximum number of outbox rows to process.
+
+    """
+    if limit is None:
+        limit = settings.INDEX_WORKER_BATCH_SIZE
+
+    updates = session.query(IndexUpdate)\
+              .filter(IndexUpdate.drained == None)\
+              .order_by(IndexUpdate.id)\
+              .limit(limit).all()
+
+    if not updates:
+        return 0
+
+    # The current state of the job decides what happens in the index, so
+    # multiple updates for the same job collapse into one.
+    job_ids = set(update.job_id for update in updates)
+    batch = index_batch(session, job_ids, published=True)
+
+    index = Index()
+    version = index.name
+    index.apply_batch(batch)
+
+    update_ids = [update.id for update in updates]
+    session.query(IndexUpdate)\
+           .filter(IndexUpdate.id.in_(update_ids))\
+           .update({'drained': now()}, synchronize_session=False)
+    cutoff = now().replace(seconds=-settings.INDEX_DRAINED_RETENTION)
+    session.query(IndexUpdate)\
+           .filter(IndexUpdate.drained < cutoff)\
+           .delete(synchronize_session=False)
+    session.commit()
+
+    # A rebuild that switched versions after the batch was applied may have
+    # missed these rows when catching up, see `rebuild_index()`.
+    if IndexManager.resolve(index.alias, index.directory) != version:
+        Index().apply_batch(batch)
+
+    logger.info("Applied {} index updates for {} jobs."
+                .format(len(updates), len(batch)))
+
+    return len(updates)
+
+
+def iter_job_documents(session, chunk_size=None, since=None, **filters):
+    """Yields the search documents of all jobs matching `filters`, in order of
+    id.
+
+    Jobs are loaded `chunk_size` at a time along with their relationships, so
+    memory use is bounded by the chunk size rather than the size of the table
+    and every chunk costs a fixed number of queries.
+
+    :param session: A `Session` instance.
+    :param chunk_size: How many jobs to load at a time.
+    :param since: Only include jobs created at or after this `Arrow` date.
+    :param filters: Keyword arguments for `Query.filter_by()`.
+
+    """
+    if chunk_size is None:
+        chunk_size = settings.INDEX_EXPORT_CHUNK_SIZE
+
+    last_id = 0
+    while True:
+        query = session.query(Job)\
+                .filter_by(**filters)\
+                .filter(Job.id > last_id)
+        if since is not None:
+            query = query.filter(Job.created >= since)
+        query = query.order_by(Job.id).limit(chunk_size)
+        jobs = eager_listing(query).all()
+
+        if not jobs:
+            return
+
+        for job in jobs:
+            yield job.to_document()
+
+        last_id = jobs[-1].id
+
+        # Loaded jobs are only weakly referenced by the session, so dropping
+        # the chunk lets them be garbage collected.
+        del jobs
+
+
+def sync_index(session, since=None, chunk_size=None, **filters):
+    """Brings the search index in line with the `jobs` table by comparing the
+    fingerprints of indexed documents against freshly built ones, and only
+    adding, updating or deleting the documents that differ. Returns a tuple of
+    the number of documents added, updated and deleted.
+
+    :param session: A `Session` instance.
+    :param since: Only compare jobs created at or after this `Arrow` date.
+    :param chunk_size: How many jobs to load at a time.
+    :param filters: Keyword arguments for `Query.filter_by()`, deciding which
+    jobs belong in the index.
+
+    """
+    index = Index()
+    # Dates are indexed as naive UTC datetimes.
+    indexed = index.fingerprints(since=since.to('utc').naive if since else None)
+
+    added = updated = 0
+    batch = IndexBatch()
+    for doc in iter_job_documents(session, chunk_size, since, **filters):
+        if doc['id'] not in indexed:
+            batch.update(doc)
+            added += 1
+        elif indexed.pop(doc['id']) != doc['fingerprint']:
+            batch.update(doc)
+            updated += 1
+
+    # Anything left over is in the index but should not be.
+    for docid in indexed:
+        batch.delete(docid)
+
+    if batch:
+        index.apply_batch(batch)
+
+    logger.info("Synced index, {} added, {} updated and {} deleted."
+                .format(added, updated, len(indexed)))
+
+    return added, updated, len(indexed)
+
+
+def load_memory_index(session, index=None):
+    """Loads all published jobs into the in-memory index.
+
+    :param session: A `Session` instance.
+    :param index: The `InvertedIndex` to load, defaults to the global one.
+
+    """
+    if index is None:
+        index = inverted_index
+    # Changes committed while loading are applied again by the next sync,
+    # which is harmless.
+    change_id = session.query(func.max(JobChange.id)).scalar() or 0
+    index.load(iter_job_documents(session, published=True))
+    index.change_id = change_id
+    index.synced = time.time()
+
+
+def sync_memory_index(session, index=None, interval=None):
+    """Applies the jobs changed since the last sync, by this or any other
+    process, to the in-memory index, at most once every `interval` seconds.
+    Returns the number of changes applied.
+
+    Changes are read from the `job_changes` log, whose ids ascend in commit
+    order as long as writes are serialized, like with SQLite. An index that
+    wasn't synced for longer than the log is kept is loaded again instead.
+
+    :param session: A `Session` instance.
+    :param index: The `InvertedIndex` to sync, defaults to the global one.
+    :param interval: Defaults to the `SEARCH_MEMORY_SYNC_INTERVAL` setting.
+
+    """
+    if index is None:
+        index = inverted_index
+    if interval is None:
+        interval = settings.SEARCH_MEMORY_SYNC_INTERVAL
+    if not index.loaded:
+        return 0
+    elapsed = time.time() - index.synced
+    if elapsed < interval:
+        return 0
+    if elapsed > settings.SEARCH_MEMORY_CHANGES_RETENTION:
+        logger.info('In-memory index is out of date, reloading.')
+        load_memory_index(session, index)
+        return 0
+
+    index.synced = time.time()
+    changes = session.query(JobChange.id, JobChange.job_id)\
+              .filter(JobChange.id > index.change_id)\
+              .order_by(JobChange.id).all()
+    if not changes:
+        return 0
+
+    job_ids = set(job_id for _, job_id in changes)
+    jobs = eager_listing(session.query(Job).filter(Job.id.in_(job_ids)))
+    jobs = dict((job.id, job) for job in jobs)
+    for job_id in job_ids:
+        job = jobs.get(job_id)
+        if job and job.published:
+            index.update(job.to_document())
+        else:
+            index.remove(unicode(job_id))
+    index.change_id = changes[-1][0]
+    return len(changes)
+
+
+def prune_job_changes(session):
+    """Deletes the `job_changes` older than `SEARCH_MEMORY_CHANGES_RETENTION`
+    seconds. Returns the number of deleted rows.
+
+    :param session: A `Session` instance.
+
+    """
+    cutoff = now().replace(seconds=-settings.SEARCH_MEMORY_CHANGES_RETENTION)
+    count = session.query(JobChange)\
+            .filter(JobChange.created < cutoff)\
+            .delete(synchronize_session=False)
+    session.commit()
+    return count
+
+
+def catch_up_index(session, since, **filters):
+    """Applies the `index_updates` drained at or after `since` to the search
+    index once more, e.g. because they were applied to a version of the index
+    that has since been replaced. Returns the number of jobs caught up on.
+
+    :param session: A `Session` instance.
+    :param since: An `Arrow` date.
+    :param filters: Keyword arguments for `Query.filter_by()`, deciding which
+    jobs belong in the index.
+
+    """
+    drained = session.query(IndexUpdate.job_id)\
+              .filter(IndexUpdate.drained >= since)\
+              .distinct()
+    batch = index_batch(session, [job_id for job_id, in drained], **filters)
+    if batch:
+        Index().apply_batch(batch)
+    logger.info("Caught up on index updates for {} jobs.".format(len(batch)))
+    return len(batch)
+
+
+def rebuild_index(session, procs=1, batch_size=None, optimize=True, keep=None,
+                  **filters):
+    """Rebuilds the search index into a new version next to the one in use
+    and switches over to it once complete, so that searches keep being served
+    in the meantime. Returns a tuple of the name of the new version and the
+    number of documents added to it.
+
+    Once switched over, the new version catches up on the `index_updates`
+    drained into the previous one while it was being built and on the jobs
+    created in the meantime, see `sync_index()`. Rebuilds that took longer
+    than `INDEX_DRAINED_RETENTION` seconds sync all jobs instead. Older
+    versions are garbage collected afterwards, see
+    `IndexManager.collect_garbage()`. Raises `LockError` if another rebuild
+    is already running.
+
+    :param session: A `Session` instance.
+    :param procs: Number of indexing processes, see `Index.bulk_writer()`.
+    :param batch_size: How many jobs to load and hand to an indexing process
+    at a time.
+    :param optimize: Merge the segments written by multiple processes.
+    :param keep: How many older versions to keep, see
+    `IndexManager.collect_garbage()`.
+    :param filters: Keyword arguments for `Query.filter_by()`, deciding which
+    jobs belong in the index.
+
+    """
+    name = settings.SEARCH_INDEX_NAME
+    directory = settings.SEARCH_INDEX_DIRECTORY
+
+    lock = IndexManager.rebuild_lock(name, directory)
+    if not lock.acquire(blocking=False):
+        raise LockError('Index {!r} is already being rebuilt.'.format(name))
+
+    try:
+        # Versions newer than the one in use were left behind by rebuilds
+        # that didn't finish, since nobody else holds the lock.
+        current = IndexManager.resolve(name, directory)
+        versions = IndexManager.versions(name, directory)
+        numbers = [number for number, version in versions if version == current]
+        for number, version in versions:
+            if numbers and number > numbers[0]:
+                IndexManager.delete(version, directory)
+
+        started = now()
+        version = IndexManager.create_version(Schema, name, directory)
+        try:
+            index = Index(version, directory)
+            docs = iter_job_documents(session, batch_size, **filters)
+            writer = index.bulk_writer(procs=procs, batchsize=batch_size or 100)
+            count = index.add_document_bulk(docs, writer=writer)
+            if procs > 1 and optimize:
+                index.optimize()
+        except:
+            IndexManager.delete(version, directory)
+            raise
+
+        IndexManager.switch(name, directory, version)
+        if now() > started.replace(seconds=settings.INDEX_DRAINED_RETENTION):
+            sync_index(session, chunk_size=batch_size, **filters)
+        else:
+            catch_up_index(session, started, **filters)
+            sync_index(session, since=started, chunk_size=batch_size, **filters)
+        deleted = IndexManager.collect_garbage(name, directory, keep)
+    finally:
+        lock.release()
+
+    logger.info("Rebuilt index {} with {} documents, deleted {} old versions."
+                .format(version, count, len(deleted)))
+
+    return version, count
+
+
+def maintain_index(optimize=None, force=False):
+    """Merges the segments of the search index once there are at least
+    `INDEX_MERGE_MIN_SEGMENTS` of them. Returns a tuple of the segment stats
+    before and after merging, the latter being `None` if nothing was merged.
+
+    Merging is skipped if another writer holds the index lock, see
+    `Index.merge()`.
+
+    :param optimize: Merge all segments into one instead of only the small
+    ones. Defaults to whether `INDEX_MERGE_POLICY` is 'optimize'.
+    :param force: Merge regardless of the number of segments.
+
+    """
+    if optimize is None:
+        optimize = settings.INDEX_MERGE_POLICY == 'optimize'
+
+    index = Index()
+    before = index.segment_stats()
+
+    if not force and before['segments'] < settings.INDEX_MERGE_MIN_SEGMENTS:
+        return before, None
+
+    if not index.merge(optimize=optimize):
+        logger.info('Index is locked, skipping segment merge.')
+        return before, None
+
+    after = index.segment_stats()
+    logger.info("Merged index segments from {} to {}."
+                .format(before['segments'], after['segments']))
+    return before, after
+
+
+class MaintenanceSchedule(object):
+    """Decides when to run `maintain_index()` from a long running process,
+    at most once every `interval` seconds and only during `window`.
+
+    :param interval: Minimum seconds between runs.
+    :param window: A tuple of `(start, end)` hours of the day in local time,
+    which may wrap around midnight, or `None` to allow any time. Defaults to
+    the `INDEX_MAINTENANCE_WINDOW` setting.
+    :param clock: A function returning the current timestamp.
+
+    """
+    #: Default of `window`, as `None` allows any time.
+    SETTING = object()
+
+    def __init__(self, interval=None, window=SETTING, clock=time.time):
+        if interval is None:
+            interval = settings.INDEX_MAINTENANCE_INTERVAL
+        if window is self.SETTING:
+            window = settings.INDEX_MAINTENANCE_WINDOW
+        self.interval = interval
+        self.window = window
+        self.clock = clock
+        self.last_run = None
+
+    def in_window(self, timestamp):
+        """Checks whether `timestamp` falls within the maintenance window."""
+        if not self.window:
+            return True
+        start, end = self.window
+        hour = datetime.fromtimestamp(timestamp).hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def due(self):
+        """Checks whether maintenance should run now."""
+        timestamp = self.clock()
+        if self.last_run is not None and timestamp - self.last_run < self.interval:
+            return False
+        return self.in_window(timestamp)
+
+    def run(self):
+        """Runs `maintain_index()` if due, returning its result or `None`."""
+        if not self.due():
+            return None
+        self.last_run = self.clock()
+        return maintain_index()
+
+
 class InvalidService(Exception):
     pass
 
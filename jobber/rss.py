@@ -10,7 +10,7 @@ from flask import url_for
 
 from jobber.core.models import Job
 from jobber.database import db
-from jobber.services import SearchService
+from jobber.services import search_service
 
 
 # Feed properties.
@@ -43,7 +43,7 @@ def get_all(limit):
 
 
 def search(query, limit):
-    service = SearchService()
+    service = search_service()
     return service.search_jobs(query, limit=limit)
 
 
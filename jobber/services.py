@@ -1,25 +1,285 @@
-from jobber.core.search import Index
-from jobber.core.models import Job
+import logging
+from collections import namedtuple
+
+import arrow
+from flask import url_for
+from sqlalchemy.orm import joinedload, subqueryload
+
+from jobber.core.search import Index, SearchPage
+from jobber.core.daemon import RemoteIndex, DaemonUnavailable
+from jobber.core.fts import FTSIndex
+from jobber.core.memory import MemoryIndex
+from jobber.core.suggest import suggester
+from jobber.core.models import Job, Location, SimilarJob
+from jobber.core.utils import Page
 from jobber.database import db
+from jobber.conf import settings
+
+
+logger = logging.getLogger('jobber')
+
+
+# SQLite refuses queries with more than 999 bound parameters, so hits are
+# hydrated in chunks of this size.
+HYDRATE_CHUNK_SIZE = 500
+
+
+# Search engines `SearchService` can use, as a mapping of `SEARCH_BACKEND`
+# names to index classes.
+SEARCH_BACKENDS = {
+    'whoosh': Index,
+    'fts': FTSIndex,
+    'memory': MemoryIndex
+}
+
+
+def search_index():
+    """Returns the index of the configured `SEARCH_BACKEND`."""
+    return SEARCH_BACKENDS[settings.SEARCH_BACKEND]()
+
+
+def search_service():
+    """Returns a `SearchClient` if the `SEARCH_DAEMON_SOCKET` setting is set
+    and the `SEARCH_BACKEND` is `whoosh`, the only one the daemon serves,
+    otherwise a `SearchService` searching in-process.
+
+    """
+    if settings.SEARCH_DAEMON_SOCKET and settings.SEARCH_BACKEND == 'whoosh':
+        return SearchClient()
+    return SearchService()
+
+
+ListingCompany = namedtuple('ListingCompany', 'name slug')
+ListingTag = namedtuple('ListingTag', 'slug tag')
+
+
+class ListingLocation(namedtuple('ListingLocation', 'city country_code')):
+
+    @property
+    def country_name(self):
+        return Location.COUNTRIES.map(self.country_code)
+
+
+class Listing(object):
+    """Lightweight, read-only stand-in for a `Job`, built from the listing
+    stored in the search index. Exposes everything `index.html` and the RSS
+    feed need, so search results can be rendered without the database.
+
+    :param id: The job id.
+    :param data: The `listing` stored field, see `Job.to_listing()`.
+
+    """
+    def __init__(self, id, data):
+        self.id = id
+        self.title = data['title']
+        self.slug = data['slug']
+        self.description = data['description']
+        self.job_type = data['job_type']
+        self.company = ListingCompany(data['company_name'], data['company_slug'])
+        self.location = ListingLocation(data['city'], data['country_code'])
+        self.tags = [ListingTag(slug, tag) for slug, tag in data['tags']]
+        self.created = arrow.get(data['created'])
+
+    @property
+    def human_job_type(self):
+        return Job.JOB_TYPES.map(self.job_type)
+
+    @property
+    def tag_slugs(self):
+        return [tag.slug for tag in self.tags]
+
+    def url(self, external=False):
+        kwargs = {
+            'job_id': self.id,
+            'company_slug': self.company.slug,
+            'job_slug': self.slug,
+            '_external': external
+        }
+        return url_for('views.show', **kwargs)
+
+
+def eager_listing(query):
+    """Eager-loads the relationships needed to render `Job` listings.
+
+    :param query: A `Query` for `Job` instances.
+
+    """
+    return query.options(joinedload(Job.company),
+                         joinedload(Job.location),
+                         subqueryload(Job.tags))
+
+
+class JobsService(object):
+
+    def list_published(self, page=1, per_page=None):
+        """Returns a `Page` of published jobs, newest first.
+
+        :param page: The page number, starting at 1.
+        :param per_page: How many jobs per page.
+
+        """
+        if per_page is None:
+            per_page = settings.SEARCH_PAGE_LENGTH
+        query = db.session.query(Job).filter_by(published=True)
+        total = query.count()
+        jobs = eager_listing(query)\
+               .order_by(Job.created.desc())\
+               .offset((page - 1) * per_page)\
+               .limit(per_page).all()
+        return Page(jobs, page, per_page, total)
+
+    def similar_jobs(self, job_id):
+        """Returns the published jobs similar to the job with `job_id`, most
+        similar first. These are precomputed, see `jobber.core.similar`.
+
+        :param job_id: The id of a job.
+
+        """
+        query = db.session.query(Job)\
+                .join(SimilarJob, SimilarJob.similar_job_id == Job.id)\
+                .filter(SimilarJob.job_id == job_id, Job.published == True)\
+                .order_by(SimilarJob.rank)
+        return eager_listing(query).all()
 
 
 class SearchService(object):
 
-    def search_jobs(self, query, sort=None, limit=None):
-        index = Index()
-        hits = []
+    def index(self):
+        """Returns the index searches are run against."""
+        return search_index()
+
+    def search_jobs(self, query, sort=None, limit=None, filters=None):
+        index = self.index()
 
         kwargs = dict()
         if sort:
             kwargs['sort'] = sort
         if limit:
             kwargs['limit'] = limit
+        if filters:
+            kwargs['filters'] = filters
+
+        return self.resolve(index.search(query, **kwargs))
+
+    def search_jobs_page(self, query, page=1, per_page=None, sort=None,
+                         facets=False, filters=None, snippets=False,
+                         correct=False):
+        """Returns a `SearchPage` of jobs matching `query`.
+
+        :param query: A string containing the users query.
+        :param page: The page number, starting at 1.
+        :param per_page: How many jobs per page.
+        :param sort: A tuple of (field, direction), see `Index.search()`.
+        :param facets: Whether to count facets, see `Index.search_page()`.
+        :param filters: Filters restricting the results, see `Index.search()`.
+        :param snippets: Whether to highlight descriptions, see
+        `Index.search_page()`. Snippets are keyed by job id.
+        :param correct: Whether to suggest a corrected query when there are no
+        more than `SEARCH_SPELLING_MAX_HITS` hits, see `Index.correct()`. Only
+        corrections matching more jobs are suggested, and none at all if the
+        search ran out of time.
+
+        """
+        index = self.index()
+        hits = index.search_page(query,
+                                 page=page,
+                                 pagelen=per_page,
+                                 sort=sort,
+                                 facets=facets,
+                                 filters=filters,
+                                 snippets=snippets)
+        jobs = self.resolve(hits)
+        highlights = dict((int(id), snippet)
+                          for id, snippet in hits.snippets.items())
+
+        correction = None
+        if correct and not hits.truncated and \
+           hits.total <= settings.SEARCH_SPELLING_MAX_HITS:
+            correction = index.correct(query)
+            if correction is not None:
+                corrected = index.search_page(correction, pagelen=1,
+                                              filters=filters)
+                if corrected.total <= hits.total:
+                    correction = None
+
+        return SearchPage(jobs, hits.page, hits.per_page, hits.total,
+                          facets=hits.facets, snippets=highlights,
+                          correction=correction, truncated=hits.truncated)
 
-        for hit in index.search(query, **kwargs):
-            job = db.session.query(Job).get(hit['id'])
+    def suggest(self, prefix, limit=None):
+        """Returns completions for `prefix` as a list of dicts with the `kind`
+        and `text` of each suggestion. Served from memory, see `Suggester`.
+
+        :param prefix: The text typed so far.
+        :param limit: Maximum number of suggestions.
+
+        """
+        if limit is None:
+            limit = settings.SUGGEST_LIMIT
+        return [dict(kind=kind, text=text)
+                for kind, text in suggester.suggest(prefix, limit)]
+
+    def resolve(self, hits):
+        """Turns search hits into renderable jobs. With `SEARCH_STORED_LISTINGS`
+        on, these are `Listing` objects built straight from the hits, otherwise
+        `Job` instances loaded with `hydrate()`.
+
+        Listings are never checked against the database, instead unpublished
+        jobs are dropped based on the stored `published` flag.
+
+        :param hits: A sequence of stored fields, as returned by `Index`.
+
+        """
+        stored = all('listing' in hit for hit in hits)
+        if settings.SEARCH_STORED_LISTINGS and stored:
+            return [
+                Listing(int(hit['id']), hit['listing'])
+                for hit in hits if hit['listing']['published']
+            ]
+        return self.hydrate([int(hit['id']) for hit in hits])
+
+    def hydrate(self, ids):
+        """Loads the published jobs for `ids`, along with everything needed to
+        render them, preserving the order of `ids`.
+
+        :param ids: A list of job ids, as ranked by the index.
+
+        """
+        jobs = {}
+        for i in range(0, len(ids), HYDRATE_CHUNK_SIZE):
+            chunk = ids[i:i + HYDRATE_CHUNK_SIZE]
             # Make sure that we don't accidentally return an unpublished job
             # that happened to be in the search index.
-            if job and job.published:
-                hits.append(job)
+            query = db.session.query(Job)\
+                    .filter(Job.id.in_(chunk), Job.published == True)
+            query = eager_listing(query)
+            for job in query:
+                jobs[job.id] = job
+        return [jobs[id] for id in ids if id in jobs]
+
+
+class SearchClient(SearchService):
+    """`SearchService` running its searches on the search daemon listening on
+    the `SEARCH_DAEMON_SOCKET`, see `jobber.core.daemon`. Only the hits come
+    from the daemon, they are still resolved to jobs here.
+
+    Searches fall back to an in-process `SearchService` while the daemon is
+    unreachable, i.e. while it restarts.
+
+    """
+    def index(self):
+        return RemoteIndex()
+
+    def search_jobs(self, *args, **kwargs):
+        try:
+            return super(SearchClient, self).search_jobs(*args, **kwargs)
+        except DaemonUnavailable as e:
+            logger.warning(u'{} Searching in-process instead.'.format(e))
+            return SearchService().search_jobs(*args, **kwargs)
 
-        return hits
+    def search_jobs_page(self, *args, **kwargs):
+        try:
+            return super(SearchClient, self).search_jobs_page(*args, **kwargs)
+        except DaemonUnavailable as e:
+            logger.warning(u'{} Searching in-process instead.'.format(e))
+            return SearchService().search_jobs_page(*args, **kwargs)
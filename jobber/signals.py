@@ -8,10 +8,17 @@ Signal registrations.
 import logging
 
 from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import get_history
 from blinker import signal
 
-from jobber.core.models import Job
-from jobber.core.search import Index
+from jobber.conf import settings
+from jobber.core.models import (Job, Tag, Company, Location, IndexUpdate,
+                                JobChange, SimilarUpdate)
+from jobber.core.fts import FTSIndex
+from jobber.core.memory import inverted_index
+from jobber.core.suggest import suggester
+from jobber.core.utils import now
 from jobber.database import db
 
 
@@ -27,36 +34,227 @@ sqlalchemy_flush = signal('sqlalchemy-flush')
 DEFAULT_MODEL_ACTIONMAP = {
     Job: {
         'insert': [
-            'update_index',
+            'enqueue_index_update',
+            'update_fts_document',
+            'record_job_change',
+            'update_memory_document',
+            'update_similar_jobs',
+            'update_title_suggestion'
         ],
         'update': [
-            'update_index',
+            'enqueue_index_update',
+            'update_fts_document',
+            'record_job_change',
+            'update_memory_document',
+            'update_similar_jobs',
+            'update_title_suggestion'
         ],
         'delete': [
-            'deindex'
+            'enqueue_index_update',
+            'remove_fts_document',
+            'record_job_change',
+            'remove_memory_document',
+            'remove_similar_jobs',
+            'remove_title_suggestion'
         ]
+    },
+    Tag: {
+        'insert': ['update_tag_suggestion'],
+        'update': ['update_tag_suggestion'],
+        'delete': ['remove_tag_suggestion']
+    },
+    Company: {
+        'insert': ['update_company_suggestion'],
+        'update': ['update_company_suggestion'],
+        'delete': ['remove_company_suggestion']
+    },
+    Location: {
+        'insert': ['update_city_suggestion'],
+        'update': ['update_city_suggestion'],
+        'delete': ['remove_city_suggestion']
     }
 }
 
 
-def index(job):
-    index = Index()
-    document = job.to_document()
-    rv = index.add_document(document)
-    logger.info(u"Job ({}) added to index.".format(job.id))
-    return rv
+# Key under which changes to in-process indexes are kept in `Session.info`
+# until the transaction commits.
+PENDING_KEY = 'jobber.pending'
 
 
-def deindex(job):
-    index = Index()
-    document = job.to_document()
-    rv = index.delete_document(document['id'])
-    logger.info(u"Job ({}) deleted from index.".format(job.id))
-    return rv
+def after_commit(instance, action, *args):
+    """Calls `action` with `args` once the transaction `instance` is flushed
+    in commits, and never if it's rolled back. Used for the indexes kept in
+    memory, which unlike the database can't roll back a change.
 
+    :param instance: A model instance attached to a session.
+    :param action: A callable.
 
-def update_index(job):
-    return index(job) if job.published else deindex(job)
+    """
+    session = object_session(instance)
+    session.info.setdefault(PENDING_KEY, []).append((action, args))
+
+
+def enqueue_index_update(job):
+    """Records that `job` needs to be re-indexed in the `index_updates` outbox.
+
+    The row is written in the same transaction as the change to `job`, so it is
+    committed or rolled back together with it. The index itself is updated by
+    the indexing worker, which decides whether to index or deindex `job`.
+    Skipped with the `fts` backend, see `update_fts_document()`.
+
+    """
+    if settings.SEARCH_BACKEND == 'fts':
+        return
+    session = object_session(job)
+    insert = IndexUpdate.__table__.insert()
+    session.execute(insert, {'job_id': job.id, 'created': now()})
+    logger.info(u"Job ({}) queued for indexing.".format(job.id))
+
+
+def update_fts_document(job):
+    """Indexes or deindexes `job` in the `jobs_fts` table, in the same
+    transaction as the change to `job`. Only used with the `fts` backend.
+
+    """
+    if settings.SEARCH_BACKEND != 'fts':
+        return
+    index = FTSIndex(object_session(job))
+    if job.published:
+        index.update_document(job.to_document(), commit=False)
+    else:
+        index.delete_document(unicode(job.id), commit=False)
+
+
+def remove_fts_document(job):
+    if settings.SEARCH_BACKEND == 'fts':
+        FTSIndex(object_session(job)).delete_document(unicode(job.id),
+                                                      commit=False)
+
+
+def record_job_change(job):
+    """Records that `job` changed in the `job_changes` log, in the same
+    transaction as the change, so that the in-memory indexes of all other
+    processes pick it up, see `sync_memory_index()`. Only used with the
+    `memory` backend.
+
+    """
+    if settings.SEARCH_BACKEND != 'memory':
+        return
+    insert = JobChange.__table__.insert()
+    object_session(job).execute(insert, {'job_id': job.id, 'created': now()})
+
+
+def update_memory_document(job):
+    """Indexes `job` in the in-memory index of this process as long as it is
+    published, or deindexes it otherwise, once the transaction commits. Only
+    once the index has been loaded.
+
+    """
+    if not inverted_index.loaded:
+        return
+    if job.published:
+        # The document is built while relationships can still be loaded.
+        after_commit(job, inverted_index.update, job.to_document())
+    else:
+        after_commit(job, inverted_index.remove, unicode(job.id))
+
+
+def remove_memory_document(job):
+    if inverted_index.loaded:
+        after_commit(job, inverted_index.remove, unicode(job.id))
+
+
+def enqueue_similar_update(job):
+    """Records that the similar jobs around `job` need to be refreshed in the
+    `similar_updates` outbox, see `drain_similar_updates()`.
+
+    """
+    session = object_session(job)
+    insert = SimilarUpdate.__table__.insert()
+    session.execute(insert, {'job_id': job.id, 'created': now()})
+
+
+def was_published(job):
+    # Drafts never show up as similar jobs.
+    return job.published or get_history(job, 'published').deleted
+
+
+def update_similar_jobs(job):
+    """Queues a refresh of the similar jobs around `job` whenever it is
+    published, unpublished or a published job is edited.
+
+    """
+    if not was_published(job):
+        return
+    attrs = ('title', 'description', 'published', 'tags')
+    if any(get_history(job, attr).has_changes() for attr in attrs):
+        enqueue_similar_update(job)
+
+
+def remove_similar_jobs(job):
+    if was_published(job):
+        enqueue_similar_update(job)
+
+
+def update_title_suggestion(job):
+    """Suggests the title of `job` as long as it is published, once the
+    transaction commits.
+
+    """
+    if suggester.loaded:
+        title = job.title if job.published else None
+        after_commit(job, suggester.index_title, job.id, title)
+
+
+def remove_title_suggestion(job):
+    if suggester.loaded:
+        after_commit(job, suggester.index_title, job.id, None)
+
+
+def update_suggestion(kind, instance, attr):
+    """Replaces the suggestions for the previous values of `attr` on
+    `instance` with its current value, once the transaction commits.
+
+    """
+    if not suggester.loaded:
+        return
+    history = get_history(instance, attr)
+    for value in history.deleted:
+        if value:
+            after_commit(instance, suggester.index.discard, kind, value)
+    for value in history.added:
+        if value:
+            after_commit(instance, suggester.index.add, kind, value)
+
+
+def remove_suggestion(kind, instance, attr):
+    if suggester.loaded:
+        after_commit(instance, suggester.index.discard, kind,
+                     getattr(instance, attr))
+
+
+def update_tag_suggestion(tag):
+    update_suggestion('tag', tag, 'tag')
+
+
+def remove_tag_suggestion(tag):
+    remove_suggestion('tag', tag, 'tag')
+
+
+def update_company_suggestion(company):
+    update_suggestion('company', company, 'name')
+
+
+def remove_company_suggestion(company):
+    remove_suggestion('company', company, 'name')
+
+
+def update_city_suggestion(location):
+    update_suggestion('city', location, 'city')
+
+
+def remove_city_suggestion(location):
+    remove_suggestion('city', location, 'city')
 
 
 def eligible_actions(klass, operation, actionmap=None):
@@ -112,6 +310,19 @@ def on_flush_adapter(session, context):
     sqlalchemy_flush.send(session, operations=operations)
 
 
+def on_commit_adapter(session):
+    for action, args in session.info.pop(PENDING_KEY, []):
+        try:
+            action(*args)
+        except Exception:
+            logger.exception(u"Failed to apply {}() after commit!"
+                             .format(action.__name__))
+
+
+def on_rollback_adapter(session):
+    session.info.pop(PENDING_KEY, None)
+
+
 def register_signals():
     """Helper for registering all signals during runtime. Since `Flask` uses
     `blinker` for signal support we adapt ORM events and emit `blinker` events.
@@ -122,9 +333,13 @@ def register_signals():
 
     # Connect `SQLAlchemy` ORM events to adapter methods.
     event.listen(db.session, 'after_flush', on_flush_adapter)
+    event.listen(db.session, 'after_commit', on_commit_adapter)
+    event.listen(db.session, 'after_rollback', on_rollback_adapter)
 
 
 def deregister_signals():
     """Helper for deregistering all signals at runtime. Helpful during tests."""
     event.remove(db.session, 'after_flush', on_flush_adapter)
+    event.remove(db.session, 'after_commit', on_commit_adapter)
+    event.remove(db.session, 'after_rollback', on_rollback_adapter)
     sqlalchemy_flush.disconnect(on_flush)
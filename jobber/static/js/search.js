@@ -1,12 +1,73 @@
 (function($, global) {
 
-    var $search = $('#search');
+    var $search = $('#search'),
+        $suggestions = $('#suggestions'),
+        timer = null,
+        last = null;
 
     $search.placeholder();
 
+    function go(query) {
+        window.location = '/search/' + query;
+    }
+
+    function clear() {
+        $suggestions.empty().hide();
+    }
+
+    function render(suggestions) {
+        $suggestions.empty();
+        $.each(suggestions, function(i, suggestion) {
+            $('<li>')
+                .text(suggestion.text)
+                .append($('<span>').text(suggestion.kind))
+                .data('text', suggestion.text)
+                .appendTo($suggestions);
+        });
+        $suggestions.toggle(suggestions.length > 0);
+    }
+
+    function fetch() {
+        var query = $.trim($search.val());
+        if (query === last) return;
+        last = query;
+        if (!query) return clear();
+        $.getJSON('/suggest', {q: query}, function(data) {
+            // Drop responses for anything but the latest query.
+            if (data.query === last) render(data.suggestions);
+        });
+    }
+
+    function move(offset) {
+        var $items = $suggestions.children(),
+            index = $items.index($items.filter('.active')) + offset;
+        $items.removeClass('active');
+        if (index < 0 || index >= $items.length) return;
+        $items.eq(index).addClass('active');
+    }
+
     $search.keydown(function(e) {
+        if (e.which == 38) return move(-1);
+        if (e.which == 40) return move(1);
+        if (e.which == 27) return clear();
         if (e.which != 13) return;
-        window.location = '/search/' + $search.val();
+        var $active = $suggestions.children('.active');
+        go($active.length ? $active.data('text') : $search.val());
+    });
+
+    $search.keyup(function(e) {
+        if (e.which == 38 || e.which == 40 || e.which == 13) return;
+        clearTimeout(timer);
+        timer = setTimeout(fetch, 100);
+    });
+
+    $search.blur(function() {
+        // Give clicks on a suggestion a chance to land first.
+        setTimeout(clear, 200);
+    });
+
+    $suggestions.on('click', 'li', function() {
+        go($(this).data('text'));
     });
 
-}(jQuery, window));
\ No newline at end of file
+}(jQuery, window));
@@ -5,7 +5,12 @@ jobber.view_helpers
 Utility functions for views.
 
 """
+from string import capwords
+
+from flask import request, url_for
+
 from jobber.core.models import Job, Company, Location, Tag
+from jobber.core.search import FILTER_FIELDS
 from jobber.core.forms import JobForm
 from jobber.core.utils import insert_email_token
 from jobber.functions import send_admin_review_email
@@ -16,6 +21,77 @@ from jobber.database import db
 REVIEWER_ROBOT = settings.MAIL_REVIEWER_ROBOT
 
 
+# Display titles for the search facets, in display order.
+FACET_TITLES = (
+    ('type', u'Type'),
+    ('country', u'Country'),
+    ('city', u'City'),
+    ('tag', u'Tags')
+)
+
+
+def url_for_args(**updates):
+    """Returns the url of the current request with its query string arguments
+    updated from `updates`. Arguments updated to `None` are removed.
+
+    """
+    args = request.args.to_dict()
+    args.update(updates)
+    values = dict((k, v) for k, v in args.iteritems() if v is not None)
+    values.update(request.view_args)
+    return url_for(request.endpoint, **values)
+
+
+def get_page_args():
+    """Returns the requested `(page, per_page)` from the query string, falling
+    back to the first page and the default page length. Pages are capped at
+    `SEARCH_MAX_PAGE`, as reaching a page means collecting or skipping all
+    the results before it.
+
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', settings.SEARCH_PAGE_LENGTH, type=int)
+    page = min(max(page, 1), settings.SEARCH_MAX_PAGE)
+    per_page = min(max(per_page, 1), settings.SEARCH_MAX_PAGE_LENGTH)
+    return page, per_page
+
+
+def get_drilldown_args():
+    """Returns the filter values, such as facets being drilled down into,
+    requested in the query string.
+
+    """
+    return dict(
+        (name, request.args[name]) for name in FILTER_FIELDS if request.args.get(name)
+    )
+
+
+def get_facet_context(facets, drilldown):
+    """Returns facet data for the search results page. Every facet value links
+    to the results drilled down into it, or back out of it if already active.
+
+    :param facets: Facet counts as returned by `Index.search_page()`.
+    :param drilldown: The active facet values as a `dict`.
+
+    """
+    context = []
+    for name, title in FACET_TITLES:
+        options = []
+        for value, count in facets.get(name, []):
+            active = drilldown.get(name) == value
+            label = value
+            if name == 'country' and value in Location.COUNTRIES:
+                label = Location.COUNTRIES.map(value)
+            elif name == 'city':
+                # Cities are indexed in lowercase.
+                label = capwords(value)
+            url = url_for_args(page=None, **{name: None if active else value})
+            options.append(dict(label=label, count=count, active=active, url=url))
+        if options:
+            context.append(dict(name=name, title=title, options=options))
+    return context
+
+
 def get_location_context():
     """Returns location data for the create/edit form."""
     return [
@@ -9,17 +9,22 @@ import logging
 from random import choice
 
 from flask import Blueprint
-from flask import render_template, abort, redirect,  Response
+from flask import render_template, abort, redirect,  Response, jsonify
 from flask import url_for, session, request
 
 from jobber import rss
 from jobber.core.models import Job, EmailReviewToken
 from jobber.core.forms import JobForm
-from jobber.services import SearchService
+from jobber.core.metrics import metrics
+from jobber.services import JobsService, search_service
 from jobber.database import db
 from jobber.conf import settings
 from jobber.functions import send_instructory_email, send_confirmation_email
-from jobber.view_helpers import (get_location_context,
+from jobber.view_helpers import (url_for_args,
+                                 get_page_args,
+                                 get_drilldown_args,
+                                 get_facet_context,
+                                 get_location_context,
                                  get_tag_context,
                                  populate_job,
                                  populate_form,
@@ -59,20 +64,54 @@ def inject_swag():
     return dict(prompt=prompt, position=position)
 
 
+blueprint.add_app_template_global(url_for_args)
+
+
 @blueprint.route('/search/')
 @blueprint.route('/')
 def index():
-    query = db.session.query(Job)\
-              .filter_by(published=True)\
-              .order_by(Job.created.desc())
-    return render_template('index.html', jobs=query.all())
+    page, per_page = get_page_args()
+    service = JobsService()
+    jobs = service.list_published(page=page, per_page=per_page)
+    return render_template('index.html', jobs=jobs)
 
 
 @blueprint.route('/search/<query>')
 def search(query):
-    service = SearchService()
-    hits = service.search_jobs(query, sort=('created', 'desc'))
-    return render_template('index.html', jobs=hits, query=query)
+    page, per_page = get_page_args()
+    drilldown = get_drilldown_args()
+    service = search_service()
+    hits = service.search_jobs_page(query,
+                                    page=page,
+                                    per_page=per_page,
+                                    sort=('created', 'desc'),
+                                    facets=True,
+                                    filters=drilldown,
+                                    snippets=True,
+                                    correct=True)
+    facets = get_facet_context(hits.facets, drilldown)
+    correction_url = None
+    if hits.correction:
+        correction_url = url_for('views.search', query=hits.correction,
+                                 **drilldown)
+    return render_template('index.html', jobs=hits, query=query, facets=facets,
+                           correction_url=correction_url)
+
+
+@blueprint.route('/suggest')
+def suggest():
+    prefix = request.args.get('q', u'')
+    limit = request.args.get('limit', settings.SUGGEST_LIMIT, type=int)
+    limit = min(max(limit, 1), settings.SUGGEST_MAX_LIMIT)
+    suggestions = search_service().suggest(prefix, limit=limit)
+    return jsonify(query=prefix, suggestions=suggestions)
+
+
+@blueprint.route('/metrics')
+def metrics_snapshot():
+    if not settings.METRICS_ENABLED:
+        abort(404)
+    return jsonify(metrics.snapshot())
 
 
 @blueprint.route('/create', methods=['GET', 'POST'])
@@ -168,7 +207,9 @@ def show(job_id, company_slug, job_slug):
     if not (job and job.published):
         abort(404)
     if job.slug == job_slug and job.company.slug == company_slug:
-        return render_template('jobs/show.html', job=job)
+        similar_jobs = JobsService().similar_jobs(job.id)
+        return render_template('jobs/show.html', job=job,
+                               similar_jobs=similar_jobs)
     abort(404)
 
 
@@ -0,0 +1,36 @@
+"""create jobs fts table
+
+Revision ID: 1d9b3e6f7a20
+Revises: 52c7e0a4b1f3
+Create Date: 2026-10-18 16:40:08.114375
+
+"""
+from alembic import op
+
+
+revision = '1d9b3e6f7a20'
+down_revision = '52c7e0a4b1f3'
+
+
+def upgrade():
+    """Creates the `jobs_fts` FTS5 table used by the `fts` search backend.
+    Only SQLite has FTS5, so this is a no-op for other databases.
+
+    """
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""
+        CREATE VIRTUAL TABLE jobs_fts USING fts5(
+            title, description, company, location, job_type, tags,
+            type UNINDEXED, country UNINDEXED, city UNINDEXED,
+            remote UNINDEXED, created UNINDEXED,
+            tokenize = 'porter unicode61 remove_diacritics 1'
+        )
+    """)
+
+
+def downgrade():
+    """Drops the `jobs_fts` table."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE jobs_fts')
@@ -0,0 +1,28 @@
+"""create index updates table
+
+Revision ID: 3f2a91c07d5e
+Revises: 15736ce41fb
+Create Date: 2026-10-18 10:12:31.402214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '3f2a91c07d5e'
+down_revision = '15736ce41fb'
+
+
+def upgrade():
+    """Creates the `index_updates` outbox table."""
+    op.create_table(
+        'index_updates',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job_id', sa.Integer, nullable=False, index=True),
+        sa.Column('created', sa.DateTime(timezone=True)),
+    )
+
+
+def downgrade():
+    """Drops the `index_updates` table."""
+    op.drop_table('index_updates')
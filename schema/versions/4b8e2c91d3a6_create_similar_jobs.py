@@ -0,0 +1,31 @@
+"""create similar jobs table
+
+Revision ID: 4b8e2c91d3a6
+Revises: 1d9b3e6f7a20
+Create Date: 2026-10-18 18:02:44.906120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '4b8e2c91d3a6'
+down_revision = '1d9b3e6f7a20'
+
+
+def upgrade():
+    """Creates the `similar_jobs` table."""
+    op.create_table(
+        'similar_jobs',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job_id', sa.Integer, nullable=False, index=True),
+        sa.Column('similar_job_id', sa.Integer, nullable=False, index=True),
+        sa.Column('score', sa.Float, nullable=False),
+        sa.Column('rank', sa.Integer, nullable=False),
+        sa.Column('created', sa.DateTime(timezone=True)),
+    )
+
+
+def downgrade():
+    """Drops the `similar_jobs` table."""
+    op.drop_table('similar_jobs')
@@ -0,0 +1,84 @@
+"""add jobs description text
+
+Revision ID: 52c7e0a4b1f3
+Revises: 3f2a91c07d5e
+Create Date: 2026-10-18 14:05:12.518732
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from jobber.core.utils import strip_html
+
+
+revision = '52c7e0a4b1f3'
+down_revision = '3f2a91c07d5e'
+
+
+jobs = sa.sql.table(
+    'jobs',
+    sa.sql.column('id', sa.Integer),
+    sa.sql.column('description', sa.UnicodeText),
+    sa.sql.column('description_text', sa.UnicodeText)
+)
+
+
+def upgrade():
+    """Adds the `description_text` column and fills it in for existing jobs."""
+    op.add_column('jobs', sa.Column('description_text', sa.UnicodeText,
+                                    nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.select([jobs.c.id, jobs.c.description]))
+    for id, description in rows.fetchall():
+        connection.execute(
+            jobs.update()
+                .where(jobs.c.id == id)
+                .values(description_text=strip_html(description))
+        )
+
+
+# Columns of the `jobs` table before `description_text` was added.
+COLUMNS = ('id', 'created', 'title', 'slug', 'published', 'description',
+           'contact_method', 'contact_email', 'contact_url', 'job_type',
+           'remote_work', 'admin_token', 'recruiter_name', 'recruiter_email',
+           'company_id', 'location_id')
+
+
+def downgrade():
+    """Drops the `description_text` column.
+
+    SQLite can't drop columns, so the table is copied without it instead.
+
+    """
+    op.create_table(
+        'jobs_tmp',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('created', sa.DateTime(timezone=True)),
+        sa.Column('title', sa.Unicode(100), nullable=False),
+        sa.Column('slug', sa.Unicode(125), nullable=False, unique=False),
+        sa.Column('published', sa.Boolean, nullable=False, default=False),
+        sa.Column('description', sa.UnicodeText, nullable=True),
+        sa.Column('contact_method', sa.Integer, nullable=False),
+        sa.Column('contact_email', sa.Unicode(150), nullable=True),
+        sa.Column('contact_url', sa.Unicode(200), nullable=True),
+        sa.Column('job_type', sa.Integer, nullable=False),
+        sa.Column('remote_work', sa.Integer, nullable=False, default=False),
+        sa.Column('admin_token', sa.String(40), nullable=False),
+        sa.Column('recruiter_name', sa.Unicode(100), nullable=False),
+        sa.Column('recruiter_email', sa.Unicode(150), nullable=False),
+        sa.Column('company_id',
+                  sa.Integer,
+                  sa.ForeignKey('companies.id'),
+                  nullable=False),
+        sa.Column('location_id',
+                  sa.Integer,
+                  sa.ForeignKey('locations.id'),
+                  nullable=False),
+    )
+    columns = ', '.join(COLUMNS)
+    op.execute('INSERT INTO jobs_tmp ({0}) SELECT {0} FROM jobs'.format(columns))
+    op.drop_table('jobs')
+    op.rename_table('jobs_tmp', 'jobs')
+    op.create_index('ix_jobs_slug', 'jobs', ['slug'])
+    op.create_index('ix_jobs_admin_token', 'jobs', ['admin_token'], unique=True)
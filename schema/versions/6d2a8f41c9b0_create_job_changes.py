@@ -0,0 +1,28 @@
+"""create job changes table
+
+Revision ID: 6d2a8f41c9b0
+Revises: 4b8e2c91d3a6
+Create Date: 2026-10-18 21:40:12.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '6d2a8f41c9b0'
+down_revision = '4b8e2c91d3a6'
+
+
+def upgrade():
+    """Creates the `job_changes` log table."""
+    op.create_table(
+        'job_changes',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job_id', sa.Integer, nullable=False),
+        sa.Column('created', sa.DateTime(timezone=True), index=True),
+    )
+
+
+def downgrade():
+    """Drops the `job_changes` table."""
+    op.drop_table('job_changes')
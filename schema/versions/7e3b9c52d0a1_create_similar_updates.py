@@ -0,0 +1,28 @@
+"""create similar updates table
+
+Revision ID: 7e3b9c52d0a1
+Revises: 6d2a8f41c9b0
+Create Date: 2026-10-18 22:05:37.160844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '7e3b9c52d0a1'
+down_revision = '6d2a8f41c9b0'
+
+
+def upgrade():
+    """Creates the `similar_updates` outbox table."""
+    op.create_table(
+        'similar_updates',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job_id', sa.Integer, nullable=False, index=True),
+        sa.Column('created', sa.DateTime(timezone=True)),
+    )
+
+
+def downgrade():
+    """Drops the `similar_updates` table."""
+    op.drop_table('similar_updates')
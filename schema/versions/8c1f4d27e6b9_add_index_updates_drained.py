@@ -0,0 +1,40 @@
+"""add index updates drained
+
+Revision ID: 8c1f4d27e6b9
+Revises: 7e3b9c52d0a1
+Create Date: 2026-10-19 09:12:44.730215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '8c1f4d27e6b9'
+down_revision = '7e3b9c52d0a1'
+
+
+def upgrade():
+    """Adds the `drained` column to the `index_updates` outbox."""
+    op.add_column('index_updates', sa.Column('drained',
+                                             sa.DateTime(timezone=True),
+                                             nullable=True))
+
+
+def downgrade():
+    """Drops the `drained` column, along with the drained updates.
+
+    SQLite can't drop columns, so the table is copied without it instead.
+
+    """
+    op.create_table(
+        'index_updates_tmp',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('job_id', sa.Integer, nullable=False),
+        sa.Column('created', sa.DateTime(timezone=True)),
+    )
+    op.execute('INSERT INTO index_updates_tmp (id, job_id, created) '
+               'SELECT id, job_id, created FROM index_updates '
+               'WHERE drained IS NULL')
+    op.drop_table('index_updates')
+    op.rename_table('index_updates_tmp', 'index_updates')
+    op.create_index('ix_index_updates_job_id', 'index_updates', ['job_id'])
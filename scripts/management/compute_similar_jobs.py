@@ -0,0 +1,52 @@
+"""
+Computes the similar jobs of all published jobs from scratch. Afterwards, jobs
+that are published, edited, unpublished or deleted are queued in the
+`similar_updates` outbox, and the lists around them are refreshed with
+--pending, which is run from cron.
+
+Usage:
+    compute_similar_jobs.py [--count=<n>] [--pending]
+
+Options:
+    --count=<n>     How many similar jobs to keep per job, defaults to the
+                    `SIMILAR_JOBS_COUNT` setting.
+    --pending       Only refresh the similar jobs around queued jobs.
+
+"""
+import time
+
+from docopt import docopt
+
+from env import path_setup
+path_setup()
+
+from jobber.script import run, green, die
+from jobber.core.similar import compute_similar_jobs, drain_similar_updates
+
+
+def refresh_pending(count, session):
+    start = time.time()
+    total = drain_similar_updates(session, k=count)
+    duration = time.time() - start
+    print green("Refreshed similar jobs for {0} queued updates in {1:.2f} s."
+                .format(total, duration))
+
+
+def main(count, pending, session):
+    if pending:
+        return refresh_pending(count, session)
+
+    start = time.time()
+    jobs = compute_similar_jobs(session, k=count)
+    duration = time.time() - start
+    print green("Computed similar jobs for {0} jobs in {1:.2f} s."
+                .format(jobs, duration))
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    count = arguments['--count']
+    count = int(count) if count else None
+    if count is not None and count < 1:
+        die('--count must be positive!')
+    run(main, count, arguments['--pending'])
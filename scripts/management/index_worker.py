@@ -0,0 +1,177 @@
+"""
+Drains the `index_updates` outbox into the `jobs` index. Runs forever, unless
+asked to do a single pass.
+
+Whenever the `Schema` no longer matches the one the index was built with, the
+index is rebuilt in a thread of its own while the outbox keeps being drained,
+see `rebuild_index()`, which also catches up on the updates drained into the
+previous version in the meantime. Failed rebuilds are retried after a delay that doubles
+with every failure, see the `INDEX_REBUILD_*` settings.
+
+With the `memory` search backend, old entries of the `job_changes` log are
+pruned on every pass, see `prune_job_changes()`.
+
+With the `fts` search backend, jobs are indexed in the same transaction as
+their changes and nothing is written to the outbox, so the worker exits right
+away.
+
+Usage:
+    index_worker.py [--once] [--batch-size=<n>] [--interval=<s>] [--maintain]
+
+Options:
+    --once              Drain the outbox once and exit.
+    --batch-size=<n>    Outbox rows to apply per index commit.
+    --interval=<s>      Seconds to sleep when the outbox is empty.
+    --maintain          Merge index segments in between passes, as scheduled by
+                        the `INDEX_MAINTENANCE_*` settings.
+
+"""
+import time
+import logging
+from threading import Thread
+
+from docopt import docopt
+
+from env import path_setup
+path_setup()
+
+from jobber.script import run, die
+from jobber.core.search import IndexManager, LockError
+from jobber.functions import (drain_index_updates, rebuild_index,
+                              prune_job_changes, MaintenanceSchedule)
+from jobber.conf import settings
+from jobber.database import db
+
+
+logger = logging.getLogger('jobber')
+
+
+def drain(session, batch_size):
+    total = 0
+    while True:
+        count = drain_index_updates(session, limit=batch_size)
+        total += count
+        if count < batch_size:
+            return total
+
+
+class Rebuild(object):
+    """Rebuilds the index in a separate thread, with a session of its own,
+    whenever it is outdated.
+
+    """
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+        self.thread = None
+        self.failures = 0
+        self.retry_at = 0
+        self.succeeded = False
+
+    def start(self):
+        if self.thread is not None or time.time() < self.retry_at:
+            return
+        if not IndexManager.outdated(self.name, self.directory):
+            return
+        logger.info('Index schema changed, rebuilding.')
+        self.succeeded = False
+        self.thread = Thread(target=self.run, name='rebuild')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        session = db.session()
+        try:
+            rebuild_index(session, published=True)
+            self.succeeded = True
+        except LockError:
+            logger.info('Index is already being rebuilt.')
+        except Exception:
+            logger.exception('Failed to rebuild the index!')
+        finally:
+            db.session.remove()
+
+    def finish(self, wait=False):
+        """Handles the outcome of a rebuild once it is no longer running.
+
+        :param wait: Wait for a running rebuild to complete.
+
+        """
+        if self.thread is None:
+            return
+        if wait:
+            self.thread.join()
+        if self.thread.is_alive():
+            return
+        if self.succeeded:
+            self.failures = 0
+        else:
+            self.failures += 1
+            delay = settings.INDEX_REBUILD_RETRY_DELAY * 2 ** (self.failures - 1)
+            delay = min(delay, settings.INDEX_REBUILD_MAX_RETRY_DELAY)
+            self.retry_at = time.time() + delay
+            logger.info('Retrying index rebuild in {} seconds.'.format(delay))
+        self.thread = None
+
+
+def main(once, batch_size, interval, maintain, session):
+    name = settings.SEARCH_INDEX_NAME
+    directory = settings.SEARCH_INDEX_DIRECTORY
+
+    if settings.SEARCH_BACKEND == 'fts':
+        logger.info('Index worker is not used with the fts backend, exiting.')
+        return
+
+    if not IndexManager.exists(name, directory):
+        die('Search index does not exist!')
+
+    logger.info('Index worker started.')
+
+    # Maintenance runs in between passes, so it never competes with this
+    # worker for the index lock.
+    schedule = MaintenanceSchedule() if maintain else None
+
+    rebuild = Rebuild(name, directory)
+
+    while True:
+        try:
+            rebuild.finish()
+            rebuild.start()
+        except Exception:
+            logger.exception('Failed to rebuild the index!')
+            session.rollback()
+        try:
+            drain(session, batch_size)
+        except Exception:
+            # The outbox rows are left in place, so they will be picked up
+            # again on the next pass.
+            logger.exception('Failed to apply index updates!')
+            session.rollback()
+            if once:
+                raise
+        if once:
+            rebuild.finish(wait=True)
+        if settings.SEARCH_BACKEND == 'memory':
+            try:
+                prune_job_changes(session)
+            except Exception:
+                logger.exception('Failed to prune job changes!')
+                session.rollback()
+        if schedule is not None:
+            try:
+                schedule.run()
+            except Exception:
+                logger.exception('Failed to merge index segments!')
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    once = arguments['--once']
+    batch_size = int(arguments['--batch-size'] or settings.INDEX_WORKER_BATCH_SIZE)
+    interval = float(arguments['--interval'] or settings.INDEX_WORKER_POLL_INTERVAL)
+    maintain = arguments['--maintain']
+    run(main, once, batch_size, interval, maintain)
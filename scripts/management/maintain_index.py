@@ -0,0 +1,57 @@
+"""
+Reports on the segments of the `jobs` index and merges them according to the
+`INDEX_MERGE_*` settings.
+
+Usage:
+    maintain_index.py [--stats | --optimize] [--force]
+
+Options:
+    --stats      Only report segment stats.
+    --optimize   Merge all segments into one, regardless of the merge policy.
+    --force      Merge regardless of the number of segments.
+
+"""
+from docopt import docopt
+
+from env import path_setup
+path_setup()
+
+from jobber.script import run, die, green, blue
+from jobber.core.search import IndexManager, Index
+from jobber.functions import maintain_index
+from jobber.conf import settings
+
+
+def format_stats(stats):
+    return "{0} segments, {1} documents ({2} deleted), {3:.1f} KB".format(
+        stats['segments'], stats['docs'], stats['deleted'],
+        stats['size'] / 1024.0
+    )
+
+
+def main(stats_only, optimize, force, session):
+    name = settings.SEARCH_INDEX_NAME
+    directory = settings.SEARCH_INDEX_DIRECTORY
+
+    if not IndexManager.exists(name, directory):
+        die('Search index does not exist!')
+
+    if stats_only:
+        print blue(format_stats(Index().segment_stats()))
+        return
+
+    before, after = maintain_index(optimize=optimize or None, force=force)
+    print blue("Before: {}".format(format_stats(before)))
+
+    if after is None:
+        print blue('Nothing merged.')
+    else:
+        print green("After: {}".format(format_stats(after)))
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    stats_only = arguments['--stats']
+    optimize = arguments['--optimize']
+    force = arguments['--force']
+    run(main, stats_only, optimize, force)
@@ -3,32 +3,112 @@ Populates the `jobs` index. So far we've got only one index so this script
 knows how to do one thing well.
 
 Usage:
-    populate_index.py [--create] [--all]
+    populate_index.py [--create] [--all] [--procs=<n>] [--multisegment]
+                      [--batch-size=<n>]
+    populate_index.py --incremental [--all] [--since=<date>] [--batch-size=<n>]
+
+With the `fts` search backend, the `jobs_fts` table is populated instead and
+--procs and --multisegment are ignored.
+
+With --create, the index is rebuilt into a new version while the current one
+keeps serving searches, and switched over to once complete. Older versions are
+deleted, except for the last `SEARCH_INDEX_KEEP_VERSIONS` of them.
 
 Options:
-    --create     Whether the index should be re-created.
-    --all        Index all jobs. By default, only published jobs will be indexed.
+    --create            Whether the index should be re-created.
+    --all               Index all jobs. By default, only published jobs will be
+                        indexed.
+    --procs=<n>         Number of indexing processes [default: 1].
+    --multisegment      Keep one segment per indexing process instead of
+                        merging them afterwards, used with --procs.
+    --batch-size=<n>    Jobs loaded from the database and documents handed to
+                        an indexing process at a time [default: 100].
+    --incremental       Only add, update or delete the documents that differ
+                        from the jobs in the database.
+    --since=<date>      Only compare jobs created since this ISO-8601 date,
+                        used with --incremental.
 
 """
 import time
+
+import arrow
 from docopt import docopt
 
 from env import path_setup
 path_setup()
 
 from jobber.script import run, green, die, blue
-from jobber.core.models import Job
-from jobber.core.search import IndexManager, Schema, Index
+from jobber.core.search import IndexManager, Index, LockError
+from jobber.core.fts import FTSIndex
+from jobber.functions import iter_job_documents, sync_index, rebuild_index
 from jobber.conf import settings
 
 
-def main(should_create, index_all, session):
+def sync(index_all, since, batch_size, session):
     name = settings.SEARCH_INDEX_NAME
     directory = settings.SEARCH_INDEX_DIRECTORY
 
+    if not IndexManager.exists(name, directory):
+        die('Search index does not exist!')
+
+    start = time.time()
+
+    kwargs = {} if index_all else {'published': True}
+    added, updated, deleted = sync_index(session, since=since,
+                                         chunk_size=batch_size, **kwargs)
+    duration = time.time() - start
+
+    print green("{0} documents added, {1} updated and {2} deleted okay in "
+                "{3:.2f} s.".format(added, updated, deleted, duration))
+
+
+def populate_fts(should_create, index_all, batch_size, session):
+    index = FTSIndex(session)
+
     if should_create:
-        print blue("You've asked to (re)create index '{}'.".format(name))
-        IndexManager.create(Schema, name, directory)
+        print blue("You've asked to (re)create the full-text search table.")
+        index.clear(commit=False)
+
+    start = time.time()
+
+    kwargs = {} if index_all else {'published': True}
+    docs = iter_job_documents(session, chunk_size=batch_size, **kwargs)
+    count = index.add_document_bulk(docs)
+
+    duration = time.time() - start
+
+    rate = count / duration if duration else 0
+    print green("{0} documents added okay in {1:.2f} s ({2:.0f} docs/s)."
+                .format(count, duration, rate))
+
+
+def rebuild(index_all, procs, multisegment, batch_size, session):
+    name = settings.SEARCH_INDEX_NAME
+    print blue("You've asked to (re)create index '{}'.".format(name))
+
+    start = time.time()
+
+    kwargs = {} if index_all else {'published': True}
+    try:
+        version, count = rebuild_index(session, procs=procs,
+                                       batch_size=batch_size,
+                                       optimize=not multisegment, **kwargs)
+    except LockError:
+        die('Search index is already being rebuilt!')
+
+    duration = time.time() - start
+
+    rate = count / duration if duration else 0
+    print green("{0} documents added to '{1}' and switched over in {2:.2f} s "
+                "({3:.0f} docs/s).".format(count, version, duration, rate))
+
+
+def main(should_create, index_all, procs, multisegment, batch_size, session):
+    name = settings.SEARCH_INDEX_NAME
+    directory = settings.SEARCH_INDEX_DIRECTORY
+
+    if should_create:
+        return rebuild(index_all, procs, multisegment, batch_size, session)
 
     if not IndexManager.exists(name, directory):
         die('Search index does not exist!')
@@ -38,16 +118,38 @@ def main(should_create, index_all, session):
     start = time.time()
 
     kwargs = {} if index_all else {'published': True}
-    jobs = session.query(Job).filter_by(**kwargs).all()
+    docs = iter_job_documents(session, chunk_size=batch_size, **kwargs)
+
+    writer = index.bulk_writer(procs=procs, batchsize=batch_size)
+    count = index.add_document_bulk(docs, writer=writer)
+
+    if procs > 1 and not multisegment:
+        print blue('Merging segments.')
+        index.optimize()
 
-    index.add_document_bulk([job.to_document() for job in jobs])
     duration = time.time() - start
 
-    print green("{0} documents added okay in {1:.2f} ms.".format(len(jobs), duration))
+    rate = count / duration if duration else 0
+    print green("{0} documents added okay in {1:.2f} s ({2:.0f} docs/s)."
+                .format(count, duration, rate))
 
 
 if __name__ == '__main__':
     arguments = docopt(__doc__)
     should_create = arguments['--create']
     index_all = arguments['--all']
-    run(main, should_create, index_all)
+    procs = int(arguments['--procs'])
+    multisegment = arguments['--multisegment']
+    batch_size = int(arguments['--batch-size'])
+    if procs < 1 or batch_size < 1:
+        die('--procs and --batch-size must be positive!')
+    if settings.SEARCH_BACKEND == 'fts':
+        if arguments['--incremental']:
+            die('--incremental is not supported by the fts backend!')
+        run(populate_fts, should_create, index_all, batch_size)
+    elif arguments['--incremental']:
+        since = arguments['--since']
+        since = arrow.get(since) if since else None
+        run(sync, index_all, since, batch_size)
+    else:
+        run(main, should_create, index_all, procs, multisegment, batch_size)
@@ -0,0 +1,60 @@
+"""
+Serves searches on the `jobs` index to all web workers of this host over a
+Unix socket, see `jobber.core.daemon`. Web workers use it once the
+`SEARCH_DAEMON_SOCKET` setting points to the same socket.
+
+Only the `whoosh` search backend is served. With any other backend, the
+daemon exits right away and web workers search in-process.
+
+Usage:
+    search_daemon.py [--socket=<path>]
+
+Options:
+    --socket=<path>  Path of the Unix socket to listen on, defaults to the
+                     `SEARCH_DAEMON_SOCKET` setting.
+
+"""
+import logging
+
+from docopt import docopt
+
+from env import path_setup
+path_setup()
+
+from jobber.script import run, die
+from jobber.core.daemon import SearchServer
+from jobber.core.search import IndexManager
+from jobber.conf import settings
+
+
+logger = logging.getLogger('jobber')
+
+
+def main(path, session):
+    name = settings.SEARCH_INDEX_NAME
+    directory = settings.SEARCH_INDEX_DIRECTORY
+
+    if settings.SEARCH_BACKEND != 'whoosh':
+        logger.info('Search daemon only serves the whoosh backend, exiting.')
+        return
+
+    if not path:
+        die('No socket given and `SEARCH_DAEMON_SOCKET` is not set!')
+
+    if not IndexManager.exists(name, directory):
+        die('Search index does not exist!')
+
+    server = SearchServer(path)
+    logger.info('Search daemon listening on {}.'.format(path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    arguments = docopt(__doc__)
+    path = arguments['--socket'] or settings.SEARCH_DAEMON_SOCKET
+    run(main, path)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+tests.integration.test_daemon
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Integration tests for the search daemon and its client.
+
+"""
+import os
+import tempfile
+from threading import Thread
+
+import pytest
+
+from jobber.conf import settings
+from jobber.core.daemon import SearchServer, RemoteIndex, DaemonError
+from jobber.core.models import Location, Company, Job
+from jobber.services import SearchClient, search_service
+
+
+@pytest.fixture(scope='function')
+def path(request):
+    directory = tempfile.mkdtemp()
+
+    def teardown():
+        os.rmdir(directory)
+
+    request.addfinalizer(teardown)
+    return os.path.join(directory, 'search.sock')
+
+
+def start(path, index, workers=None):
+    server = SearchServer(path, index, workers=workers)
+    thread = Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def stop(server):
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='function')
+def server(request, path, index):
+    server = start(path, index)
+
+    def teardown():
+        RemoteIndex(path).close()
+        stop(server)
+
+    request.addfinalizer(teardown)
+    return server
+
+
+@pytest.fixture(scope='function')
+def jobs(session, index):
+    company = Company(name=u'remedica')
+    location = Location(city=u'Limassol', country_code='CYP')
+    jobs = []
+    for title in (u'python developer', u'python engineer', u'designer'):
+        jobs.append(Job(title=title,
+                        description=u'testfoo',
+                        contact_method=1,
+                        remote_work=False,
+                        company=company,
+                        location=location,
+                        published=True,
+                        job_type=1,
+                        recruiter_name=u'jon',
+                        recruiter_email=u'doe'))
+    session.add_all(jobs)
+    session.commit()
+    index.add_document_bulk([job.to_document() for job in jobs])
+    return jobs
+
+
+def test_remote_index(server, index, jobs):
+    remote = RemoteIndex(server.path)
+    assert remote.ping()
+    assert remote.search(u'python') == index.search(u'python')
+    assert remote.search(u'python', limit=1, sort=('created', 'desc')) == \
+        index.search(u'python', limit=1, sort=('created', 'desc'))
+
+    page = remote.search_page(u'python', pagelen=1, facets=True, snippets=True)
+    local = index.search_page(u'python', pagelen=1, facets=True, snippets=True)
+    assert page.items == local.items
+    assert page.total == local.total == 2
+    assert page.facets == local.facets
+    assert page.snippets == local.snippets
+
+    assert remote.correct(u'pyhton') == index.correct(u'pyhton') == u'python'
+
+
+def test_sees_index_updates(server, index, jobs):
+    remote = RemoteIndex(server.path)
+    assert len(remote.search(u'designer')) == 1
+
+    index.delete_document(unicode(jobs[2].id))
+    assert remote.search(u'designer') == []
+
+
+def test_search_client(monkeypatch, server, jobs):
+    monkeypatch.setattr(settings, 'SEARCH_DAEMON_SOCKET', server.path)
+    service = search_service()
+    assert isinstance(service, SearchClient)
+
+    assert service.search_jobs(u'designer') == [jobs[2]]
+    hits = service.search_jobs_page(u'python', facets=True, snippets=True,
+                                     filters={'country': 'CYP'})
+    assert set(hits) == set(jobs[:2])
+    assert hits.facets['country'] == [(u'CYP', 2)]
+    assert set(hits.snippets) == set(job.id for job in jobs[:2])
+
+
+def test_search_client_fallback(monkeypatch, path, jobs):
+    monkeypatch.setattr(settings, 'SEARCH_DAEMON_SOCKET', path)
+    service = search_service()
+    assert isinstance(service, SearchClient)
+
+    # Nothing listens on the socket, so searches run in-process.
+    assert service.search_jobs(u'designer') == [jobs[2]]
+    hits = service.search_jobs_page(u'python')
+    assert set(hits) == set(jobs[:2])
+
+
+def test_search_client_backend(monkeypatch, path):
+    monkeypatch.setattr(settings, 'SEARCH_DAEMON_SOCKET', path)
+    monkeypatch.setattr(settings, 'SEARCH_BACKEND', 'fts')
+    assert not isinstance(search_service(), SearchClient)
+
+
+def test_worker_pool(path, index, jobs):
+    server = start(path, index, workers=1)
+    results = []
+
+    def search():
+        remote = RemoteIndex(path)
+        try:
+            results.append(len(remote.search(u'python')))
+        finally:
+            remote.close()
+
+    # Every connection has a thread, but a single one searches.
+    threads = [Thread(target=search) for i in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop(server)
+    assert results == [2] * 4
+    assert len(server.workers) == 1
+
+
+def test_errors(path, index):
+    remote = RemoteIndex(path)
+    with pytest.raises(DaemonError):
+        remote.search(u'python')
+
+    server = start(path, index)
+    try:
+        with pytest.raises(DaemonError):
+            remote.call('delete_document', docid=u'1')
+    finally:
+        stop(server)
+    with pytest.raises(DaemonError):
+        remote.search(u'python')
+
+
+def test_reconnects(path, index, jobs):
+    remote = RemoteIndex(path)
+    server = start(path, index)
+    assert len(remote.search(u'python')) == 2
+    stop(server)
+
+    # The connection of the client is stale once the server restarts.
+    server = start(path, index)
+    try:
+        assert len(remote.search(u'python')) == 2
+    finally:
+        remote.close()
+        stop(server)
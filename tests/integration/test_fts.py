@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+tests.integration.test_fts
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Integration tests for the SQLite FTS5 search backend.
+
+"""
+import pytest
+
+from jobber.conf import settings
+from jobber.core.models import Location, Company, Job
+from jobber.core.fts import FTSIndex, match_expression
+from jobber.core.search import IndexBatch
+
+
+@pytest.fixture(scope='function')
+def location():
+    return Location(city=u'Lïｍáｓѕ߀ɭ', country_code='CYP')
+
+
+@pytest.fixture(scope='function')
+def company():
+    return Company(name=u'remedica')
+
+
+@pytest.fixture(scope='function')
+def job(company, location):
+    return Job(title=u'testfoo',
+               description=u'testfoo',
+               contact_method=1,
+               remote_work=False,
+               company=company,
+               location=location,
+               job_type=1,
+               recruiter_name=u'jon',
+               recruiter_email=u'doe')
+
+
+@pytest.fixture(scope='function')
+def fts(monkeypatch, session):
+    monkeypatch.setattr(settings, 'SEARCH_BACKEND', 'fts')
+    return FTSIndex(session)
+
+
+def ids(hits):
+    return [int(hit['id']) for hit in hits]
+
+
+def test_match_expression():
+    assert match_expression(u'python') == u'"python"'
+    assert match_expression(u'c++ developer') == u'"c" "developer"'
+    assert match_expression(u'"senior python" OR ruby') == u'"senior python" OR "ruby"'
+    assert match_expression(u'AND python AND OR ruby NOT') == u'"python" OR "ruby"'
+    assert match_expression(u'*** ""') is None
+
+
+class TestFTSIndex(object):
+
+    def test_add_update_delete(self, session, fts, job):
+        session.add(job)
+        session.commit()
+
+        fts.add_document(job.to_document(), commit=False)
+        assert ids(fts.search(u'testfoo')) == [job.id]
+        assert ids(fts.search(u'remedica')) == [job.id]
+
+        doc = job.to_document()
+        doc['title'] = u'Python Developers'
+        doc['description'] = u'Django'
+        fts.update_document(doc, commit=False)
+        assert fts.search(u'testfoo') == []
+        assert ids(fts.search(u'python develop')) == [job.id]
+
+        fts.delete_document(unicode(job.id), commit=False)
+        assert fts.search(u'python') == []
+
+    def test_add_document_bulk(self, monkeypatch, session, fts, company,
+                               location):
+        monkeypatch.setattr(settings, 'INDEX_EXPORT_CHUNK_SIZE', 2)
+        jobs = [Job(title=u'job {}'.format(i), description=u'testfoo',
+                    contact_method=1, remote_work=False, company=company,
+                    location=location, job_type=1, recruiter_name=u'jon',
+                    recruiter_email=u'doe') for i in range(5)]
+        session.add_all(jobs)
+        session.commit()
+
+        count = fts.add_document_bulk((job.to_document() for job in jobs),
+                                      commit=False)
+        assert count == 5
+        assert len(fts.search(u'testfoo')) == 5
+        assert len(fts.search(u'testfoo', limit=2)) == 2
+
+        batch = IndexBatch()
+        batch.delete(unicode(jobs[0].id))
+        fts.apply_batch(batch, commit=False)
+        assert len(fts.search(u'testfoo')) == 4
+
+    def test_search_page(self, session, fts, job):
+        job.description = u'We are hiring <b>Django</b> developers & more.'
+        job.add_tag(u'python')
+        session.add(job)
+        session.commit()
+        fts.add_document(job.to_document(), commit=False)
+
+        page = fts.search_page(u'developer', facets=True, snippets=True)
+        assert page.total == 1
+        assert page.facets['country'] == [(u'CYP', 1)]
+        assert page.facets['tag'] == [(u'python', 1)]
+        snippet = page.snippets[unicode(job.id)]
+        assert u'<strong class="match">developers</strong>' in snippet
+        assert u'&amp;' in snippet
+
+        assert fts.search_page(u'developer tag:python').total == 1
+        assert fts.search_page(u'tag:PYTHON country:cyp').total == 1
+        assert fts.search_page(u'developer', filters={'tag': u'ruby'}).total == 0
+        assert fts.search_page(u'developer', filters={'tag': u'py%'}).total == 0
+        assert fts.search_page(u'developer', filters={'tag': u'pyth_n'}).total == 0
+        city = job.location.city.upper()
+        assert fts.search_page(u'developer', filters={'city': city}).total == 1
+        with pytest.raises(ValueError):
+            fts.search_page(u'developer', filters={'salary': u'1000'})
+        assert fts.search_page(u'').total == 0
+
+    def test_kept_current_in_transaction(self, session, signals, fts, job):
+        job.published = True
+        session.add(job)
+        session.flush()
+
+        # The document is written in the same transaction as the job.
+        assert ids(fts.search(u'testfoo')) == [job.id]
+
+        job.published = False
+        session.commit()
+        assert fts.search(u'testfoo') == []
+
+        job.published = True
+        session.flush()
+        session.rollback()
+        assert fts.search(u'testfoo') == []
+
+    def test_search_view(self, client, session, signals, fts, job):
+        job.published = True
+        session.add(job)
+        session.commit()
+
+        response = client.get('/search/testfoo')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 1
+        assert 'class="snippet"' in response.data
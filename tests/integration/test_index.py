@@ -7,12 +7,22 @@ Integration tests for the search index.
 
 """
 import copy
+from threading import Timer
 from datetime import timedelta
 
 import pytest
+from mock import MagicMock
+from whoosh.fields import STORED
+from whoosh.writing import SegmentWriter
 
-from jobber.core.models import Location, Company, Job
-from jobber.core.search import Index
+from jobber.conf import settings
+from jobber.core.models import Location, Company, Job, IndexUpdate
+from jobber.core.utils import now
+from jobber.functions import (drain_index_updates, sync_index, maintain_index,
+                              rebuild_index)
+from jobber.core.metrics import metrics
+from jobber.core.search import (Index, IndexManager, Schema, LockError,
+                                registry, schema_fingerprint, safe_write)
 
 
 @pytest.fixture(scope='function')
@@ -84,6 +94,26 @@ class TestSearchIndex(object):
         hits = index.search(job.title)
         assert len(hits) == 0
 
+    def test_add_document_bulk_multiprocess(self, session, index, job):
+        doc = job.to_document()
+
+        bulk = []
+        for i in range(10):
+            doc = copy.deepcopy(doc)
+            doc['id'] = unicode(i)
+            bulk.append(doc)
+
+        index = Index()
+        writer = index.bulk_writer(procs=2, batchsize=3)
+        index.add_document_bulk(bulk, writer=writer)
+
+        hits = index.search(job.title)
+        assert sorted(int(hit['id']) for hit in hits) == range(10)
+
+        index.optimize()
+        assert index.searcher().reader().is_atomic()
+        assert len(index.search(job.title)) == 10
+
     def test_search_limit(self, session, index, job):
         doc = job.to_document()
         timestamp = doc['created']
@@ -105,3 +135,743 @@ class TestSearchIndex(object):
         # Search with descending sort.
         hits = index.search(job.title, sort=('created', 'desc'))
         assert [int(hit['id']) for hit in hits] == range(15)
+
+    def test_search_page(self, session, index, job):
+        doc = job.to_document()
+        timestamp = doc['created']
+
+        bulk = []
+        for i in range(5):
+            doc = copy.deepcopy(doc)
+            doc['id'] = unicode(i)
+            doc['created'] = timestamp - timedelta(days=i)
+            bulk.append(doc)
+
+        index = Index()
+        index.add_document_bulk(bulk)
+
+        page = index.search_page(job.title, page=2, pagelen=2, sort=('created', 'desc'))
+        assert [int(hit['id']) for hit in page] == [2, 3]
+        assert page.total == 5
+        assert page.pages == 3
+        assert page.has_prev and page.has_next
+
+        page = index.search_page(job.title, page=3, pagelen=2, sort=('created', 'desc'))
+        assert [int(hit['id']) for hit in page] == [4]
+        assert not page.has_next
+
+        # Pages past the last one are empty rather than the last page.
+        page = index.search_page(job.title, page=99, pagelen=2, sort=('created', 'desc'))
+        assert len(page) == 0
+        assert page.page == 99
+        assert page.total == 5
+        assert not page.has_next
+
+    def test_search_facets(self, session, index, job):
+        doc = job.to_document()
+
+        bulk = []
+        for i, (country, tags) in enumerate([(u'CYP', u'python,sql'),
+                                             (u'CYP', u'python'),
+                                             (u'GRC', u'')]):
+            doc = copy.deepcopy(doc)
+            doc['id'] = unicode(i)
+            doc['country'] = country
+            doc['tags'] = tags
+            bulk.append(doc)
+
+        index = Index()
+        index.add_document_bulk(bulk)
+
+        page = index.search_page(job.title, pagelen=1, facets=True)
+        assert len(page) == 1
+        assert page.facets['country'] == [(u'CYP', 2), (u'GRC', 1)]
+        assert page.facets['tag'] == [(u'python', 2), (u'sql', 1)]
+        assert page.facets['type'] == [(job.human_job_type, 3)]
+
+        page = index.search_page(job.title, facets=True, filters={'tag': u'Python'})
+        assert sorted(int(hit['id']) for hit in page) == [0, 1]
+        assert page.facets['country'] == [(u'CYP', 2)]
+
+    def test_search_facets_empty_index(self, index):
+        page = Index().search_page(u'testfoo', facets=True)
+        assert page.total == 0
+        assert page.facets['tag'] == []
+
+    def test_search_filters(self, session, index, job):
+        doc = job.to_document()
+
+        bulk = []
+        for i, (country, tags, remote) in enumerate([(u'CYP', u'python,sql', u'yes'),
+                                                     (u'CYP', u'python', u'no'),
+                                                     (u'GRC', u'sql', u'yes')]):
+            doc = copy.deepcopy(doc)
+            doc['id'] = unicode(i)
+            doc['country'] = country
+            doc['tags'] = tags
+            doc['remote'] = remote
+            bulk.append(doc)
+
+        index = Index()
+        index.add_document_bulk(bulk)
+
+        def ids(hits):
+            return sorted(int(hit['id']) for hit in hits)
+
+        assert ids(index.search(job.title + u' tag:python')) == [0, 1]
+        assert ids(index.search(u'tag:python tag:SQL')) == [0]
+        assert ids(index.search(u'country:cyp remote:Yes')) == [0]
+        assert ids(index.search(u'type:"Full Time"')) == [0, 1, 2]
+        assert ids(index.search(job.title, filters={'country': u'GRC'})) == [2]
+        assert ids(index.search(u'tag:python', filters={'country': u'GRC'})) == []
+        city = job.location.city.upper()
+        assert ids(index.search(job.title, filters={'city': city})) == [0, 1, 2]
+        with pytest.raises(ValueError):
+            index.search(job.title, filters={'salary': u'1000'})
+
+        page = index.search_page(job.title, filters={'tag': [u'sql']})
+        assert page.total == 2
+
+    def test_search_filter_cache(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        cache = index.filter_cache()
+        stats = cache.stats()
+
+        assert len(index.search(job.title + u' country:CYP')) == 1
+        assert len(index.search(job.company.name + u' country:CYP')) == 1
+        assert cache.stats()['misses'] == stats['misses'] + 1
+        assert cache.stats()['hits'] == stats['hits'] + 1
+
+        # Filter doc-sets are only valid for the generation they came from.
+        index.delete_document(unicode(job.id))
+        assert len(index.search(job.title + u' country:CYP')) == 0
+        assert cache.stats()['misses'] == stats['misses'] + 2
+
+    def test_search_description(self, session, index, job):
+        job.description = u'<p>We are hiring <b>Django</b> developers & more.</p>'
+        session.add(job)
+        session.commit()
+
+        assert job.description_text == u'We are hiring Django developers & more.'
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        page = index.search_page(u'develop', snippets=True)
+        assert len(page) == 1
+        snippet = page.snippets[unicode(job.id)]
+        assert u'<strong class="match term0">developers</strong>' in snippet
+        assert u'&amp;' in snippet
+        assert u'<p>' not in snippet
+
+    def test_search_snippets_time_limit(self, monkeypatch, session, index, job):
+        monkeypatch.setattr(settings, 'SEARCH_SNIPPET_TIME_LIMIT', 0)
+        job.description = u'Django & Flask'
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        # Hits past the time limit fall back to the start of the description.
+        page = index.search_page(u'django', snippets=True)
+        assert page.snippets[unicode(job.id)] == u'Django &amp; Flask'
+
+    def test_search_time_limit(self, monkeypatch, session, index, job):
+        session.add(job)
+        session.commit()
+        docs = []
+        for id in range(5):
+            doc = job.to_document()
+            doc['id'] = unicode(id)
+            docs.append(doc)
+        index = Index()
+        index.add_document_bulk(docs)
+
+        class Clock(object):
+            # Every reading of the clock advances it by a second.
+            now = 0
+
+            @classmethod
+            def time(cls):
+                cls.now += 1
+                return cls.now
+
+        # The clock is read once before matching and once after every match,
+        # so two documents are collected before the limit is reached.
+        monkeypatch.setattr(settings, 'SEARCH_TIME_LIMIT', 2.5)
+        monkeypatch.setattr('jobber.core.search.time', Clock)
+        page = index.search_page(job.title, facets=True)
+        assert page.truncated
+        assert len(page) == page.total == 2
+        assert page.facets['country'] == [(u'CYP', 2)]
+        assert len(index.search(job.title)) == 2
+
+        # Truncated results are not cached.
+        monkeypatch.setattr(settings, 'SEARCH_TIME_LIMIT', None)
+        page = index.search_page(job.title)
+        assert not page.truncated
+        assert page.total == 5
+        assert len(index.search(job.title)) == 5
+
+    def test_correct(self, session, index, job):
+        job.title = u'Python Developers'
+        job.add_tag(u'django')
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        assert index.correct(u'pyhton') == u'python'
+        assert index.correct(u'Senior developres djnago') == u'Senior developers django'
+        assert index.correct(u'remdica country:CYP') == u'remedica country:CYP'
+        # Known words, stems of known words and operators are left alone.
+        assert index.correct(u'python AND developer') is None
+
+    def test_speller_reuse(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        speller = registry.speller(index.name, index.directory, index.searcher())
+        assert registry.speller(index.name, index.directory,
+                                index.searcher()) is speller
+
+        # The word graph is rebuilt for the next index generation.
+        doc = job.to_document()
+        doc['title'] = u'engineer'
+        index.update_document(doc)
+        assert index.correct(u'engneer') == u'engineer'
+        assert registry.speller(index.name, index.directory,
+                                index.searcher()) is not speller
+
+    def test_search_cache(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        cache = index.query_cache()
+        hits = cache.stats()['hits']
+
+        assert len(index.search(job.title)) == 1
+        assert len(index.search(u'  ' + job.title + u' ')) == 1
+        assert cache.stats()['hits'] == hits + 1
+
+        # Writing to the index invalidates the cached results.
+        index.delete_document(unicode(job.id))
+        assert len(index.search(job.title)) == 0
+
+    def test_search_cache_copies(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+
+        # Changing results doesn't change what later searches get.
+        index.search(job.title)[0]['id'] = u'changed'
+        assert index.search(job.title)[0]['id'] == unicode(job.id)
+
+        for _ in range(2):
+            page = index.search_page(job.title, facets=True)
+            page.items[0]['id'] = u'changed'
+            page.facets['type'].append((u'changed', 1))
+            page.correction = u'changed'
+
+        page = index.search_page(job.title, facets=True)
+        assert page.items[0]['id'] == unicode(job.id)
+        assert page.facets['type'] == [(job.human_job_type, 1)]
+        assert page.correction is None
+
+    def test_search_metrics(self, monkeypatch, session, index, job):
+        session.add(job)
+        session.commit()
+
+        metrics.clear()
+        index = Index()
+        index.add_document(job.to_document())
+        index.search(job.title)
+        index.search(job.title)
+
+        snapshot = metrics.snapshot()
+        assert snapshot['index.add']['count'] == 1
+        assert snapshot['search.total']['count'] == 2
+        assert snapshot['search.parse']['count'] == 2
+        # The second search was served from the cache.
+        assert snapshot['search.search']['count'] == 1
+        assert snapshot['search.hits']['sum'] == 2
+
+        # Limited searches record all matching documents, cached or not.
+        doc = job.to_document()
+        doc['id'] = u'0'
+        index.add_document(doc)
+        metrics.clear()
+        index.search(job.title, limit=1)
+        index.search(job.title, limit=1)
+        assert metrics.snapshot()['search.hits']['sum'] == 4
+
+    def test_slow_query_log(self, monkeypatch, session, index, job):
+        logger = MagicMock()
+        monkeypatch.setattr('jobber.core.search.slow_query_logger', logger)
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+        index.search_page(job.title)
+        assert not logger.warning.called
+
+        monkeypatch.setattr(settings, 'SEARCH_SLOW_QUERY_THRESHOLD', 0)
+        index.search_page(job.title)
+        assert logger.warning.call_count == 1
+        assert job.title in logger.warning.call_args[0][0]
+
+    def test_searcher_reuse(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        doc = job.to_document()
+
+        index = Index()
+        index.add_document(doc)
+        searcher = index.searcher()
+
+        # No writes took place, so the same searcher should be handed out.
+        assert Index().searcher() is searcher
+
+        doc['job_type'] = u'updated'
+        index.update_document(doc)
+
+        # The index generation moved on, so the searcher has to be refreshed.
+        assert index.searcher() is not searcher
+        assert len(index.search(u'updated')) == 1
+
+    def test_searcher_invalidated_on_create(self, app, session, index, job):
+        session.add(job)
+        session.commit()
+
+        index = Index()
+        index.add_document(job.to_document())
+        assert len(index.search(job.title)) == 1
+
+        name = app.config['SEARCH_INDEX_NAME']
+        directory = app.config['SEARCH_INDEX_DIRECTORY']
+        IndexManager.create(Schema, name, directory)
+
+        index = Index()
+        assert len(index.search(job.title)) == 0
+
+
+class TestIndexSignals(object):
+
+    def make_job(self, company, location):
+        return Job(title=u'outboxed',
+                   description=u'outboxed',
+                   contact_method=1,
+                   remote_work=False,
+                   company=company,
+                   location=location,
+                   published=True,
+                   job_type=1,
+                   recruiter_name=u'jon',
+                   recruiter_email=u'doe')
+
+    def test_updates_written_to_outbox(self, session, signals, index,
+                                       company, location):
+        generation = index.index.latest_generation()
+
+        jobs = [self.make_job(company, location) for i in range(3)]
+        session.add_all(jobs)
+        session.commit()
+
+        # Nothing touches the index during the request.
+        assert index.index.latest_generation() == generation
+        assert session.query(IndexUpdate).count() == 3
+
+        assert drain_index_updates(session) == 3
+        assert session.query(IndexUpdate).filter_by(drained=None).count() == 0
+
+        # All updates were applied with a single commit.
+        assert index.index.latest_generation() == generation + 1
+        hits = Index().search(u'outboxed')
+        assert sorted(int(hit['id']) for hit in hits) == sorted(j.id for j in jobs)
+
+    def test_unpublished_jobs_are_deindexed(self, session, signals, index,
+                                            company, location):
+        job = self.make_job(company, location)
+        session.add(job)
+        session.commit()
+        drain_index_updates(session)
+        assert len(Index().search(u'outboxed')) == 1
+
+        job.published = False
+        session.commit()
+        drain_index_updates(session)
+        assert len(Index().search(u'outboxed')) == 0
+
+    def test_drained_updates_pruned(self, session, signals, index, company,
+                                    location):
+        job = self.make_job(company, location)
+        session.add(job)
+        session.commit()
+
+        assert drain_index_updates(session) == 1
+        update = session.query(IndexUpdate).one()
+        assert update.drained is not None
+        # Drained updates are kept, but not applied again.
+        assert drain_index_updates(session) == 0
+
+        update.drained = now().replace(days=-2)
+        other = self.make_job(company, location)
+        session.add(other)
+        session.commit()
+
+        assert drain_index_updates(session) == 1
+        assert [u.job_id for u in session.query(IndexUpdate)] == [other.id]
+
+    def test_rollback_discards_updates(self, session, signals, index, job):
+        job.published = True
+        session.add(job)
+        session.flush()
+        session.rollback()
+
+        assert session.query(IndexUpdate).count() == 0
+
+
+class TestIndexMaintenance(object):
+
+    def add_segments(self, job, count):
+        index = Index()
+        doc = job.to_document()
+        for i in range(count):
+            doc = copy.deepcopy(doc)
+            doc['id'] = unicode(i)
+            # Commit without merging, so that every document gets a segment.
+            writer = index.index.writer()
+            writer.add_document(**doc)
+            writer.commit(merge=False)
+        return index
+
+    def test_segment_stats(self, index, job):
+        index = self.add_segments(job, 3)
+        writer = index.index.writer()
+        writer.delete_by_term('id', u'0')
+        writer.commit(merge=False)
+
+        stats = index.segment_stats()
+        assert stats['segments'] == 3
+        assert stats['docs'] == 3
+        assert stats['deleted'] == 1
+        assert stats['size'] > 0
+
+    def test_merge(self, index, job):
+        index = self.add_segments(job, 3)
+
+        assert index.merge(optimize=True)
+        assert index.segment_stats()['segments'] == 1
+        assert len(index.search(job.title)) == 3
+
+    def test_merge_skipped_when_locked(self, index, job):
+        index = self.add_segments(job, 3)
+
+        writer = index.index.writer()
+        try:
+            assert not index.merge(optimize=True)
+        finally:
+            writer.cancel()
+        assert index.segment_stats()['segments'] == 3
+
+    def test_merge_failure_releases_lock(self, monkeypatch, index, job):
+        index = self.add_segments(job, 2)
+
+        def commit(self, **kwargs):
+            raise ValueError('Failed.')
+        monkeypatch.setattr(SegmentWriter, 'commit', commit)
+
+        with pytest.raises(ValueError):
+            index.merge(optimize=True)
+        monkeypatch.undo()
+        index.writer(timeout=0).cancel()
+
+    def test_maintain_index(self, monkeypatch, index, job):
+        monkeypatch.setattr(settings, 'INDEX_MERGE_MIN_SEGMENTS', 4)
+        self.add_segments(job, 3)
+
+        before, after = maintain_index(optimize=True)
+        assert before['segments'] == 3
+        assert after is None
+
+        before, after = maintain_index(optimize=True, force=True)
+        assert after['segments'] == 1
+
+
+class TestIndexSync(object):
+
+    @pytest.fixture(scope='function')
+    def jobs(self, session, company, location):
+        jobs = []
+        for i in range(4):
+            job = Job(title=u'testfoo',
+                      description=u'testfoo',
+                      contact_method=1,
+                      remote_work=False,
+                      company=company,
+                      location=location,
+                      published=True,
+                      job_type=1,
+                      recruiter_name=u'jon',
+                      recruiter_email=u'doe')
+            jobs.append(job)
+        session.add_all(jobs)
+        session.commit()
+        return jobs
+
+    def test_fingerprints(self, session, index, jobs):
+        index = Index()
+        index.add_document_bulk([job.to_document() for job in jobs])
+
+        fingerprints = index.fingerprints()
+        assert sorted(fingerprints) == sorted(unicode(job.id) for job in jobs)
+        assert fingerprints[unicode(jobs[0].id)] == jobs[0].to_document()['fingerprint']
+
+    def test_sync_index(self, session, index, jobs):
+        index = Index()
+        index.add_document_bulk([job.to_document() for job in jobs[:3]])
+
+        jobs[0].title = u'changed'
+        jobs[1].published = False
+        session.commit()
+
+        assert sync_index(session, published=True) == (1, 1, 1)
+        assert sorted(index.fingerprints()) == sorted(unicode(job.id) for job in
+                                                      [jobs[0]] + jobs[2:])
+        assert len(index.search(u'changed')) == 1
+
+        # Nothing has changed since the last sync.
+        assert sync_index(session, published=True) == (0, 0, 0)
+
+    def test_sync_index_since(self, session, index, jobs):
+        jobs[0].created = now().replace(days=-10)
+        session.commit()
+
+        index = Index()
+        index.add_document_bulk([job.to_document() for job in jobs])
+
+        jobs[0].title = u'changed'
+        jobs[1].title = u'changed'
+        session.commit()
+
+        assert sync_index(session, since=now().replace(days=-1),
+                          published=True) == (0, 1, 0)
+        hits = index.search(u'changed')
+        assert [int(hit['id']) for hit in hits] == [jobs[1].id]
+
+
+class TestIndexRebuild(object):
+
+    @pytest.fixture(scope='function')
+    def directory(self, monkeypatch, tmpdir):
+        directory = str(tmpdir)
+        monkeypatch.setattr(settings, 'SEARCH_INDEX_DIRECTORY', directory)
+        IndexManager.create(Schema, settings.SEARCH_INDEX_NAME, directory)
+        return directory
+
+    @pytest.fixture(scope='function')
+    def jobs(self, session, company, location):
+        jobs = []
+        for i in range(3):
+            job = Job(title=u'testfoo',
+                      description=u'testfoo',
+                      contact_method=1,
+                      remote_work=False,
+                      company=company,
+                      location=location,
+                      published=True,
+                      job_type=1,
+                      recruiter_name=u'jon',
+                      recruiter_email=u'doe')
+            jobs.append(job)
+        session.add_all(jobs)
+        session.commit()
+        return jobs
+
+    def test_rebuild_index(self, session, directory, jobs):
+        name = settings.SEARCH_INDEX_NAME
+        index = Index()
+        assert index.name == name
+        assert IndexManager.outdated(name, directory) is False
+
+        assert rebuild_index(session, published=True) == (name + '-1', 3)
+        assert IndexManager.resolve(name, directory) == name + '-1'
+        assert IndexManager.exists(name, directory)
+
+        # Instances opened before the switch move on to the new version.
+        assert index.name == name + '-1'
+        assert len(index.search(u'testfoo')) == 3
+        assert len(Index().search(u'testfoo')) == 3
+
+    def test_rebuild_index_catches_up(self, monkeypatch, session, directory,
+                                      jobs):
+        jobs[0].created = now().replace(days=-1)
+        session.commit()
+        bulk = Index.add_document_bulk
+
+        def add_document_bulk(self, docs, writer=None):
+            count = bulk(self, docs, writer=writer)
+            # Changed while the new version is being built.
+            jobs[1].created = now()
+            jobs[1].title = u'changed'
+            session.commit()
+            return count
+        monkeypatch.setattr(Index, 'add_document_bulk', add_document_bulk)
+
+        rebuild_index(session, published=True)
+
+        hits = Index().search(u'changed')
+        assert [int(hit['id']) for hit in hits] == [jobs[1].id]
+
+    def test_rebuild_index_catches_up_on_drained_updates(self, monkeypatch,
+                                                          session, directory,
+                                                          jobs):
+        jobs[0].created = now().replace(days=-1)
+        session.commit()
+        bulk = Index.add_document_bulk
+
+        def add_document_bulk(self, docs, writer=None):
+            count = bulk(self, docs, writer=writer)
+            # Changed and drained into the version in use by a concurrent
+            # worker, while the new version is being built.
+            jobs[0].title = u'changed'
+            jobs[2].published = False
+            session.add_all([IndexUpdate(job_id=jobs[0].id),
+                             IndexUpdate(job_id=jobs[2].id)])
+            session.commit()
+            assert drain_index_updates(session) == 2
+            return count
+        monkeypatch.setattr(Index, 'add_document_bulk', add_document_bulk)
+
+        rebuild_index(session, published=True)
+
+        hits = Index().search(u'changed')
+        assert [int(hit['id']) for hit in hits] == [jobs[0].id]
+        hits = Index().search(u'testfoo')
+        assert sorted(int(hit['id']) for hit in hits) == [jobs[0].id, jobs[1].id]
+
+    def test_rebuild_index_catches_up_after_retention(self, monkeypatch,
+                                                      session, directory,
+                                                      jobs):
+        jobs[0].created = now().replace(days=-1)
+        session.commit()
+        bulk = Index.add_document_bulk
+
+        def add_document_bulk(self, docs, writer=None):
+            count = bulk(self, docs, writer=writer)
+            # Drained updates of rebuilds this slow may already be pruned.
+            monkeypatch.setattr(settings, 'INDEX_DRAINED_RETENTION', -1)
+            jobs[0].title = u'changed'
+            session.commit()
+            return count
+        monkeypatch.setattr(Index, 'add_document_bulk', add_document_bulk)
+
+        rebuild_index(session, published=True)
+
+        hits = Index().search(u'changed')
+        assert [int(hit['id']) for hit in hits] == [jobs[0].id]
+
+    def test_rebuild_index_collects_garbage(self, monkeypatch, session,
+                                            directory, jobs):
+        monkeypatch.setattr(settings, 'SEARCH_INDEX_KEEP_VERSIONS', 1)
+        name = settings.SEARCH_INDEX_NAME
+
+        for version in range(1, 4):
+            rebuild_index(session, published=True)
+            assert IndexManager.resolve(name, directory) == '{}-{}'.format(
+                name, version
+            )
+
+        assert IndexManager.versions(name, directory) == [
+            (2, name + '-2'), (3, name + '-3')
+        ]
+        assert len(Index().search(u'testfoo')) == 3
+
+    def test_rebuild_index_failure(self, monkeypatch, session, directory, jobs):
+        name = settings.SEARCH_INDEX_NAME
+        Index().add_document(jobs[0].to_document())
+
+        def add_document_bulk(self, docs, writer=None):
+            writer.cancel()
+            raise ValueError('Failed.')
+        monkeypatch.setattr(Index, 'add_document_bulk', add_document_bulk)
+
+        with pytest.raises(ValueError):
+            rebuild_index(session, published=True)
+
+        # The unfinished version is deleted and the old one is still in use.
+        assert IndexManager.versions(name, directory) == [(0, name)]
+        assert len(Index().search(u'testfoo')) == 1
+
+    def test_rebuild_index_locked(self, session, directory, jobs):
+        name = settings.SEARCH_INDEX_NAME
+        lock = IndexManager.rebuild_lock(name, directory)
+        assert lock.acquire(blocking=False)
+        try:
+            with pytest.raises(LockError):
+                rebuild_index(session, published=True)
+        finally:
+            lock.release()
+        assert IndexManager.versions(name, directory) == [(0, name)]
+
+    def test_outdated(self, monkeypatch, session, directory, jobs):
+        name = settings.SEARCH_INDEX_NAME
+        rebuild_index(session, published=True)
+        assert IndexManager.outdated(name, directory) is False
+
+        class Changed(Schema):
+            salary = STORED()
+
+        assert IndexManager.outdated(name, directory, schema=Changed)
+
+    def test_schema_fingerprint(self):
+        class Changed(Schema):
+            salary = STORED()
+
+        assert schema_fingerprint(Schema) == schema_fingerprint(Schema)
+        assert schema_fingerprint(Schema) == schema_fingerprint(Schema())
+        assert schema_fingerprint(Schema) != schema_fingerprint(Changed)
+
+
+class TestIndexWriters(object):
+
+    def test_safe_write_releases_lock(self, index):
+        writer = index.writer()
+        with pytest.raises(ValueError):
+            with safe_write(writer):
+                raise ValueError
+        index.writer(timeout=0).cancel()
+
+    def test_writer_waits_for_lock(self, session, index, job):
+        session.add(job)
+        session.commit()
+
+        writer = index.writer()
+        Timer(0.2, writer.cancel).start()
+        index.add_document(job.to_document())
+        assert len(index.search(job.title)) == 1
+
+    def test_writer_timeout(self, index):
+        writer = index.writer()
+        try:
+            with pytest.raises(LockError):
+                index.writer(timeout=0.1)
+        finally:
+            writer.cancel()
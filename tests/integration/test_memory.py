@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+tests.integration.test_memory
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Integration tests for the in-memory search backend.
+
+"""
+import pytest
+
+from jobber.conf import settings
+from jobber.core.models import Location, Company, Job, JobChange
+from jobber.core.memory import inverted_index, MemoryIndex
+from jobber.functions import (iter_job_documents, load_memory_index,
+                              sync_memory_index)
+from jobber.services import SearchService
+
+
+@pytest.fixture(scope='function')
+def job():
+    return Job(title=u'testfoo',
+               description=u'testfoo',
+               contact_method=1,
+               remote_work=False,
+               company=Company(name=u'remedica'),
+               location=Location(city=u'Limassol', country_code='CYP'),
+               job_type=1,
+               recruiter_name=u'jon',
+               recruiter_email=u'doe')
+
+
+@pytest.fixture(scope='function')
+def memory(request, monkeypatch, session):
+    monkeypatch.setattr(settings, 'SEARCH_BACKEND', 'memory')
+    load_memory_index(session)
+
+    def teardown():
+        inverted_index.clear()
+        inverted_index.loaded = False
+
+    request.addfinalizer(teardown)
+    return inverted_index
+
+
+def test_kept_current(session, signals, memory, job):
+    service = SearchService()
+    session.add(job)
+    session.commit()
+    assert service.search_jobs(u'testfoo') == []
+
+    job.published = True
+    session.commit()
+    assert service.search_jobs(u'testfoo') == [job]
+
+    job.title = u'engineer'
+    session.commit()
+    assert service.search_jobs_page(u'engineer', snippets=True).total == 1
+
+    session.delete(job)
+    session.commit()
+    assert service.search_jobs(u'engineer') == []
+
+    # Rolled back changes never make it into the index.
+    job = Job(title=u'zebra', description=u'zebra', contact_method=1,
+              remote_work=False, company=Company(name=u'zoo'),
+              location=Location(city=u'Limassol', country_code='CYP'),
+              job_type=1, recruiter_name=u'jon', recruiter_email=u'doe',
+              published=True)
+    session.add(job)
+    session.flush()
+    session.rollback()
+    assert MemoryIndex().search(u'zebra') == []
+
+
+def test_changes_logged(session, signals, memory, job):
+    job.published = True
+    session.add(job)
+    session.commit()
+
+    session.delete(job)
+    session.commit()
+
+    changes = session.query(JobChange).order_by(JobChange.id).all()
+    assert [change.job_id for change in changes] == [job.id, job.id]
+
+
+def test_synced_from_other_processes(session, memory, job):
+    index = MemoryIndex()
+
+    # Changes committed by other processes are only found in the log.
+    job.published = True
+    session.add(job)
+    session.commit()
+    session.add(JobChange(job_id=job.id))
+    session.commit()
+    assert index.search(u'testfoo') == []
+
+    assert sync_memory_index(session) == 0
+    assert sync_memory_index(session, interval=0) == 1
+    assert index.search(u'testfoo') == [{'id': unicode(job.id)}]
+
+    job.published = False
+    session.add(JobChange(job_id=job.id))
+    session.commit()
+    assert sync_memory_index(session, interval=0) == 1
+    assert index.search(u'testfoo') == []
+    assert sync_memory_index(session, interval=0) == 0
+
+
+def test_loaded_from_database(client, session, memory, job):
+    job.published = True
+    session.add(job)
+    session.commit()
+
+    memory.load(iter_job_documents(session, published=True))
+    response = client.get('/search/testfoo')
+    assert response.status_code == 200
+    assert response.data.count('class="job"') == 1
@@ -8,6 +8,7 @@ Tests the RSS generation logic.
 """
 import pytest
 from jobber.core.models import Job, Company, Location
+from jobber.functions import drain_index_updates
 from jobber import rss
 
 
@@ -42,6 +43,8 @@ def test_rss_generation(session, signals, job, query):
 
     assert job.id > 0
 
+    drain_index_updates(session)
+
     feed = rss.render_feed(query=query)
 
     # Assert on some generic information that needs to be present in the feed.
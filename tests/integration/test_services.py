@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+tests.integration.test_services
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Integration tests for the service layer.
+
+"""
+import pytest
+from sqlalchemy import event
+
+from jobber.core.models import Location, Company, Job, Tag
+from jobber.conf import settings
+from jobber.core.search import Index
+from jobber.services import SearchService, Listing
+
+
+@pytest.fixture(scope='function')
+def location():
+    return Location(city=u'Limassol', country_code='CYP')
+
+
+@pytest.fixture(scope='function')
+def company():
+    return Company(name=u'remedica')
+
+
+@pytest.fixture(scope='function')
+def jobs(session, company, location):
+    tags = [Tag(tag=u'python'), Tag(tag=u'sql')]
+    jobs = []
+    for i in range(5):
+        job = Job(title=u'developer',
+                  description=u'developer',
+                  contact_method=1,
+                  remote_work=False,
+                  company=company,
+                  location=location,
+                  published=i != 0,
+                  job_type=1,
+                  recruiter_name=u'jon',
+                  recruiter_email=u'doe')
+        job.tags.extend(tags)
+        jobs.append(job)
+    session.add_all(jobs)
+    session.commit()
+    return jobs
+
+
+class QueryCounter(object):
+
+    def __init__(self, bind):
+        self.bind = bind
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.bind, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.bind, 'before_cursor_execute', self)
+
+
+class TestSearchService(object):
+
+    def test_hydrate_preserves_order(self, session, index, jobs):
+        ids = [job.id for job in reversed(jobs)]
+        hits = SearchService().hydrate(ids)
+        # The first job is unpublished and should be filtered out.
+        assert [job.id for job in hits] == ids[:-1]
+
+    def test_search_query_count(self, session, index, jobs):
+        Index().add_document_bulk([job.to_document() for job in jobs])
+
+        session.expunge_all()
+
+        with QueryCounter(session.bind) as counter:
+            hits = SearchService().search_jobs(u'developer')
+            for job in hits:
+                job.company.name
+                job.location.city
+                [tag.slug for tag in job.tags]
+
+        assert len(hits) == 4
+        assert counter.count == 2
+
+    def test_search_stored_listings(self, monkeypatch, session, index, jobs):
+        monkeypatch.setattr(settings, 'SEARCH_STORED_LISTINGS', True)
+        Index().add_document_bulk([job.to_document() for job in jobs])
+
+        with QueryCounter(session.bind) as counter:
+            hits = SearchService().search_jobs(u'developer')
+
+        assert counter.count == 0
+        assert all(isinstance(hit, Listing) for hit in hits)
+        assert sorted(hit.id for hit in hits) == sorted(j.id for j in jobs[1:])
+
+        job, hit = jobs[1], hits[0]
+        assert hit.url() == session.query(Job).get(hit.id).url()
+        assert hit.company.name == job.company.name
+        assert hit.location.country_name == job.location.country_name
+        assert hit.human_job_type == job.human_job_type
+        assert hit.tag_slugs == job.tag_slugs
+        assert hit.created == job.created
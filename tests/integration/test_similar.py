@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+tests.integration.test_similar
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Integration tests for precomputed similar jobs.
+
+"""
+import pytest
+
+from jobber.core.models import Location, Company, Job, SimilarJob, SimilarUpdate
+from jobber.core.similar import (SimilarityModel, compute_similar_jobs,
+                                 refresh_similar_jobs, drain_similar_updates)
+from jobber.services import JobsService
+
+
+def make_job(title, description, published=True):
+    return Job(title=title,
+               description=description,
+               contact_method=1,
+               remote_work=False,
+               company=Company(name=u'remedica'),
+               location=Location(city=u'Limassol', country_code='CYP'),
+               job_type=1,
+               published=published,
+               recruiter_name=u'jon',
+               recruiter_email=u'doe')
+
+
+@pytest.fixture(scope='function')
+def jobs(session):
+    jobs = [
+        make_job(u'Python Developer', u'Django, Flask and Python'),
+        make_job(u'Senior Python Engineer', u'Python and Django'),
+        make_job(u'Java Developer', u'Spring and Hibernate')
+    ]
+    tag = jobs[0].add_tag(u'python')
+    jobs[1].tags.append(tag)
+    session.add_all(jobs)
+    session.commit()
+    return jobs
+
+
+def similar(job):
+    return [similar.id for similar in JobsService().similar_jobs(job.id)]
+
+
+def test_similarity_model():
+    model = SimilarityModel({1: u'python django', 2: u'python flask',
+                             3: u'java spring', 4: u'the'})
+    neighbours = model.neighbours(1, 5)
+    assert [id for id, score in neighbours] == [2]
+    assert 0 < neighbours[0][1] < 1
+    assert model.neighbours(4, 5) == []
+    assert model.neighbours(5, 5) == []
+
+
+def test_compute_similar_jobs(session, jobs):
+    python, senior, java = jobs
+    assert compute_similar_jobs(session, k=1) == 3
+    assert similar(python) == [senior.id]
+    assert similar(senior) == [python.id]
+    # Both developer jobs share a word in their title.
+    assert similar(java) == [python.id]
+    assert session.query(SimilarJob).count() == 3
+
+
+def test_refreshed_on_changes(session, signals, jobs):
+    python, senior, java = jobs
+    assert drain_similar_updates(session) == 3
+    assert similar(python) == [senior.id, java.id]
+
+    job = make_job(u'Python Developer', u'Django', published=False)
+    session.add(job)
+    session.commit()
+    # Drafts are never queued.
+    assert session.query(SimilarUpdate).count() == 0
+
+    job.published = True
+    session.commit()
+    # Lists are only refreshed once the outbox is drained.
+    assert job.id not in similar(python)
+    assert drain_similar_updates(session) == 1
+    assert similar(job)[0] == python.id
+    assert job.id in similar(python)
+
+    job.published = False
+    session.commit()
+    assert drain_similar_updates(session) == 1
+    assert similar(job) == []
+    assert job.id not in similar(python)
+    assert session.query(SimilarJob)\
+                  .filter(SimilarJob.similar_job_id == job.id).count() == 0
+
+    java.title = u'Python Developer'
+    session.commit()
+    assert drain_similar_updates(session) == 1
+    assert similar(java)[0] == python.id
+
+    session.delete(java)
+    session.delete(job)
+    session.commit()
+    # Only the published job is queued.
+    assert drain_similar_updates(session) == 1
+    assert java.id not in similar(python)
+    assert drain_similar_updates(session) == 0
+
+
+def test_refreshed_when_listed_elsewhere(session, jobs):
+    python, senior, java = jobs
+    ruby = make_job(u'Ruby Engineer', u'Rails and Sinatra')
+    session.add(ruby)
+    session.commit()
+    compute_similar_jobs(session, k=1)
+    assert similar(java) == [python.id]
+
+    job = make_job(u'Ruby Engineer', u'Rails and Hibernate')
+    session.add(job)
+    session.commit()
+    refresh_similar_jobs(session, [job.id], k=1)
+    # The new job is now the most similar to the java job, while the java job
+    # isn't the most similar to the new one.
+    assert similar(job) == [ruby.id]
+    assert similar(java) == [job.id]
+
+
+def test_show_similar_jobs(client, session, jobs):
+    python, senior, java = jobs
+    refresh_similar_jobs(session, [python.id])
+    session.commit()
+
+    response = client.get(python.url())
+    assert response.status_code == 200
+    assert 'class="similar-jobs"' in response.data
+    assert senior.url() in response.data
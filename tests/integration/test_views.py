@@ -9,12 +9,18 @@ Integration tests for the view layer.
 from random import choice
 
 import pytest
-from flask import url_for
+from flask import Flask, url_for
 from mock import MagicMock
 
+import json
+
 from jobber.core.models import Location, Company, Job, EmailReviewToken
+from jobber.core.suggest import suggester
 from jobber.conf import settings
 from jobber.core.search import Index
+from jobber.database import db
+from jobber.factory import configure_search
+from jobber.functions import drain_index_updates
 
 
 @pytest.fixture(scope='function')
@@ -101,9 +107,223 @@ class TestShowJob(object):
         assert response.status_code == 404
 
 
+class TestListings(object):
+
+    @pytest.fixture(scope='function')
+    def jobs(self, session, index, company, location):
+        jobs = []
+        for i in range(3):
+            job = Job(title=u'testfoo',
+                      description=u'testfoo',
+                      contact_method=1,
+                      remote_work=False,
+                      company=company,
+                      location=location,
+                      published=True,
+                      job_type=1,
+                      recruiter_name=u'jon',
+                      recruiter_email=u'doe')
+            jobs.append(job)
+        session.add_all(jobs)
+        session.commit()
+        Index().add_document_bulk([job.to_document() for job in jobs])
+        return jobs
+
+    def test_index_pagination(self, client, jobs):
+        response = client.get('/?per_page=2')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 2
+        assert 'page=2' in response.data
+        assert 'query=' not in response.data
+
+        response = client.get('/?per_page=2&page=2')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 1
+        assert 'page=1' in response.data
+
+    def test_search_pagination(self, client, jobs):
+        response = client.get('/search/testfoo?per_page=2')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 2
+        assert '/search/testfoo?' in response.data
+        assert 'page=2' in response.data
+
+        response = client.get('/search/testfoo?per_page=2&page=2')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 1
+
+    def test_max_page(self, client, jobs, monkeypatch):
+        monkeypatch.setattr(settings, 'SEARCH_MAX_PAGE', 3)
+        for url in ('/', '/search/testfoo'):
+            response = client.get(url + '?per_page=1&page=1000000000')
+            assert response.status_code == 200
+            assert response.data.count('class="job"') == 1
+
+    def test_search_snippets(self, client, jobs):
+        response = client.get('/search/testfoo')
+        assert response.status_code == 200
+        assert response.data.count('class="snippet"') == 3
+        assert '<strong class="match term0">testfoo</strong>' in response.data
+
+    def test_search_drilldown(self, client, jobs):
+        response = client.get('/search/testfoo')
+        assert response.status_code == 200
+        assert 'class="facets"' in response.data
+        assert 'country=CYP' in response.data
+
+        response = client.get('/search/testfoo?country=GRC')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 0
+
+    def test_search_filters(self, client, jobs):
+        response = client.get('/search/testfoo country:CYP')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 3
+
+        response = client.get('/search/type:"Full Time" country:GRC')
+        assert response.status_code == 200
+        assert response.data.count('class="job"') == 0
+
+    def test_search_correction(self, client, jobs):
+        response = client.get('/search/tsetfoo?country=CYP')
+        assert response.status_code == 200
+        assert 'Did you mean' in response.data
+        assert '/search/testfoo?country=CYP' in response.data
+
+        response = client.get('/search/testfoo')
+        assert 'Did you mean' not in response.data
+
+    def test_search_truncated(self, monkeypatch, client, jobs):
+        response = client.get('/search/testfoo')
+        assert 'class="truncated"' not in response.data
+
+        monkeypatch.setattr(settings, 'SEARCH_TIME_LIMIT', 1e-9)
+        response = client.get('/search/testfoo country:CYP')
+        assert response.status_code == 200
+        assert 'class="truncated"' in response.data
+
+
+class TestSuggest(object):
+
+    @pytest.fixture(scope='function')
+    def unloaded(self, request):
+        def teardown():
+            suggester.index.clear()
+            suggester.titles = {}
+            suggester.loaded = False
+
+        request.addfinalizer(teardown)
+        return suggester
+
+    @pytest.fixture(scope='function')
+    def loaded(self, session, unloaded):
+        suggester.load(session)
+        return suggester
+
+    def suggest(self, client, query):
+        response = client.get('/suggest?q=' + query)
+        assert response.status_code == 200
+        return [(s['kind'], s['text']) for s in json.loads(response.data)['suggestions']]
+
+    def test_suggest(self, client, session, job, loaded):
+        assert self.suggest(client, u'rem') == []
+
+        job.published = True
+        job.add_tag(u'remote')
+        session.add(job)
+        session.commit()
+
+        suggester.load(session)
+        assert self.suggest(client, u'rem') == [('tag', u'remote'),
+                                                ('company', u'remedica')]
+        assert self.suggest(client, u'test') == [('title', u'testfoo')]
+
+    def test_loaded_on_first_request(self, session, job, unloaded, monkeypatch):
+        job.published = True
+        session.add(job)
+        session.commit()
+
+        watch = MagicMock()
+        monkeypatch.setattr(suggester, 'watch', watch)
+
+        app = Flask(__name__)
+        app.route('/')(lambda: u'')
+        configure_search(app)
+        assert not suggester.loaded
+
+        client = app.test_client()
+        client.get('/')
+        assert suggester.loaded
+        assert suggester.suggest(u'test') == [('title', u'testfoo')]
+        watch.assert_called_once_with(db.session)
+
+        client.get('/')
+        assert watch.call_count == 1
+
+    def test_suggest_kept_current(self, client, session, signals, job, loaded):
+        session.add(job)
+        session.commit()
+
+        # Only published titles are suggested.
+        assert self.suggest(client, u'rem') == [('company', u'remedica')]
+        assert self.suggest(client, u'test') == []
+
+        job.published = True
+        job.company.name = u'acme'
+        session.commit()
+        assert self.suggest(client, u'test') == [('title', u'testfoo')]
+        assert self.suggest(client, u'rem') == []
+        assert self.suggest(client, u'acm') == [('company', u'acme')]
+
+        job.title = u'engineer'
+        session.commit()
+        assert self.suggest(client, u'test') == []
+        assert self.suggest(client, u'eng') == [('title', u'engineer')]
+
+        company, location = job.company, job.location
+        session.delete(job)
+        session.commit()
+        assert self.suggest(client, u'eng') == []
+
+        # Rolled back changes are never suggested.
+        session.add(Job(title=u'Zebraologist',
+                        description=u'testfoo',
+                        contact_method=1,
+                        remote_work=False,
+                        company=company,
+                        location=location,
+                        published=True,
+                        job_type=1,
+                        recruiter_name=u'jon',
+                        recruiter_email=u'doe'))
+        company.name = u'zebracorp'
+        session.flush()
+        session.rollback()
+        assert self.suggest(client, u'zebr') == []
+        assert self.suggest(client, u'acm') == [('company', u'acme')]
+
+
+class TestMetrics(object):
+
+    def test_metrics(self, monkeypatch, client, index):
+        response = client.get('/metrics')
+        assert response.status_code == 404
+
+        monkeypatch.setattr(settings, 'METRICS_ENABLED', True)
+        client.get('/search/testfoo')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        snapshot = json.loads(response.data)
+        assert snapshot['search.total']['count'] >= 1
+        assert 'p99' in snapshot['search.total']
+
+
 class TestEmailReview(object):
 
     def search(self, query):
+        # Index updates are applied by the indexing worker, so make sure the
+        # outbox is drained before searching.
+        drain_index_updates(db.session)
         index = Index()
         return index.search(query)
 
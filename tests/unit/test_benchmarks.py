@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+tests.unit.test_benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Tests for the synthetic corpus and the search benchmarks.
+
+"""
+from whoosh.filedb.filestore import RamStorage
+
+from jobber.core.search import Schema, fingerprint
+
+from benchmarks.corpus import generate, CorpusGenerator
+from benchmarks.search import SearchBenchmark, QUERY_MIX
+
+
+def test_corpus_is_deterministic():
+    assert list(generate(20, seed=1)) == list(generate(20, seed=1))
+    assert list(generate(20, seed=1)) != list(generate(20, seed=2))
+
+
+def test_corpus_documents():
+    docs = list(CorpusGenerator().documents(50))
+    assert [doc['id'] for doc in docs] == [unicode(id) for id in range(1, 51)]
+    for doc in docs:
+        assert set(doc) <= set(Schema().names())
+        assert doc['fingerprint'] == fingerprint(doc)
+
+    # Documents can be indexed as they are.
+    ix = RamStorage().create_index(Schema)
+    with ix.writer() as writer:
+        for doc in docs:
+            writer.add_document(**doc)
+    assert ix.doc_count() == 50
+
+
+def test_benchmark():
+    results = SearchBenchmark(50).run(updates=2, repeat=1)
+    assert results['documents'] == 50
+    assert results['bulk']['docs_per_second'] > 0
+    assert results['updates']['count'] == 2
+    assert list(results['queries']) == list(QUERY_MIX) + ['all']
+    assert results['queries']['all']['count'] == len(QUERY_MIX)
+    assert results['corrections']['p99'] is not None
+    assert results['index']['docs'] >= 50
@@ -8,18 +8,23 @@ Tests shared functions.
 """
 import os
 import json
+from datetime import datetime
+from time import mktime
 
 import pytest
 import requests
 from mock import MagicMock
+from sqlalchemy import event
 
 from jobber.vendor.html2text import html2text
 from jobber.conf import settings
-from jobber.core.models import Location, Company, Job
+from jobber.core.models import Location, Company, Job, Tag
 from jobber.functions import (send_instructory_email,
                               send_admin_review_email,
                               send_confirmation_email,
                               social_broadcast,
+                              iter_job_documents,
+                              MaintenanceSchedule,
                               Zapier,
                               DEFAULT_SENDER,
                               ADMIN_RECIPIENT)
@@ -130,3 +135,72 @@ def test_social_broadcast_fail(session, monkeypatch, job):
     assert sb.service == 'twitter'
     assert sb.data == json.dumps({})
     assert sb.job_id == job.id
+
+
+def test_iter_job_documents(session, company, location):
+    tag = Tag(tag=u'python')
+    jobs = []
+    for i in range(5):
+        job = Job(title=u'testfoo',
+                  description=u'testfoo',
+                  contact_method=1,
+                  remote_work=False,
+                  company=company,
+                  location=location,
+                  published=i != 0,
+                  job_type=1,
+                  recruiter_name=u'jon',
+                  recruiter_email=u'doe',
+                  tags=[tag])
+        jobs.append(job)
+    session.add_all(jobs)
+    session.commit()
+    ids = [job.id for job in jobs if job.published]
+    session.expunge_all()
+
+    queries = []
+    listener = lambda *args: queries.append(args)
+    event.listen(session.bind, 'before_cursor_execute', listener)
+    try:
+        docs = list(iter_job_documents(session, chunk_size=2, published=True))
+    finally:
+        event.remove(session.bind, 'before_cursor_execute', listener)
+
+    assert [int(doc['id']) for doc in docs] == ids
+    assert all(doc['tags'] == u'python' for doc in docs)
+    # Two queries for each of the two full chunks and a final empty one.
+    assert len(queries) == 5
+
+
+def test_maintenance_schedule(monkeypatch):
+    mock = MagicMock(return_value=({}, None))
+    monkeypatch.setattr('jobber.functions.maintain_index', mock)
+
+    timestamp = mktime(datetime(2014, 5, 1, 3, 30).timetuple())
+    clock = MagicMock(return_value=timestamp)
+    schedule = MaintenanceSchedule(interval=60, window=(2, 5), clock=clock)
+
+    assert schedule.run() == ({}, None)
+    # Not due again before the interval has passed.
+    assert schedule.run() is None
+    clock.return_value += 60
+    assert schedule.run() == ({}, None)
+    assert mock.call_count == 2
+
+
+@pytest.mark.parametrize('window,hour,expected', [
+    (None, 12, True),
+    ((2, 5), 2, True),
+    ((2, 5), 5, False),
+    ((22, 4), 23, True),
+    ((22, 4), 3, True),
+    ((22, 4), 12, False),
+])
+def test_maintenance_schedule_window(window, hour, expected):
+    schedule = MaintenanceSchedule(interval=60, window=window)
+    timestamp = mktime(datetime(2014, 5, 1, hour).timetuple())
+    assert schedule.in_window(timestamp) is expected
+
+
+def test_maintenance_schedule_default_window():
+    assert MaintenanceSchedule().window == settings.INDEX_MAINTENANCE_WINDOW
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+tests.unit.test_memory
+~~~~~~~~~~~~~~~~~~~~~~
+
+Tests the in-memory BM25 search engine.
+
+"""
+from datetime import datetime
+
+import pytest
+
+from jobber.core.memory import InvertedIndex, MemoryIndex
+from jobber.core.search import IndexBatch, analyze
+
+
+def document(id, title, description=u'', tags=u'', country=u'CYP', day=1):
+    return {
+        'id': unicode(id),
+        'title': title,
+        'description': description,
+        'company': u'acme',
+        'location': u'Limassol,Cyprus',
+        'job_type': u'Full Time',
+        'tags': tags,
+        'type': u'Full Time',
+        'country': country,
+        'city': u'limassol',
+        'created': datetime(2014, 1, day)
+    }
+
+
+@pytest.fixture(scope='function')
+def index():
+    engine = InvertedIndex()
+    engine.load([
+        document(1, u'Python Developer', u'Django and Flask', u'python,django', day=1),
+        document(2, u'Senior Python Developer', u'Python, Python & more Python',
+                 u'python', country=u'GRC', day=2),
+        document(3, u'Java Engineer', u'Spring', u'java', day=3)
+    ])
+    return MemoryIndex(engine)
+
+
+def ids(hits):
+    return [hit['id'] for hit in hits]
+
+
+def test_search_ranking(index):
+    # The description of the second job mentions python the most.
+    assert ids(index.search(u'python')) == [u'2', u'1']
+    assert ids(index.search(u'python developers')) == [u'2', u'1']
+    assert ids(index.search(u'python java')) == []
+    assert ids(index.search(u'the')) == []
+    assert ids(index.search(u'python', limit=1)) == [u'2']
+    assert ids(index.search(u'python', sort=('created', 'asc'))) == [u'1', u'2']
+
+
+def test_search_filters(index):
+    assert ids(index.search(u'python country:cyp')) == [u'1']
+    assert ids(index.search(u'developer', filters={'tag': u'Django'})) == [u'1']
+    assert ids(index.search(u'tag:java')) == [u'3']
+    assert ids(index.search(u'python city:Limassol')) == [u'2', u'1']
+    with pytest.raises(ValueError):
+        index.search(u'python', filters={'salary': u'1000'})
+    assert ids(index.search(u'')) == []
+
+
+def test_search_page(index):
+    page = index.search_page(u'python', pagelen=1, facets=True, snippets=True)
+    assert page.total == 2
+    assert ids(page) == [u'2']
+    assert page.facets['country'] == [(u'CYP', 1), (u'GRC', 1)]
+    assert page.facets['tag'] == [(u'python', 2), (u'django', 1)]
+    assert page.snippets[u'2'] == (u'<strong class="match">Python</strong>, '
+                                   u'<strong class="match">Python</strong> &amp; '
+                                   u'more <strong class="match">Python</strong>')
+
+    page = index.search_page(u'python', page=2, pagelen=1)
+    assert ids(page) == [u'1']
+
+
+def test_updates(index):
+    index.update_document(document(3, u'Python Engineer'))
+    assert ids(index.search(u'java')) == []
+    assert ids(index.search(u'engineer')) == [u'3']
+
+    batch = IndexBatch()
+    batch.delete(u'1')
+    batch.delete(u'2')
+    index.apply_batch(batch)
+    assert ids(index.search(u'python')) == [u'3']
+
+    # Dead documents are compacted away once they outnumber live ones.
+    engine = index.engine
+    assert len(engine) == 1
+    assert len(engine.ids) == 1
+    assert ids(index.search(u'python engineer')) == [u'3']
+
+    index.add_document(document(4, u'Python Developer'))
+    assert ids(index.search(u'python', sort=('created', 'asc'))) == [u'3', u'4']
+
+
+def test_document_frequencies(index):
+    engine = index.engine
+    term = analyze(u'python')[0]
+    assert engine.frequencies[term] == 2
+
+    index.delete_document(u'1')
+    assert engine.frequencies[term] == 1
+    index.update_document(document(3, u'Python Engineer'))
+    assert engine.frequencies[term] == 2
+    assert analyze(u'java')[0] not in engine.frequencies
+
+
+def test_matches_outlive_changes(index):
+    engine = index.engine
+    matches = engine.match(analyze(u'python'))
+
+    # Compacts and renumbers the remaining documents.
+    index.delete_document(u'1')
+    index.delete_document(u'2')
+    assert len(engine.ids) == 1
+
+    matches.sort(key=lambda match: match.docid)
+    assert [match.docid for match in matches] == [u'1', u'2']
+    assert [match.values['country'] for match in matches] == [u'CYP', u'GRC']
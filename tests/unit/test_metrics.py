@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+tests.unit.test_metrics
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Tests the rolling latency histograms.
+
+"""
+from jobber.core.metrics import Histogram, Metrics, percentile
+
+
+def test_percentile():
+    values = range(1, 101)
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) is None
+
+
+def test_histogram_snapshot():
+    histogram = Histogram(buckets=(1, 5), size=3)
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    # Only the last 3 values are kept, but lifetime totals are not rolled.
+    assert snapshot['count'] == 4
+    assert snapshot['sum'] == 14.5
+    assert snapshot['window'] == 3
+    assert snapshot['max'] == 10
+    assert snapshot['buckets'] == [(1, 1), (5, 2), (None, 3)]
+
+
+def test_metrics_timer():
+    metrics = Metrics(size=10)
+    with metrics.timer('op'):
+        pass
+    metrics.observe('hits', 3, buckets=(1, 10))
+
+    snapshot = metrics.snapshot()
+    assert snapshot['op']['count'] == 1
+    assert snapshot['hits']['buckets'] == [(1, 0), (10, 1), (None, 1)]
+
+    metrics.clear()
+    assert metrics.snapshot() == {}
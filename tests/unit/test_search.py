@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+tests.unit.test_search
+~~~~~~~~~~~~~~~~~~~~~~
+
+Tests search helpers which don't need an index.
+
+"""
+import pytest
+
+from jobber.core.search import QueryCache, parse_filters, split_query
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_query_cache_lru():
+    cache = QueryCache(2, 60)
+    cache.set(1, 'a', [1])
+    cache.set(1, 'b', [2])
+
+    # Touch 'a' so that 'b' becomes the least recently used entry.
+    assert cache.get(1, 'a') == [1]
+    cache.set(1, 'c', [3])
+
+    assert cache.get(1, 'b') is QueryCache.MISSING
+    assert cache.get(1, 'a') == [1]
+    assert cache.get(1, 'c') == [3]
+
+    stats = cache.stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_query_cache_ttl():
+    clock = Clock()
+    cache = QueryCache(2, 60, clock=clock)
+    cache.set(1, 'a', [1])
+
+    clock.now = 59
+    assert cache.get(1, 'a') == [1]
+
+    clock.now = 61
+    assert cache.get(1, 'a') is QueryCache.MISSING
+    assert cache.stats()['evictions'] == 1
+
+
+def test_query_cache_version():
+    cache = QueryCache(2, 60)
+    cache.set(1, 'a', [1])
+
+    # A new index version drops all entries.
+    assert cache.get(2, 'a') is QueryCache.MISSING
+    assert len(cache) == 0
+
+
+def test_query_cache_disabled():
+    cache = QueryCache(0, 60)
+    cache.set(1, 'a', [1])
+    assert cache.get(1, 'a') is QueryCache.MISSING
+
+
+@pytest.mark.parametrize('query,text,filters', [
+    (u'python developer', u'python developer', {}),
+    (u'tag:python developer', u'developer', {'tag': [u'python']}),
+    (u'developer tag:python tag:sql', u'developer', {'tag': [u'python', u'sql']}),
+    (u'type:"Full Time" country:CYP', u'', {'type': [u'Full Time'],
+                                            'country': [u'CYP']}),
+    (u'REMOTE:yes title:python', u'title:python', {'remote': [u'yes']}),
+    (u'c++ a:b', u'c++ a:b', {}),
+])
+def test_parse_filters(query, text, filters):
+    assert parse_filters(query) == (text, filters)
+
+
+def test_split_query():
+    assert split_query(u'tag:python developer', {'tag': u'sql'}) == \
+        (u'developer', {'tag': [u'python', u'sql']})
+    with pytest.raises(ValueError):
+        split_query(u'developer', {'salary': u'1000'})
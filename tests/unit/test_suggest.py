@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+tests.unit.test_suggest
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Tests the in-memory prefix index behind search suggestions.
+
+"""
+from jobber.core.suggest import PrefixIndex
+
+
+def test_prefix_index_lookup():
+    index = PrefixIndex()
+    index.add('title', u'Python Developer')
+    index.add('tag', u'python')
+    index.add('company', u'Pythonistas  Ltd')
+    index.add('city', u'Limassol')
+
+    assert index.lookup(u'pyt') == [('tag', u'python'),
+                                    ('title', u'Python Developer'),
+                                    ('company', u'Pythonistas Ltd')]
+    assert index.lookup(u'PYTHON d') == [('title', u'Python Developer')]
+    assert index.lookup(u'lim', limit=1) == [('city', u'Limassol')]
+    assert index.lookup(u'') == []
+    assert index.lookup(u'ruby') == []
+
+
+def test_prefix_index_word_prefixes():
+    index = PrefixIndex()
+    index.add('title', u'Senior Python Developer')
+    index.add('title', u'Developer Advocate')
+
+    # Matches at the start of the text rank first.
+    assert index.lookup(u'dev') == [('title', u'Developer Advocate'),
+                                    ('title', u'Senior Python Developer')]
+
+
+def test_prefix_index_discard():
+    index = PrefixIndex()
+    index.add('title', u'Developer')
+    index.add('title', u'Developer')
+
+    index.discard('title', u'Developer')
+    assert index.lookup(u'dev') == [('title', u'Developer')]
+
+    index.discard('title', u'Developer')
+    assert index.lookup(u'dev') == []
+    assert len(index) == 0
+    assert index.keys == []
+
+    # Discarding unknown suggestions is a no-op.
+    index.discard('tag', u'python')
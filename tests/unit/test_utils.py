@@ -109,6 +109,8 @@ def test_clean_html(input, expected):
     ('<a href="b">a</a>', 'a'),
     ('<script>a</script>', 'a'),
     ('<script src="b">a</script>', 'a'),
+    ('<p>a &amp; b</p>', 'a & b'),
+    ('a < b', 'a < b'),
 ])
 def test_strip_html(input, expected):
     assert utils.strip_html(input) == expected